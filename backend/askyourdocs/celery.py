@@ -8,3 +8,25 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
 # optional dev defaults
 app.conf.update(task_track_started=True, task_time_limit=600)
+# page ranges of fanned-out documents get their own queue so they interleave with
+# other projects' jobs instead of lining up ahead of them (see documents/scheduler.py);
+# workers consume: ingest_priority, celery, ingest_bulk
+app.conf.task_routes = {
+    "documents.tasks.ingest_page_range_task": {"queue": "ingest_bulk"},
+    # collection rebuilds are background work too
+    "documents.tasks.rebuild_collection_task": {"queue": "ingest_bulk"},
+    "documents.tasks.reconcile_collection_task": {"queue": "ingest_bulk"},
+    "documents.tasks.purge_deleted_task": {"queue": "ingest_bulk"},
+}
+# needs a beat process (the compose worker runs one with -B)
+app.conf.beat_schedule = {
+    # hands queued ingest jobs to free slots, including ones freed by an expired lease
+    "dispatch-ingest": {
+        "task": "documents.tasks.dispatch_ingest_task",
+        "schedule": float(os.getenv("INGEST_DISPATCH_INTERVAL", 30)),
+    },
+    "purge-deleted": {
+        "task": "documents.tasks.purge_deleted_task",
+        "schedule": float(os.getenv("PURGE_INTERVAL_SECONDS", 3600)),
+    },
+}
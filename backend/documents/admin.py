@@ -1,6 +1,6 @@
 # backend/documents/admin.py
 from django.contrib import admin
-from .models import Document, DocumentChunk
+from .models import CollectionBuild, Document, DocumentChunk, IngestBatch
 
 @admin.register(Document)
 class DocumentAdmin(admin.ModelAdmin):
@@ -13,3 +13,16 @@ class DocumentChunkAdmin(admin.ModelAdmin):
     list_display = ("id", "document", "project", "page", "chunk_index", "token_count", "created_at")
     search_fields = ("chunk_hash", "text")
     list_filter = ("page", "project")
+
+
+@admin.register(IngestBatch)
+class IngestBatchAdmin(admin.ModelAdmin):
+    list_display = ("id", "project", "total", "duplicates", "created_at")
+    list_filter = ("project",)
+
+
+@admin.register(CollectionBuild)
+class CollectionBuildAdmin(admin.ModelAdmin):
+    list_display = ("collection", "embed_model", "embed_dim", "status", "phase", "done", "total", "embedded",
+                    "created_at", "switched_at")
+    list_filter = ("status",)
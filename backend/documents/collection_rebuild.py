@@ -0,0 +1,330 @@
+# backend/documents/collection_rebuild.py
+import os
+import time
+import logging
+
+from django.utils import timezone
+from qdrant_client.http import models as rest
+
+from .models import CollectionBuild, DocumentChunk
+from .embedding_cache import EmbeddingCache
+from .embed_executor import EmbeddingExecutor
+from .gemini_client import EMBED_MAX_BATCH_ITEMS, gemini_embed_batch
+from .ingest_pipeline import EMBED_TEXT_CHARS
+from .qdrant_client import QdrantClientWrapper, alias_target, collection_spec, versioned_name
+
+logger = logging.getLogger(__name__)
+
+# chunks synced per step: one Qdrant lookup + upsert and one progress save
+REBUILD_BATCH = int(os.getenv("COLLECTION_REBUILD_BATCH", 256))
+# API budget of a rebuild: texts sent for embedding per minute (cache hits are free); 0 = unlimited
+REBUILD_MAX_TEXTS_PER_MINUTE = int(os.getenv("COLLECTION_REBUILD_MAX_TEXTS_PER_MINUTE", 3000))
+# embedding requests a rebuild keeps in flight; they also take slots from the shared limiter
+REBUILD_EMBED_CONCURRENCY = int(os.getenv("COLLECTION_REBUILD_EMBED_CONCURRENCY", 2))
+# after a switch, ingests that resolved the old collection may still be writing to it;
+# the new one catches up with them this long after the switch
+REBUILD_RECONCILE_DELAY = int(os.getenv("COLLECTION_REBUILD_RECONCILE_DELAY", 900))
+
+# every chunk that has a point: near-duplicates (duplicate_of set) never do
+_FIELDS = ("id", "chunk_hash", "text", "page", "chunk_index", "is_deleted",
+           "document_id", "document__project_id", "document__is_deleted")
+
+
+class RebuildError(Exception):
+    pass
+
+
+class _Budget:
+    """Token bucket over texts sent to the embedding API, refilled at REBUILD_MAX_TEXTS_PER_MINUTE."""
+
+    def __init__(self, per_minute: int):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+
+    def take(self, n: int):
+        if self.rate <= 0:
+            return
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            # a request larger than the bucket goes through once the bucket is full
+            if self.tokens >= min(n, self.capacity):
+                self.tokens -= n
+                return
+            time.sleep(min(5.0, (min(n, self.capacity) - self.tokens) / self.rate))
+
+
+def _payload(row) -> dict:
+    return {
+        "document_id": str(row["document_id"]),
+        "chunk_id": str(row["id"]),
+        "project_id": str(row["document__project_id"]) if row["document__project_id"] else None,
+        "page": row["page"],
+        "chunk_index": row["chunk_index"],
+        "is_deleted": row["document__is_deleted"],
+        "chunk_deleted": row["is_deleted"],
+    }
+
+
+def start_build(model: str, dim: int, auto_switch: bool = True, qclient=None) -> CollectionBuild:
+    """
+    Create an empty versioned collection for model/dim and its CollectionBuild
+    row. Nothing reads it until the alias is switched to it.
+    """
+    if CollectionBuild.objects.filter(status="building").exists():
+        raise RebuildError("another collection build is running; cancel it first")
+    # one embedding up front: a model that can't produce `dim` fails here, not batches into the build
+    try:
+        gemini_embed_batch(["dimension check"], model=model, dim=dim)
+    except Exception as exc:
+        raise RebuildError(f"{model} cannot embed at {dim} dimensions: {exc}") from exc
+    q = qclient or QdrantClientWrapper()
+    name = versioned_name(q.alias, model, dim, timezone.now().strftime("%Y%m%d%H%M%S"))
+    q._create_collection(name, dim)
+    return CollectionBuild.objects.create(collection=name, embed_model=model, embed_dim=dim,
+                                          auto_switch=auto_switch)
+
+
+def resume_failed(build) -> CollectionBuild:
+    """
+    Put a failed build back to building. Its cursor and phase were saved
+    batch by batch, so run_build carries on where it failed.
+    """
+    if build.status != "failed":
+        raise RebuildError(f"build {build.collection} is {build.status}, not failed")
+    if CollectionBuild.objects.filter(status="building").exclude(id=build.id).exists():
+        raise RebuildError("another collection build is running; cancel it first")
+    if not QdrantClientWrapper().client.collection_exists(build.collection):
+        raise RebuildError(f"collection {build.collection} no longer exists; start a new build")
+    CollectionBuild.objects.filter(id=build.id, status="failed").update(status="building", error="")
+    build.refresh_from_db()
+    return build
+
+
+def _still_running(build) -> bool:
+    return CollectionBuild.objects.filter(id=build.id, status="building").exists()
+
+
+DONE, PAUSED, CANCELLED = "done", "paused", "cancelled"
+
+
+def _sync_pass(build, q, budget, executor, deadline: float | None = None, only_running: bool = True) -> str:
+    """
+    Walk every chunk with a point in id order from build.cursor: points
+    missing from the collection are embedded (embedding cache first) and
+    upserted, existing ones get their deleted flags refreshed. The cursor is
+    saved after every batch; past `deadline` (time.monotonic()) it returns
+    PAUSED and a later call carries on from there.
+    """
+    target = build.collection
+    cache = EmbeddingCache(model=build.embed_model, dim=build.embed_dim)
+    chunks = DocumentChunk.objects.filter(duplicate_of__isnull=True).order_by("id")
+    if build.cursor is None:
+        build.total = chunks.count()
+        build.done = 0
+        build.save(update_fields=["total", "done", "updated_at"])
+
+    while True:
+        page = chunks.filter(id__gt=build.cursor) if build.cursor else chunks
+        rows = list(page.values(*_FIELDS)[:REBUILD_BATCH])
+        if not rows:
+            return DONE
+        if only_running and not _still_running(build):
+            return CANCELLED
+        if deadline is not None and time.monotonic() > deadline:
+            return PAUSED
+
+        ids = [str(r["id"]) for r in rows]
+        present = {str(p.id) for p in q.client.retrieve(collection_name=target, ids=ids,
+                                                           with_payload=False, with_vectors=False)}
+        missing = [r for r in rows if str(r["id"]) not in present]
+
+        # existing points: only the flags can have changed (soft deletes, new document versions)
+        flags = {}
+        for r in rows:
+            if str(r["id"]) in present:
+                flags.setdefault((r["document__is_deleted"], r["is_deleted"]), []).append(str(r["id"]))
+        for (doc_deleted, chunk_deleted), point_ids in flags.items():
+            q.client.set_payload(collection_name=target, points=point_ids,
+                                 payload={"is_deleted": doc_deleted, "chunk_deleted": chunk_deleted})
+
+        if missing:
+            vectors = cache.get_many(r["chunk_hash"] for r in missing)
+            build.cached += sum(1 for r in missing if r["chunk_hash"] in vectors)
+            to_embed = {}
+            for r in missing:
+                if r["chunk_hash"] not in vectors:
+                    to_embed.setdefault(r["chunk_hash"], r["text"][:EMBED_TEXT_CHARS])
+            if to_embed:
+                hashes, texts = list(to_embed), list(to_embed.values())
+                futures = []
+                for i in range(0, len(texts), EMBED_MAX_BATCH_ITEMS):
+                    budget.take(len(texts[i:i + EMBED_MAX_BATCH_ITEMS]))
+                    futures.append(executor.submit(texts[i:i + EMBED_MAX_BATCH_ITEMS],
+                                                   model=build.embed_model, dim=build.embed_dim))
+                fresh = dict(zip(hashes, (v for fut in futures for v in fut.result())))
+                cache.set_many(fresh)
+                vectors.update(fresh)
+                build.embedded += len(fresh)
+            q.client.upsert(collection_name=target, points=[
+                rest.PointStruct(id=str(r["id"]), vector=vectors[r["chunk_hash"]], payload=_payload(r))
+                for r in missing
+            ])
+
+        build.cursor = rows[-1]["id"]
+        build.done += len(rows)
+        build.save(update_fields=["cursor", "done", "cached", "embedded", "updated_at"])
+
+
+def _sweep(build, q):
+    # points whose chunk row is gone (hard-deleted while the copy ran). Only safe while
+    # nothing else writes to the collection: an ingest upserts before its rows commit
+    offset = None
+    removed = 0
+    while True:
+        points, offset = q.client.scroll(collection_name=build.collection, limit=1000, offset=offset,
+                                         with_payload=False, with_vectors=False)
+        ids = [str(p.id) for p in points]
+        known = {str(pk) for pk in DocumentChunk.objects.filter(id__in=ids, duplicate_of__isnull=True)
+                 .values_list("id", flat=True)}
+        orphans = [pid for pid in ids if pid not in known]
+        if orphans:
+            q.client.delete(collection_name=build.collection, points_selector=rest.PointIdsList(points=orphans))
+            removed += len(orphans)
+        if offset is None:
+            return removed
+
+
+def run_build(build_id, qclient=None, replace_legacy: bool = False, deadline: float | None = None) -> bool:
+    """
+    Fill a building collection (resuming where a previous run stopped), then
+    switch the alias to it if build.auto_switch. Search keeps using the
+    current collection until the switch. Returns False if it stopped at
+    `deadline` with work left, True otherwise.
+    """
+    build = CollectionBuild.objects.get(id=build_id)
+    if build.status != "building":
+        return True
+    q = qclient or QdrantClientWrapper()
+    budget = _Budget(REBUILD_MAX_TEXTS_PER_MINUTE)
+    try:
+        with EmbeddingExecutor(max_workers=REBUILD_EMBED_CONCURRENCY) as executor:
+            if build.phase == "copy":
+                outcome = _sync_pass(build, q, budget, executor, deadline)
+                if outcome != DONE:
+                    return outcome == CANCELLED
+                # again from the start: chunks ingested into the live collection meanwhile
+                build.phase, build.cursor = "catch_up", None
+                build.save(update_fields=["phase", "cursor", "updated_at"])
+            outcome = _sync_pass(build, q, budget, executor, deadline)
+            if outcome != DONE:
+                return outcome == CANCELLED
+        removed = _sweep(build, q)
+    except Exception as exc:
+        logger.exception("collection build %s failed", build.collection)
+        CollectionBuild.objects.filter(id=build.id, status="building").update(status="failed", error=str(exc))
+        raise
+
+    build.status = "ready"
+    build.save(update_fields=["status", "updated_at"])
+    logger.info("collection build %s ready: %d chunks, %d embedded, %d from cache, %d orphans removed",
+                build.collection, build.done, build.embedded, build.cached, removed)
+    if build.auto_switch:
+        try:
+            switch(build, q, replace_legacy=replace_legacy)
+        except RebuildError as exc:
+            logger.warning("collection build %s not switched: %s", build.collection, exc)
+    return True
+
+
+def switch(build, qclient=None, replace_legacy: bool = False) -> CollectionBuild:
+    """
+    Point the alias at a ready build. The collection it pointed at is kept
+    (status retired) as the rollback target.
+    """
+    if build.status != "ready":
+        raise RebuildError(f"build {build.collection} is {build.status}, not ready")
+    q = qclient or QdrantClientWrapper()
+    previous = alias_target(q.client, q.alias)
+    if previous is None and q.client.collection_exists(q.alias):
+        # a collection from before aliases: Qdrant can't rename it, so it has to go for the alias.
+        # Searches move to the build first and the collection is only dropped after that
+        if not replace_legacy:
+            raise RebuildError(f"'{q.alias}' is a plain collection; switching deletes it "
+                               f"(no rollback to it). Re-run the switch with --replace-legacy")
+        try:
+            q.replace_with_alias(build.collection)
+        except RuntimeError as exc:
+            raise RebuildError(f"could not hand '{q.alias}' over to {build.collection}: {exc}") from exc
+        previous = ""
+    else:
+        q.switch_alias(build.collection)
+    if alias_target(q.client, q.alias) != build.collection:
+        raise RebuildError(f"alias {q.alias} does not resolve to {build.collection} after the switch")
+
+    CollectionBuild.objects.filter(status="live").update(status="retired")
+    build.status = "live"
+    build.previous_collection = previous or ""
+    build.switched_at = timezone.now()
+    build.save(update_fields=["status", "previous_collection", "switched_at", "updated_at"])
+    logger.info("qdrant alias %s -> %s (was %s)", q.alias, build.collection, previous or "-")
+    _schedule_reconcile(build)
+    return build
+
+
+def rollback(qclient=None) -> CollectionBuild:
+    """
+    Point the alias back at the collection the live build replaced. That
+    collection then catches up with chunks ingested since the switch.
+    """
+    q = qclient or QdrantClientWrapper()
+    build = CollectionBuild.objects.filter(status="live").order_by("-switched_at").first()
+    if build is None or not build.previous_collection:
+        raise RebuildError("no switched build with a previous collection to roll back to")
+    previous = build.previous_collection
+    if not q.client.collection_exists(previous):
+        raise RebuildError(f"previous collection {previous} no longer exists")
+    q.switch_alias(previous)
+
+    build.status = "rolled_back"
+    build.save(update_fields=["status", "updated_at"])
+    spec = collection_spec(previous)
+    restored, _ = CollectionBuild.objects.update_or_create(
+        collection=previous,
+        defaults={"embed_model": spec.model, "embed_dim": spec.dim, "status": "live"},
+    )
+    logger.info("qdrant alias %s rolled back to %s", q.alias, previous)
+    _schedule_reconcile(restored)
+    return restored
+
+
+def reconcile(build_id, qclient=None, resume: bool = False, deadline: float | None = None) -> bool:
+    """
+    Catch-up pass over a live collection: points for chunks ingested by
+    workers that still used the other collection around a switch. Same
+    return value as run_build; resume=True continues a paused pass.
+    """
+    build = CollectionBuild.objects.get(id=build_id)
+    if build.status != "live":
+        return True
+    q = qclient or QdrantClientWrapper()
+    if not resume:
+        build.cursor = None
+    with EmbeddingExecutor(max_workers=REBUILD_EMBED_CONCURRENCY) as executor:
+        outcome = _sync_pass(build, q, _Budget(REBUILD_MAX_TEXTS_PER_MINUTE), executor, deadline, only_running=False)
+    if outcome == PAUSED:
+        return False
+    logger.info("collection %s reconciled: %d chunks checked", build.collection, build.done)
+    return True
+
+
+def _schedule_reconcile(build):
+    from .tasks import reconcile_collection_task
+    try:
+        reconcile_collection_task.apply_async(args=[build.id], countdown=REBUILD_RECONCILE_DELAY)
+    except Exception as exc:
+        logger.warning("could not schedule reconcile of %s (run `rebuild_collection reconcile`): %s",
+                       build.collection, exc)
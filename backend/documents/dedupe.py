@@ -0,0 +1,131 @@
+# backend/documents/dedupe.py
+import os
+import re
+import math
+import hashlib
+import logging
+
+from . import text_cache
+
+logger = logging.getLogger(__name__)
+
+# strip lines (headers, footers, disclaimers) that repeat on most pages
+STRIP_BOILERPLATE = os.getenv("INGEST_STRIP_BOILERPLATE", "1") == "1"
+BOILERPLATE_SAMPLE_PAGES = int(os.getenv("INGEST_BOILERPLATE_SAMPLE_PAGES", 24))
+# a line is boilerplate if it appears on at least this share of the sampled pages
+BOILERPLATE_MIN_SHARE = float(os.getenv("INGEST_BOILERPLATE_MIN_SHARE", 0.5))
+BOILERPLATE_MIN_PAGES = 3
+# page numbers etc. are only masked in short lines (headers/footers), never in body text
+BOILERPLATE_MASK_MAX_WORDS = 8
+# chunks whose SimHash differs in at most this many bits collapse onto the first one; -1 disables
+NEAR_DUP_MAX_DISTANCE = int(os.getenv("INGEST_NEAR_DUP_MAX_DISTANCE", 3))
+# below this many shingles a SimHash says little; such chunks are never collapsed
+NEAR_DUP_MIN_SHINGLES = 16
+SHINGLE_WORDS = 3
+
+# part of chunk_config(): changing any of these changes the chunks a document produces
+DEDUPE_VERSION = f"bp{int(STRIP_BOILERPLATE)}:{BOILERPLATE_MIN_SHARE}-nd{NEAR_DUP_MAX_DISTANCE}"
+
+_DIGITS_RE = re.compile(r"\d+")
+_SPACE_RE = re.compile(r"\s+")
+_WORD_RE = re.compile(r"\w+")
+_LETTERS_RE = re.compile(r"[^\W\d_]")
+
+
+def normalize_line(line: str) -> str:
+    line = _SPACE_RE.sub(" ", line.strip().lower())
+    # "Page 3 of 120" and "Page 4 of 120" are the same footer
+    if line.count(" ") < BOILERPLATE_MASK_MAX_WORDS:
+        line = _DIGITS_RE.sub("#", line)
+    return line
+
+
+def _candidate(line: str) -> bool:
+    # needs some words: rows of bare numbers repeat by pattern, not by content
+    return len(_LETTERS_RE.findall(line)) >= 3
+
+
+def learn_boilerplate(path: str, sha256: str | None = None, samples: int = BOILERPLATE_SAMPLE_PAGES) -> frozenset:
+    """
+    Normalized lines that occur on at least BOILERPLATE_MIN_SHARE of a sample
+    of evenly spaced pages. Sampling the whole file (not a page range) keeps the
+    result identical for every page-range subtask of a document.
+    """
+    n, _ = text_cache.text_profile(path, sha256)
+    step = max(1, n // samples)
+    picked = list(range(1, n + 1, step))[:samples]
+    if len(picked) < BOILERPLATE_MIN_PAGES:
+        return frozenset()
+    counts = {}
+    for text in text_cache.get_pages(path, sha256, picked).values():
+        for line in {normalize_line(l) for l in text.splitlines()}:
+            if _candidate(line):
+                counts[line] = counts.get(line, 0) + 1
+    threshold = max(BOILERPLATE_MIN_PAGES, math.ceil(BOILERPLATE_MIN_SHARE * len(picked)))
+    return frozenset(line for line, c in counts.items() if c >= threshold)
+
+
+def strip_boilerplate(text: str, boilerplate: frozenset) -> tuple[str, int]:
+    """
+    Returns (text without boilerplate lines, number of lines removed).
+    """
+    if not boilerplate:
+        return text, 0
+    kept, removed = [], 0
+    for line in text.splitlines():
+        if normalize_line(line) in boilerplate:
+            removed += 1
+        else:
+            kept.append(line)
+    return ("\n".join(kept), removed) if removed else (text, 0)
+
+
+def simhash(text: str) -> int | None:
+    """
+    64-bit SimHash over word 3-shingles, or None if the text is too short.
+    """
+    words = _WORD_RE.findall(text.lower())
+    shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(max(0, len(words) - SHINGLE_WORDS + 1))}
+    if len(shingles) < NEAR_DUP_MIN_SHINGLES:
+        return None
+    bits = [
+        format(int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "big"), "064b")
+        for s in shingles
+    ]
+    # column-wise majority vote; zip/count keep the per-bit loop out of Python
+    half = len(bits) / 2
+    out = 0
+    for col in zip(*bits):
+        out = (out << 1) | (col.count("1") > half)
+    return out
+
+
+class NearDuplicateIndex:
+    """
+    First-seen representatives by SimHash. The 64 bits are split into
+    max_distance + 1 bands; two hashes within max_distance bits agree exactly
+    on at least one band, so only same-band candidates are compared.
+    """
+
+    def __init__(self, max_distance: int = NEAR_DUP_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self.bands = max_distance + 1
+        self.width = 64 // self.bands
+        self.buckets = {}
+
+    def _keys(self, sig: int):
+        mask = (1 << self.width) - 1
+        return [(b, (sig >> (b * self.width)) & mask) for b in range(self.bands)]
+
+    def find_or_add(self, sig: int, item_id):
+        """
+        Returns the id of an earlier near-duplicate, or None after registering item_id.
+        """
+        keys = self._keys(sig)
+        for key in keys:
+            for other_sig, other_id in self.buckets.get(key, ()):
+                if (sig ^ other_sig).bit_count() <= self.max_distance:
+                    return other_id
+        for key in keys:
+            self.buckets.setdefault(key, []).append((sig, item_id))
+        return None
@@ -0,0 +1,208 @@
+# backend/documents/embed_executor.py
+import os
+import time
+import uuid
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .gemini_client import gemini_embed_batch, is_rate_limit_error
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# upper bound on threads per process; the shared limiter decides how many may actually call out
+EMBED_MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", 8))
+# cluster-wide AIMD bounds
+EMBED_MIN_INFLIGHT = float(os.getenv("EMBED_MIN_INFLIGHT", 1))
+EMBED_MAX_INFLIGHT = float(os.getenv("EMBED_MAX_INFLIGHT", 32))
+EMBED_INITIAL_INFLIGHT = float(os.getenv("EMBED_INITIAL_INFLIGHT", 4))
+# a request slower than this counts as congestion (mild decrease)
+EMBED_TARGET_LATENCY = float(os.getenv("EMBED_TARGET_LATENCY", 5.0))
+# at most one multiplicative decrease per cooldown window, so a burst of 429s halves once
+EMBED_DECREASE_COOLDOWN = float(os.getenv("EMBED_DECREASE_COOLDOWN", 2.0))
+EMBED_SLOT_TTL = int(os.getenv("EMBED_SLOT_TTL", 120))
+EMBED_ACQUIRE_TIMEOUT = float(os.getenv("EMBED_ACQUIRE_TIMEOUT", 300))
+EMBED_RATE_LIMIT_RETRIES = int(os.getenv("EMBED_RATE_LIMIT_RETRIES", 6))
+
+KEY_PREFIX = "askyourdocs:embed:limiter"
+
+OK, SLOW, THROTTLED, ERROR = "ok", "slow", "throttled", "error"
+
+# KEYS: limit, slots ; ARGV: now, ttl, token, initial
+_ACQUIRE_LUA = """
+local now = tonumber(ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+local limit = tonumber(redis.call('GET', KEYS[1]) or ARGV[4])
+if redis.call('ZCARD', KEYS[2]) < math.floor(limit) then
+  redis.call('ZADD', KEYS[2], now + tonumber(ARGV[2]), ARGV[3])
+  return 1
+end
+return 0
+"""
+
+# KEYS: limit, slots, last_decrease ; ARGV: token, now, outcome, initial, min, max, cooldown
+_RELEASE_LUA = """
+redis.call('ZREM', KEYS[2], ARGV[1])
+local now = tonumber(ARGV[2])
+local limit = tonumber(redis.call('GET', KEYS[1]) or ARGV[4])
+if ARGV[3] == 'ok' then
+  limit = math.min(tonumber(ARGV[6]), limit + 1 / limit)
+elseif ARGV[3] ~= 'error' then
+  local last = tonumber(redis.call('GET', KEYS[3]) or '0')
+  if now - last >= tonumber(ARGV[7]) then
+    local factor = 0.8
+    if ARGV[3] == 'throttled' then factor = 0.5 end
+    limit = math.max(tonumber(ARGV[5]), limit * factor)
+    redis.call('SET', KEYS[3], tostring(now))
+  end
+end
+redis.call('SET', KEYS[1], tostring(limit))
+return tostring(limit)
+"""
+
+
+class RedisAIMDLimiter:
+    """
+    Concurrency limiter shared by every Celery worker process through Redis.
+
+    In-flight requests hold a lease in a sorted set (scored by expiry, so a
+    crashed worker cannot leak slots). The limit grows by ~1 per window of
+    successful calls and shrinks multiplicatively on 429 or slow responses.
+    """
+
+    def __init__(self, r, prefix: str = KEY_PREFIX):
+        self.r = r
+        self.keys_limit = f"{prefix}:limit"
+        self.keys_slots = f"{prefix}:slots"
+        self.keys_last_decrease = f"{prefix}:last_decrease"
+        self._acquire = r.register_script(_ACQUIRE_LUA)
+        self._release = r.register_script(_RELEASE_LUA)
+
+    def acquire(self, timeout: float = EMBED_ACQUIRE_TIMEOUT) -> str:
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + timeout
+        while True:
+            ok = self._acquire(
+                keys=[self.keys_limit, self.keys_slots],
+                args=[time.time(), EMBED_SLOT_TTL, token, EMBED_INITIAL_INFLIGHT],
+            )
+            if ok:
+                return token
+            if time.monotonic() > deadline:
+                raise TimeoutError("timed out waiting for an embedding slot")
+            time.sleep(0.05 + random.random() * 0.1)
+
+    def release(self, token: str, outcome: str = OK) -> float:
+        limit = self._release(
+            keys=[self.keys_limit, self.keys_slots, self.keys_last_decrease],
+            args=[token, time.time(), outcome, EMBED_INITIAL_INFLIGHT,
+                  EMBED_MIN_INFLIGHT, EMBED_MAX_INFLIGHT, EMBED_DECREASE_COOLDOWN],
+        )
+        return float(limit)
+
+    def current_limit(self) -> float:
+        val = self.r.get(self.keys_limit)
+        return float(val) if val is not None else EMBED_INITIAL_INFLIGHT
+
+
+class LocalAIMDLimiter:
+    """
+    Same AIMD policy as RedisAIMDLimiter, scoped to this process.
+    Used when Redis is unreachable (e.g. running ingestion from a shell).
+    """
+
+    def __init__(self):
+        self.limit = EMBED_INITIAL_INFLIGHT
+        self.inflight = 0
+        self.last_decrease = 0.0
+        self.cond = threading.Condition()
+
+    def acquire(self, timeout: float = EMBED_ACQUIRE_TIMEOUT) -> str:
+        with self.cond:
+            ok = self.cond.wait_for(lambda: self.inflight < int(self.limit), timeout=timeout)
+            if not ok:
+                raise TimeoutError("timed out waiting for an embedding slot")
+            self.inflight += 1
+            return uuid.uuid4().hex
+
+    def release(self, token: str, outcome: str = OK) -> float:
+        with self.cond:
+            self.inflight -= 1
+            now = time.time()
+            if outcome == OK:
+                self.limit = min(EMBED_MAX_INFLIGHT, self.limit + 1 / self.limit)
+            elif outcome != ERROR and now - self.last_decrease >= EMBED_DECREASE_COOLDOWN:
+                factor = 0.5 if outcome == THROTTLED else 0.8
+                self.limit = max(EMBED_MIN_INFLIGHT, self.limit * factor)
+                self.last_decrease = now
+            self.cond.notify_all()
+            return self.limit
+
+    def current_limit(self) -> float:
+        return self.limit
+
+
+_limiter = None
+
+
+def get_limiter():
+    global _limiter
+    if _limiter is None:
+        try:
+            r = get_redis()
+            r.ping()
+            _limiter = RedisAIMDLimiter(r)
+        except Exception as exc:
+            logger.warning("Redis unavailable for embed limiter, using process-local limiter: %s", exc)
+            _limiter = LocalAIMDLimiter()
+    return _limiter
+
+
+class EmbeddingExecutor:
+    """
+    Thread pool for gemini_embed_batch calls, gated by the shared AIMD limiter.
+
+        with EmbeddingExecutor() as ex:
+            fut = ex.submit(texts)
+            vectors = fut.result()
+    """
+
+    def __init__(self, max_workers: int | None = None, limiter=None):
+        self.max_workers = max_workers or EMBED_MAX_CONCURRENCY
+        self.limiter = limiter or get_limiter()
+        self.pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="embed")
+
+    def submit(self, texts, model: str | None = None, dim: int | None = None):
+        return self.pool.submit(self._embed, list(texts), model, dim)
+
+    def _embed(self, texts, model=None, dim=None):
+        for attempt in range(EMBED_RATE_LIMIT_RETRIES + 1):
+            token = self.limiter.acquire()
+            t0 = time.monotonic()
+            try:
+                vectors = gemini_embed_batch(texts, retry_rate_limited=False, model=model, dim=dim)
+            except Exception as exc:
+                if is_rate_limit_error(exc) and attempt < EMBED_RATE_LIMIT_RETRIES:
+                    limit = self.limiter.release(token, THROTTLED)
+                    delay = min(30, 2 ** attempt) + random.random()
+                    logger.info("embed throttled, limit now %.2f, backing off %.1fs", limit, delay)
+                    time.sleep(delay)
+                    continue
+                # non-throttle failures say nothing about capacity; leave the limit alone
+                self.limiter.release(token, ERROR)
+                raise
+            latency = time.monotonic() - t0
+            self.limiter.release(token, SLOW if latency > EMBED_TARGET_LATENCY else OK)
+            return vectors
+
+    def shutdown(self, wait: bool = True):
+        self.pool.shutdown(wait=wait, cancel_futures=not wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown(wait=exc_type is None)
+        return False
@@ -0,0 +1,98 @@
+# backend/documents/embedding_cache.py
+import os
+import logging
+from array import array
+
+from .models import EmbeddingCache as EmbeddingCacheRow
+from .gemini_client import EMBED_MODEL
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+EMBED_DIM = int(os.getenv("EMBED_DIM", 768))
+# hot tier: recently used vectors in Redis; Postgres is the source of truth
+EMBED_CACHE_REDIS_TTL = int(os.getenv("EMBED_CACHE_REDIS_TTL", 7 * 24 * 3600))
+EMBED_CACHE_DB_BATCH = 500
+
+
+def pack_vector(vec) -> bytes:
+    return array("f", vec).tobytes()
+
+
+def unpack_vector(data) -> list[float]:
+    arr = array("f")
+    arr.frombytes(bytes(data))
+    return arr.tolist()
+
+
+class EmbeddingCache:
+    """
+    Embedding lookups keyed by (embed model, dim, chunk_hash).
+
+    get_many() checks Redis first, then Postgres, and backfills Redis with the
+    Postgres hits. set_many() writes both tiers. Redis errors are logged and
+    treated as misses; the cache never fails an ingest.
+    """
+
+    def __init__(self, model: str = EMBED_MODEL, dim: int = EMBED_DIM, use_redis: bool = True):
+        self.model = model
+        self.dim = dim
+        self.redis = None
+        if use_redis:
+            try:
+                self.redis = get_redis()
+            except Exception as exc:
+                logger.warning("embedding cache: redis unavailable: %s", exc)
+
+    def _key(self, chunk_hash: str) -> str:
+        return f"askyourdocs:emb:{self.model}:{self.dim}:{chunk_hash}"
+
+    def get_many(self, hashes) -> dict[str, list[float]]:
+        hashes = list(dict.fromkeys(hashes))
+        found = {}
+        if not hashes:
+            return found
+
+        if self.redis is not None:
+            try:
+                for h, raw in zip(hashes, self.redis.mget([self._key(h) for h in hashes])):
+                    if raw is not None:
+                        found[h] = unpack_vector(raw)
+            except Exception as exc:
+                logger.warning("embedding cache: redis get failed: %s", exc)
+
+        missing = [h for h in hashes if h not in found]
+        from_db = {}
+        for i in range(0, len(missing), EMBED_CACHE_DB_BATCH):
+            rows = EmbeddingCacheRow.objects.filter(
+                model=self.model, dim=self.dim, chunk_hash__in=missing[i:i + EMBED_CACHE_DB_BATCH]
+            ).values_list("chunk_hash", "vector")
+            for h, raw in rows:
+                from_db[h] = bytes(raw)
+        if from_db:
+            self._redis_set({h: raw for h, raw in from_db.items()})
+            found.update({h: unpack_vector(raw) for h, raw in from_db.items()})
+        return found
+
+    def set_many(self, vectors: dict[str, list[float]]):
+        if not vectors:
+            return
+        packed = {h: pack_vector(v) for h, v in vectors.items()}
+        EmbeddingCacheRow.objects.bulk_create(
+            [EmbeddingCacheRow(model=self.model, dim=self.dim, chunk_hash=h, vector=raw)
+             for h, raw in packed.items()],
+            ignore_conflicts=True,
+            batch_size=EMBED_CACHE_DB_BATCH,
+        )
+        self._redis_set(packed)
+
+    def _redis_set(self, packed: dict[str, bytes]):
+        if self.redis is None or not packed:
+            return
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for h, raw in packed.items():
+                pipe.set(self._key(h), raw, ex=EMBED_CACHE_REDIS_TTL)
+            pipe.execute()
+        except Exception as exc:
+            logger.warning("embedding cache: redis set failed: %s", exc)
@@ -0,0 +1,132 @@
+# backend/documents/events.py
+import os
+import json
+import time
+import uuid
+import logging
+
+from rest_framework.renderers import BaseRenderer
+
+from .progress import events_channel, read_project
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# idle streams send a comment this often so proxies don't cut them
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", 15))
+# A stream holds a server thread for its whole life (the app is served by sync
+# workers), so streams are short and capped. They end after SSE_MAX_SECONDS and
+# EventSource reconnects by itself (after SSE_RETRY_MS)
+SSE_MAX_SECONDS = float(os.getenv("SSE_MAX_SECONDS", 30))
+SSE_RETRY_MS = int(os.getenv("SSE_RETRY_MS", 2000))
+# open streams per client (user, else address) and in total, across every server process
+SSE_MAX_PER_CLIENT = int(os.getenv("SSE_MAX_PER_CLIENT", 2))
+SSE_MAX_STREAMS = int(os.getenv("SSE_MAX_STREAMS", 32))
+# over the cap, the client is told to come back after this long
+SSE_BUSY_RETRY_MS = int(os.getenv("SSE_BUSY_RETRY_MS", 15000))
+
+KEY_PREFIX = "askyourdocs:sse:streams"
+
+# KEYS: client slots, all slots ; ARGV: now, ttl, token, per client, total
+# slots are scored by expiry, so a stream whose process died cannot leak one
+_ACQUIRE_LUA = """
+local now = tonumber(ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[4]) or redis.call('ZCARD', KEYS[2]) >= tonumber(ARGV[5]) then
+  return 0
+end
+local expires = now + tonumber(ARGV[2])
+redis.call('ZADD', KEYS[1], expires, ARGV[3])
+redis.call('ZADD', KEYS[2], expires, ARGV[3])
+redis.call('EXPIRE', KEYS[1], math.ceil(tonumber(ARGV[2])))
+return 1
+"""
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets DRF content negotiation accept `Accept: text/event-stream`."""
+    media_type = "text/event-stream"
+    format = "sse"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
+
+
+def _event(name: str, data: dict) -> str:
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+
+def _slot_keys(client: str):
+    return f"{KEY_PREFIX}:{client}", KEY_PREFIX
+
+
+def acquire_stream(client: str) -> str | None:
+    """
+    Take a stream slot for client. Returns a token for release_stream, or None
+    when the client or the server already has as many streams open as allowed.
+    """
+    token = uuid.uuid4().hex
+    try:
+        r = get_redis()
+        ok = r.register_script(_ACQUIRE_LUA)(
+            keys=list(_slot_keys(client)),
+            args=[time.time(), SSE_MAX_SECONDS + 30, token, SSE_MAX_PER_CLIENT, SSE_MAX_STREAMS],
+        )
+    except Exception:
+        # without Redis the stream itself ends at once, so there is nothing to hold
+        logger.warning("event stream slots unavailable for %s", client, exc_info=True)
+        return token
+    return token if ok else None
+
+
+def release_stream(client: str, token: str):
+    try:
+        r = get_redis()
+        for key in _slot_keys(client):
+            r.zrem(key, token)
+    except Exception:
+        pass
+
+
+def busy_stream():
+    """Over the cap: tell EventSource to reconnect later, and end at once."""
+    yield f"retry: {SSE_BUSY_RETRY_MS}\n\n"
+
+
+def project_event_stream(project_id, client=None, token=None):
+    """
+    Server-sent events for one project's documents: the current state of
+    recently active documents first, then every status/progress change the
+    workers publish. Only Redis is touched, never Postgres. The stream's slot
+    (acquire_stream) is released when it ends or the client goes away.
+    """
+    pubsub = None
+    try:
+        pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(events_channel(project_id))
+        yield f"retry: {SSE_RETRY_MS}\n\n"
+        # subscribed before the snapshot, so nothing falls between the two
+        for doc_id, state in read_project(project_id).items():
+            yield _event("document", {"event": "snapshot", "document_id": doc_id, **state})
+
+        started = last_sent = time.monotonic()
+        while time.monotonic() - started < SSE_MAX_SECONDS:
+            msg = pubsub.get_message(timeout=1.0)
+            if msg is not None and msg.get("type") == "message":
+                yield _event("document", json.loads(msg["data"]))
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= SSE_HEARTBEAT_SECONDS:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+    except Exception:
+        logger.exception("event stream for project %s failed", project_id)
+    finally:
+        if pubsub is not None:
+            try:
+                pubsub.close()
+            except Exception:
+                pass
+        if token is not None:
+            release_stream(client, token)
@@ -1,5 +1,6 @@
 # backend/documents/gemini_client.py
 import os
+import time
 import requests
 import logging
 from typing import Tuple, Dict, Any
@@ -11,42 +12,154 @@ API_URL_ROOT = os.getenv("GEMINI_API_URL", "https://generativelanguage.googleapi
 EMBED_MODEL = os.getenv("GEMINI_EMBED_MODEL", "text-embedding-004")
 LLM_MODEL = os.getenv("GEMINI_LLM_MODEL", "gemini-1.5-flash")
 
-# --- existing embedding implementation should remain above ---
-def gemini_embed_batch(texts):
+# batchEmbedContents limits (per request). The API rejects more than 100 items;
+# the byte budget keeps us well under the request payload limit.
+EMBED_MAX_BATCH_ITEMS = int(os.getenv("GEMINI_EMBED_MAX_BATCH_ITEMS", 100))
+EMBED_MAX_BATCH_BYTES = int(os.getenv("GEMINI_EMBED_MAX_BATCH_BYTES", 4 * 1024 * 1024))
+EMBED_MAX_RETRIES = int(os.getenv("GEMINI_EMBED_MAX_RETRIES", 3))
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def _embed_url(method: str, model: str | None = None) -> str:
+    return f"{API_URL_ROOT.rstrip('/')}/v1beta/models/{model or EMBED_MODEL}:{method}?key={API_KEY}"
+
+
+def _parse_embedding(emb_obj):
     """
-    Call Google Generative Language API embedContent endpoint for each text.
-    Returns list[list[float]].
+    Google returns embedding as either {"value": [...]} or {"values": [...]}.
+    Returns list[float] or None.
     """
-    if not API_KEY:
-        raise RuntimeError("GEMINI_API_KEY missing")
+    if not isinstance(emb_obj, dict):
+        return None
+    emb = emb_obj.get("values") or emb_obj.get("value")
+    return list(emb) if emb else None
 
-    embeddings = []
-    for text in texts:
-        url = f"{API_URL_ROOT.rstrip('/')}/v1beta/models/{EMBED_MODEL}:embedContent?key={API_KEY}"
 
-        body = {
-            "model": EMBED_MODEL,
-            "content": {"parts": [{"text": text}]}
-        }
+def is_rate_limit_error(exc) -> bool:
+    """
+    True for 429 / RESOURCE_EXHAUSTED responses from the Gemini API.
+    """
+    resp = getattr(exc, "response", None)
+    if resp is None:
+        return False
+    if resp.status_code == 429:
+        return True
+    try:
+        return "RESOURCE_EXHAUSTED" in resp.text
+    except Exception:
+        return False
+
 
-        resp = requests.post(url, json=body, timeout=30)
+def _post_with_retry(url, body, timeout=30, retry_rate_limited=True):
+    """
+    POST with exponential backoff on 429/5xx, connection errors and timeouts.
+    Other errors are raised immediately. retry_rate_limited=False raises on the
+    first throttled response (the embed executor handles that backoff itself so
+    it can adjust its concurrency).
+    """
+    for attempt in range(EMBED_MAX_RETRIES + 1):
+        try:
+            resp = requests.post(url, json=body, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout) as exc:
+            if attempt >= EMBED_MAX_RETRIES:
+                raise
+            delay = 2 ** attempt
+            logger.warning("Gemini embed %s (attempt %d), retrying in %ss", type(exc).__name__, attempt + 1, delay)
+            time.sleep(delay)
+            continue
+        if resp.status_code in RETRYABLE_STATUS and attempt < EMBED_MAX_RETRIES:
+            if resp.status_code == 429 and not retry_rate_limited:
+                resp.raise_for_status()
+            delay = 2 ** attempt
+            logger.warning("Gemini embed %s (attempt %d), retrying in %ss", resp.status_code, attempt + 1, delay)
+            time.sleep(delay)
+            continue
         resp.raise_for_status()
-        data = resp.json()
-
-        # Google returns embedding as either {"embedding":{"value": [...]}} or {"embedding":{"values":[...]}}
-        emb = None
-        emb_obj = data.get("embedding") or {}
-        if "value" in emb_obj:
-            emb = emb_obj["value"]
-        elif "values" in emb_obj:
-            emb = emb_obj["values"]
-        else:
-            # defensive: try known shapes
-            if "result" in data and "embedding" in data["result"]:
-                emb = data["result"]["embedding"].get("values") or data["result"]["embedding"].get("value")
-        if emb is None:
-            raise RuntimeError(f"unexpected embedding response shape: {data}")
-        embeddings.append(list(emb))
+        return resp.json()
+
+
+def _embed_request(text: str, model: str | None = None, dim: int | None = None) -> dict:
+    req = {"model": f"models/{model or EMBED_MODEL}", "content": {"parts": [{"text": text}]}}
+    if dim:
+        # models with flexible output size truncate to this; others reject it
+        req["outputDimensionality"] = dim
+    return req
+
+
+def _embed_single(text: str, retry_rate_limited=True, model: str | None = None, dim: int | None = None):
+    body = _embed_request(text, model, dim)
+    data = _post_with_retry(_embed_url("embedContent", model), body, retry_rate_limited=retry_rate_limited)
+
+    emb = _parse_embedding(data.get("embedding"))
+    if emb is None and "result" in data:
+        # defensive: try known shapes
+        emb = _parse_embedding(data["result"].get("embedding"))
+    if emb is None:
+        raise RuntimeError(f"unexpected embedding response shape: {data}")
+    return emb
+
+
+def _split_batches(texts):
+    """
+    Yield (start_index, texts) slices that respect the per-request item and byte limits.
+    """
+    start, cur, cur_bytes = 0, [], 0
+    for i, text in enumerate(texts):
+        size = len(text.encode("utf-8"))
+        if cur and (len(cur) >= EMBED_MAX_BATCH_ITEMS or cur_bytes + size > EMBED_MAX_BATCH_BYTES):
+            yield start, cur
+            start, cur, cur_bytes = i, [], 0
+        cur.append(text)
+        cur_bytes += size
+    if cur:
+        yield start, cur
+
+
+def _embed_request_batch(texts, retry_rate_limited=True, model: str | None = None, dim: int | None = None):
+    """
+    One :batchEmbedContents call. Returns list aligned with `texts`; entries the
+    API did not return a usable vector for are None.
+    """
+    body = {"requests": [_embed_request(t, model, dim) for t in texts]}
+    data = _post_with_retry(_embed_url("batchEmbedContents", model), body, timeout=60, retry_rate_limited=retry_rate_limited)
+    items = data.get("embeddings") or []
+    if len(items) != len(texts):
+        # responses are matched to requests by position; a short or long list can't be aligned
+        raise RuntimeError(f"batchEmbedContents returned {len(items)} embeddings for {len(texts)} texts")
+    return [_parse_embedding(e) for e in items]
+
+
+def gemini_embed_batch(texts, retry_rate_limited=True, model: str | None = None, dim: int | None = None):
+    """
+    Embed texts via the batchEmbedContents endpoint, one HTTP call per batch.
+    Batches are split at the provider's item/byte limits. Items missing from a
+    batch response are retried individually via embedContent.
+    model defaults to GEMINI_EMBED_MODEL; the live collection may use another
+    one (see qdrant_client.resolve_collection). dim is sent as
+    outputDimensionality, and vectors of any other size are an error rather
+    than something Qdrant rejects later.
+    Returns list[list[float]] in input order.
+    """
+    if not API_KEY:
+        raise RuntimeError("GEMINI_API_KEY missing")
+
+    texts = list(texts)
+    embeddings = [None] * len(texts)
+    for start, batch in _split_batches(texts):
+        for offset, emb in enumerate(_embed_request_batch(batch, retry_rate_limited=retry_rate_limited, model=model, dim=dim)):
+            embeddings[start + offset] = emb
+
+    missing = [i for i, emb in enumerate(embeddings) if emb is None]
+    if missing:
+        logger.warning("Gemini batch embed returned %d empty items; retrying individually", len(missing))
+        for i in missing:
+            embeddings[i] = _embed_single(texts[i], retry_rate_limited=retry_rate_limited, model=model, dim=dim)
+    # every vector, not just the first: one odd item would otherwise fail the whole upsert later
+    expected = dim or (len(embeddings[0]) if embeddings else 0)
+    bad = [emb for emb in embeddings if len(emb) != expected]
+    if bad:
+        raise RuntimeError(f"{model or EMBED_MODEL} returned {len(bad[0])}-dimensional vectors for "
+                           f"{len(bad)} of {len(texts)} texts, expected {expected}")
     return embeddings
 
 def extract_text_from_gemini(data):
@@ -0,0 +1,66 @@
+# backend/documents/hydration.py
+import os
+import logging
+import threading
+from collections import OrderedDict
+
+from .models import DocumentChunk
+
+logger = logging.getLogger(__name__)
+
+# chunk text is immutable per chunk id, so a small per-process LRU is always safe
+HYDRATE_CACHE_SIZE = int(os.getenv("HYDRATE_CACHE_SIZE", 4096))
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def _chunk_id(item):
+    p = item.get("payload") or {}
+    return p.get("chunk_id") or item.get("id")
+
+
+def fetch_chunk_texts(chunk_ids) -> dict[str, str]:
+    """
+    {chunk_id: text} for the given ids: LRU first, then one Postgres query for the rest.
+    """
+    ids = [str(c) for c in dict.fromkeys(chunk_ids) if c]
+    found, missing = {}, []
+    with _lock:
+        for cid in ids:
+            if cid in _cache:
+                _cache.move_to_end(cid)
+                found[cid] = _cache[cid]
+            else:
+                missing.append(cid)
+    if missing:
+        rows = DocumentChunk.objects.filter(id__in=missing).values_list("id", "text")
+        fetched = {str(pk): text for pk, text in rows}
+        found.update(fetched)
+        with _lock:
+            _cache.update(fetched)
+            while len(_cache) > HYDRATE_CACHE_SIZE:
+                _cache.popitem(last=False)
+    return found
+
+
+def hydrate_results(results):
+    """
+    Fill payload["text"] on search results ({id, score, payload}) from chunk rows.
+    Results whose payload already carries text (pre-slim points) are left alone.
+    Mutates and returns `results`.
+    """
+    need = [r for r in results if not (r.get("payload") or {}).get("text")]
+    if not need:
+        return results
+    texts = fetch_chunk_texts(_chunk_id(r) for r in need)
+    for r in need:
+        text = texts.get(str(_chunk_id(r)))
+        if text is None:
+            logger.debug("no chunk row for search result %s", r.get("id"))
+            continue
+        r.setdefault("payload", {})
+        if r["payload"] is None:
+            r["payload"] = {}
+        r["payload"]["text"] = text
+    return results
@@ -0,0 +1,143 @@
+# backend/documents/ingest_clone.py
+import os
+import time
+import uuid
+import logging
+
+from django.db import transaction
+
+from .models import Document, DocumentChunk
+from .embedding_cache import EmbeddingCache
+from .ingest_pipeline import ingest_config
+
+logger = logging.getLogger(__name__)
+
+CLONE_BATCH = int(os.getenv("INGEST_CLONE_BATCH", 256))
+
+
+class CloneUnavailable(Exception):
+    """The source document's vectors could not all be found; ingest normally instead."""
+
+
+def find_clone_source(doc, qclient):
+    """
+    Another live, fully ingested document with the same bytes and the same
+    chunking/embedding config (any project). Oldest first so clones of clones
+    all point back at one original.
+    """
+    return (
+        Document.objects.filter(
+            sha256=doc.sha256,
+            is_deleted=False,
+            status="done",
+            metadata__ingest_config=ingest_config(qclient.embed_model, qclient.embed_dim),
+        )
+        .exclude(id=doc.id)
+        .order_by("uploaded_at")
+        .first()
+    )
+
+
+def _clear(doc, qclient):
+    ids = [str(pk) for pk in DocumentChunk.objects.filter(document=doc).values_list("id", flat=True)]
+    for i in range(0, len(ids), 1000):
+        qclient.delete_points(ids[i:i + 1000])
+    DocumentChunk.objects.filter(document=doc).delete()
+
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def clone_document(source, target, qclient) -> dict:
+    """
+    Copy source's live chunks and Qdrant points to target with fresh ids and
+    target's project in the payload. No extraction, no embedding calls:
+    vectors are read back from Qdrant (falling back to the embedding cache).
+    Near-duplicate rows are copied without a point, pointing at the copy of
+    their representative.
+    Raises CloneUnavailable, after removing anything it wrote, if a vector
+    can't be found.
+    """
+    t0 = time.monotonic()
+    # a retried task may find rows from an earlier attempt
+    _clear(target, qclient)
+
+    project_id = str(target.project.id) if target.project else None
+    cache = None
+    created = 0
+    chunks = (DocumentChunk.objects.filter(document=source, is_deleted=False)
+              .order_by("page", "chunk_index"))
+    try:
+        for batch in _batched(chunks.iterator(chunk_size=CLONE_BATCH), CLONE_BATCH):
+            with_points = [c for c in batch if c.duplicate_of_id is None]
+            vectors = qclient.retrieve_vectors([str(c.id) for c in with_points])
+            missing = [c.chunk_hash for c in with_points if str(c.id) not in vectors]
+            cached = {}
+            if missing:
+                cache = cache or EmbeddingCache(model=qclient.embed_model, dim=qclient.embed_dim)
+                cached = cache.get_many(missing)
+                if len(cached) < len(set(missing)):
+                    raise CloneUnavailable(
+                        f"{len(set(missing)) - len(cached)} vectors of document {source.id} not found"
+                    )
+
+            rows, ids, vecs, payloads = [], [], [], []
+            for c in batch:
+                # derived from the source id, so duplicate_of can be remapped without a lookup table
+                chunk_id = uuid.uuid5(target.id, str(c.id))
+                rows.append(DocumentChunk(
+                    id=chunk_id,
+                    document=target,
+                    project=target.project,
+                    text=c.text,
+                    page=c.page,
+                    chunk_index=c.chunk_index,
+                    token_count=c.token_count,
+                    chunk_hash=c.chunk_hash,
+                    duplicate_of_id=uuid.uuid5(target.id, str(c.duplicate_of_id)) if c.duplicate_of_id else None,
+                ))
+                if c.duplicate_of_id is not None:
+                    continue
+                point_id = str(chunk_id)
+                ids.append(point_id)
+                vecs.append(vectors.get(str(c.id)) or cached[c.chunk_hash])
+                payloads.append({
+                    "document_id": str(target.id),
+                    "chunk_id": point_id,
+                    "project_id": project_id,
+                    "page": c.page,
+                    "chunk_index": c.chunk_index,
+                    "is_deleted": False,
+                })
+
+            # same commit discipline as IngestPipeline._persist
+            try:
+                with transaction.atomic():
+                    DocumentChunk.objects.bulk_create(rows)
+                    qclient.upsert_vectors(ids, vecs, payloads)
+            except Exception:
+                try:
+                    qclient.delete_points(ids)
+                except Exception:
+                    logger.exception("failed to remove qdrant points after aborted clone batch (doc %s)", target.id)
+                raise
+            created += len(rows)
+    except CloneUnavailable:
+        _clear(target, qclient)
+        raise
+
+    result = {
+        "created_chunks": created,
+        "cloned_from": str(source.id),
+        "seconds": round(time.monotonic() - t0, 3),
+    }
+    logger.info("ingest %s: cloned from %s: %s", target.id, source.id, result)
+    return result
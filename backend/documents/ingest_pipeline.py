@@ -0,0 +1,689 @@
+# backend/documents/ingest_pipeline.py
+import os
+import time
+import uuid
+import queue
+import logging
+import threading
+from collections import deque
+
+from django.db import models, transaction
+
+from .models import Document, DocumentChunk
+from .utils import token_chunks, sha256_text, tokenizer_name, CHUNKER_VERSION
+from .embed_executor import EmbeddingExecutor
+from .embedding_cache import EmbeddingCache
+from .progress import ProgressReporter, METRICS as PROGRESS_METRICS
+from . import text_cache
+from .dedupe import (learn_boilerplate, strip_boilerplate, simhash, NearDuplicateIndex,
+                     STRIP_BOILERPLATE, NEAR_DUP_MAX_DISTANCE, DEDUPE_VERSION)
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = int(os.getenv("EMBED_BATCH", 64))
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", 600))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", 80))
+# chunks are embedded from their first N characters
+EMBED_TEXT_CHARS = 800
+# bounded queues between stages: peak memory is ~ queue depth, not document size
+PAGE_QUEUE_DEPTH = int(os.getenv("INGEST_PAGE_QUEUE", 16))
+BATCH_QUEUE_DEPTH = int(os.getenv("INGEST_BATCH_QUEUE", 4))
+# fan-out: documents with fewer pages stay on the single-task path
+FANOUT_MIN_PAGES = int(os.getenv("INGEST_FANOUT_MIN_PAGES", 100))
+# each page-range subtask aims for about this much extracted text
+FANOUT_TARGET_CHARS = int(os.getenv("INGEST_FANOUT_TARGET_CHARS", 400_000))
+FANOUT_MIN_RANGE = int(os.getenv("INGEST_FANOUT_MIN_RANGE", 20))
+FANOUT_MAX_RANGE = int(os.getenv("INGEST_FANOUT_MAX_RANGE", 250))
+
+_DONE = object()
+
+
+class _Failed:
+    def __init__(self, exc):
+        self.exc = exc
+
+
+class StageStats:
+    """
+    Item count and busy time for one pipeline stage.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.seconds = 0.0
+
+    def add(self, items: int, seconds: float):
+        self.items += items
+        self.seconds += seconds
+
+    def as_dict(self) -> dict:
+        rate = self.items / self.seconds if self.seconds else None
+        return {"items": self.items, "seconds": round(self.seconds, 3),
+                "per_sec": round(rate, 2) if rate else None}
+
+
+def plan_page_ranges(page_count: int, avg_chars: float) -> list[tuple[int, int]]:
+    """
+    Split 1..page_count into inclusive ranges sized by text density: dense pages
+    get smaller ranges. Small documents get a single range.
+    """
+    if page_count <= 0:
+        return []
+    if page_count < FANOUT_MIN_PAGES:
+        return [(1, page_count)]
+    size = int(FANOUT_TARGET_CHARS / max(avg_chars, 1.0))
+    size = max(FANOUT_MIN_RANGE, min(FANOUT_MAX_RANGE, size))
+    return [(start, min(start + size - 1, page_count)) for start in range(1, page_count + 1, size)]
+
+
+def chunk_config() -> dict:
+    """
+    The settings that determine a document's chunks (rebuild_chunks redoes
+    documents whose stored config differs in any of these).
+    """
+    return {
+        "chunker": CHUNKER_VERSION,
+        "tokenizer": tokenizer_name(),
+        "chunk_tokens": CHUNK_TOKENS,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "dedupe": DEDUPE_VERSION,
+        "extractor": text_cache.EXTRACTOR_VERSION,
+    }
+
+
+def ingest_config(embed_model: str, embed_dim: int) -> dict:
+    """
+    Everything that determines a document's chunks and vectors. Stored on the
+    document when ingestion finishes; documents with equal sha256 and config
+    have interchangeable chunks (see ingest_clone.py). embed_model/embed_dim
+    are those of the collection the vectors were written to (the wrapper's,
+    not the env default); changing them is rebuild_collection's job.
+    """
+    return {
+        **chunk_config(),
+        "embed_model": embed_model,
+        "embed_dim": embed_dim,
+        "embed_text_chars": EMBED_TEXT_CHARS,
+    }
+
+
+def range_key(start_page: int, end_page: int) -> str:
+    return f"{start_page}-{end_page}"
+
+
+def collapse_range_duplicates(doc, qclient) -> int:
+    """
+    Page-range subtasks each dedupe against their own index, so a chunk
+    repeated in two ranges is kept twice. Once every range is in, walk the
+    document's representatives in page order through one index: a later
+    near-duplicate becomes a pointer to the first one (row kept, point
+    removed), and pointers at it move along. Returns how many collapsed.
+    """
+    if NEAR_DUP_MAX_DISTANCE < 0:
+        return 0
+    index = NearDuplicateIndex()
+    remap = {}
+    reps = (DocumentChunk.objects.filter(document=doc, duplicate_of__isnull=True)
+            .order_by("page", "chunk_index").values_list("id", "text"))
+    for chunk_id, text in reps.iterator(chunk_size=1000):
+        sig = simhash(text)
+        if sig is None:
+            continue
+        rep_id = index.find_or_add(sig, chunk_id)
+        if rep_id is not None:
+            remap[chunk_id] = rep_id
+
+    by_rep = {}
+    for chunk_id, rep_id in remap.items():
+        by_rep.setdefault(rep_id, []).append(chunk_id)
+    # same order as _persist: rows first, points inside the transaction so a failed delete rolls back
+    with transaction.atomic():
+        for rep_id, ids in by_rep.items():
+            for i in range(0, len(ids), 1000):
+                part = ids[i:i + 1000]
+                DocumentChunk.objects.filter(duplicate_of_id__in=part).update(duplicate_of_id=rep_id)
+                DocumentChunk.objects.filter(id__in=part).update(duplicate_of_id=rep_id)
+        point_ids = [str(pk) for pk in remap]
+        for i in range(0, len(point_ids), 1000):
+            qclient.delete_points(point_ids[i:i + 1000])
+    if remap:
+        logger.info("ingest %s: %d near-duplicate chunks across page ranges collapsed", doc.id, len(remap))
+    return len(remap)
+
+
+class IngestPipeline:
+    """
+    Streaming ingestion for one Document (or one page range of it):
+
+        extract (thread) -> [pages] -> chunk (thread) -> [batches] -> embed (executor) -> persist
+
+    The calling thread submits batches to the embedding executor and persists
+    completed ones (DB rows + Qdrant upsert) in order, while later batches are
+    still being extracted, chunked and embedded. All DB access stays on the
+    calling thread.
+
+    incremental=True re-ingests a new version of an already ingested document:
+    chunks whose hash matches an existing row keep their row and point (only
+    page/chunk_index are updated), new chunks are embedded and inserted, and
+    rows not matched by the end are soft-deleted. Checkpoints are not used in
+    this mode; a retry simply re-runs the diff.
+    """
+
+    use_checkpoints = True
+
+    def __init__(self, doc, path: str, qclient, start_page: int = 1, end_page: int | None = None,
+                 executor: EmbeddingExecutor | None = None, cache: EmbeddingCache | None = None,
+                 incremental: bool = False, progress: ProgressReporter | None = None):
+        self.doc = doc
+        self.progress = progress
+        self.incremental = incremental
+        self.path = path
+        self.start_page = start_page
+        self.end_page = end_page
+        self.qclient = qclient
+        self.executor = executor
+        # vectors must match the collection qclient writes to, whatever the env default model is
+        self.cache = cache or EmbeddingCache(model=qclient.embed_model, dim=qclient.embed_dim)
+        # chunk_hash -> (future, index) for embeddings still in flight, so a
+        # repeated chunk in a later batch waits on the same request
+        self._pending_hashes = {}
+        self.cache_stats = {"hits": 0, "deduped": 0, "embedded": 0}
+        # last page of this range whose chunks are all committed (rows + points)
+        self.key = range_key(start_page, end_page or "")
+        checkpoints = (doc.metadata or {}).get("ingest_checkpoints") or {}
+        self.resume_after = int(checkpoints.get(self.key) or start_page - 1)
+        if incremental:
+            self.resume_after = start_page - 1
+        # incremental mode: chunk_hash -> deque of existing rows not yet matched
+        self._existing = {}
+        self._moved = {}
+        # record id -> id of the existing row it was matched to, for near-duplicates pointing at it
+        self._id_remap = {}
+        self._old_pointers = []
+        self.diff_stats = {"kept": 0, "removed": 0}
+        self.stop = threading.Event()
+        self.stats = {name: StageStats(name) for name in ("extract", "chunk", "embed", "upsert")}
+        self.created_chunks = 0
+        # persisted vectors that came from the cache or another batch's request, not the API
+        self.cached_chunks = 0
+        self.last_done_page = self.resume_after
+        # boilerplate lines stripped in extract; near-duplicate chunks collapsed in chunk (per document,
+        # or per page range when fanned out: collapse_range_duplicates then dedupes across the ranges)
+        self.dedupe_stats = {"boilerplate_lines": 0, "lines_stripped": 0, "near_duplicates": 0}
+        self._near_dups = {}
+
+    # --- producer stages -------------------------------------------------
+
+    def _put(self, q, item):
+        while not self.stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        item = q.get()
+        if isinstance(item, _Failed):
+            raise item.exc
+        return item
+
+    def _iter_pages(self):
+        yield from self._iter_doc_pages(self.doc, self.path, self.resume_after + 1, self.end_page)
+
+    def _iter_doc_pages(self, doc, path, start_page=1, end_page=None):
+        boilerplate = learn_boilerplate(path, doc.sha256) if STRIP_BOILERPLATE else frozenset()
+        self.dedupe_stats["boilerplate_lines"] += len(boilerplate)
+        # page text comes from the extracted-text cache when this file was parsed before
+        for page_no, text in text_cache.iter_pages(path, doc.sha256, start_page=start_page, end_page=end_page):
+            text, removed = strip_boilerplate(text, boilerplate)
+            self.dedupe_stats["lines_stripped"] += removed
+            yield doc, page_no, text
+
+    def _near_duplicate_of(self, doc, chunk_id, text):
+        if NEAR_DUP_MAX_DISTANCE < 0:
+            return None
+        sig = simhash(text)
+        if sig is None:
+            return None
+        index = self._near_dups.setdefault(doc.id, NearDuplicateIndex())
+        rep_id = index.find_or_add(sig, chunk_id)
+        if rep_id is not None:
+            self.dedupe_stats["near_duplicates"] += 1
+        return rep_id
+
+    def _extract(self, out_q):
+        pages = self._iter_pages()
+        try:
+            while True:
+                t0 = time.monotonic()
+                page = next(pages, None)
+                self.stats["extract"].add(0 if page is None else 1, time.monotonic() - t0)
+                if page is None or not self._put(out_q, page):
+                    break
+            self._put(out_q, _DONE)
+        except Exception as exc:
+            self._put(out_q, _Failed(exc))
+        finally:
+            pages.close()
+
+    def _chunk(self, in_q, out_q):
+        try:
+            batch = []
+            while True:
+                item = self._get(in_q)
+                if item is _DONE:
+                    break
+                doc, page_no, page_text = item
+                t0 = time.monotonic()
+                chunks = token_chunks(page_text, chunk_tokens=CHUNK_TOKENS, overlap=CHUNK_OVERLAP)
+                for idx, chunk in enumerate(chunks):
+                    # ids are assigned here so near-duplicates can point at their representative
+                    chunk_id = uuid.uuid4()
+                    batch.append({
+                        "id": chunk_id,
+                        "duplicate_of": self._near_duplicate_of(doc, chunk_id, chunk.text),
+                        "doc": doc,
+                        "page": page_no,
+                        "chunk_index": idx,
+                        "text": chunk.text,
+                        "chunk_hash": sha256_text(chunk.text),
+                        "token_count": chunk.token_count,
+                        "page_last": idx == len(chunks) - 1,
+                    })
+                self.stats["chunk"].add(len(chunks), time.monotonic() - t0)
+                while len(batch) >= BATCH_SIZE:
+                    if not self._put(out_q, batch[:BATCH_SIZE]):
+                        return
+                    batch = batch[BATCH_SIZE:]
+            if batch:
+                self._put(out_q, batch)
+            self._put(out_q, _DONE)
+        except Exception as exc:
+            self._put(out_q, _Failed(exc))
+
+    # --- consumer side ---------------------------------------------------
+
+    def _persist(self, batch, vectors):
+        """
+        Write one batch: DocumentChunk rows via bulk_create and Qdrant points,
+        committed together. Row ids double as point IDs. vectors line up with
+        the batch's non-duplicate records; near-duplicates get a row only.
+        """
+        t0 = time.monotonic()
+        rows, ids, payloads = [], [], []
+        # payloads carry only ids and flags; text lives in DocumentChunk.text (see hydration.py)
+        for rec in batch:
+            doc = rec["doc"]
+            project_id = str(doc.project.id) if doc.project else None
+            chunk_id = rec["id"]
+            rows.append(DocumentChunk(
+                id=chunk_id,
+                document=doc,
+                text=rec["text"],
+                project=doc.project,
+                page=rec["page"],
+                chunk_index=rec["chunk_index"],
+                token_count=rec["token_count"],
+                chunk_hash=rec["chunk_hash"],
+                duplicate_of_id=self._id_remap.get(rec["duplicate_of"], rec["duplicate_of"]),
+            ))
+            if rec["duplicate_of"] is not None:
+                continue
+            point_id = str(chunk_id)
+            ids.append(point_id)
+            payloads.append({
+                "document_id": str(doc.id),
+                "chunk_id": point_id,
+                "project_id": project_id,
+                "page": rec["page"],
+                "chunk_index": rec["chunk_index"],
+                "is_deleted": False,
+            })
+
+        # a page is committed once its last chunk is; batches arrive in page order
+        finished = [rec["page"] for rec in batch if rec["page_last"]]
+
+        # the upsert runs inside the transaction: if it fails the rows roll back;
+        # if the commit fails after the upsert, the points are removed again
+        try:
+            with transaction.atomic():
+                DocumentChunk.objects.bulk_create(rows)
+                self.qclient.upsert_vectors(ids, vectors, payloads)
+                if finished and self.use_checkpoints and not self.incremental:
+                    self._save_checkpoint(max(finished))
+        except Exception:
+            try:
+                self.qclient.delete_points(ids)
+            except Exception:
+                logger.exception("failed to remove qdrant points after aborted batch (doc %s)", self.doc.id)
+            raise
+        self.created_chunks += len(batch)
+        self.stats["upsert"].add(len(ids), time.monotonic() - t0)
+        if finished:
+            self.last_done_page = max(finished)
+        self._report()
+
+    def _report(self, force: bool = False):
+        if self.progress is None:
+            return
+        self.progress.update({
+            "pages_extracted": self.resume_after - self.start_page + 1 + self.stats["extract"].items,
+            "pages_done": self.last_done_page - self.start_page + 1,
+            "chunks_created": self.created_chunks,
+            "chunks_embedded": self.stats["embed"].items,
+            "chunks_cached": self.cached_chunks,
+            "points_upserted": self.stats["upsert"].items,
+        }, force=force)
+
+    def _submit_embed(self, executor, batch):
+        """
+        Resolve each record's vector source: cache hit, an in-flight request for
+        the same chunk_hash, or a new request (one per distinct hash). Records
+        whose text this batch sends to the API are marked "embedded".
+        """
+        batch = [rec for rec in batch if rec["duplicate_of"] is None]
+        cached = self.cache.get_many(rec["chunk_hash"] for rec in batch)
+        to_embed = {}
+        sources = []
+        for rec in batch:
+            h = rec["chunk_hash"]
+            rec["embedded"] = False
+            if h in cached:
+                self.cache_stats["hits"] += 1
+                sources.append(("v", cached[h]))
+            elif h in self._pending_hashes or h in to_embed:
+                self.cache_stats["deduped"] += 1
+                sources.append(("p", h))
+            else:
+                to_embed[h] = rec["text"][:EMBED_TEXT_CHARS]  # embeds use text_snippet, as before
+                rec["embedded"] = True
+                sources.append(("p", h))
+
+        if to_embed:
+            self.cache_stats["embedded"] += len(to_embed)
+            fut = executor.submit(list(to_embed.values()), model=self.qclient.embed_model,
+                                  dim=self.qclient.embed_dim)
+            for i, h in enumerate(to_embed):
+                self._pending_hashes[h] = (fut, i)
+        # capture the futures now; later batches may drop these hashes from the map
+        return [src if src[0] == "v" else ("f",) + self._pending_hashes[src[1]] for src in sources], to_embed
+
+    def _resolve_embed(self, sources, to_embed):
+        vectors = []
+        for src in sources:
+            if src[0] == "v":
+                vectors.append(src[1])
+            else:
+                _, fut, i = src
+                vectors.append(fut.result()[i])
+        if to_embed:
+            fresh = {}
+            for h in to_embed:
+                fut, i = self._pending_hashes.pop(h)
+                fresh[h] = fut.result()[i]
+            self.cache.set_many(fresh)
+        return vectors
+
+    def _save_checkpoint(self, page: int):
+        # page-range subtasks of one document share metadata: lock the row and merge
+        locked = Document.objects.select_for_update().only("id", "metadata").get(id=self.doc.id)
+        metadata = locked.metadata or {}
+        metadata.setdefault("ingest_checkpoints", {})[self.key] = page
+        Document.objects.filter(id=self.doc.id).update(metadata=metadata)
+        self.doc.metadata = metadata
+
+    def _prepare_resume(self):
+        """
+        Drop rows/points of this range past the checkpoint (a partially
+        committed page, or everything from an attempt that predates
+        checkpoints) so a retry re-creates them exactly once.
+        """
+        in_range = models.Q(page__gt=self.resume_after)
+        if self.end_page is not None:
+            in_range &= models.Q(page__lte=self.end_page)
+        if self.start_page == 1:
+            in_range |= models.Q(page__isnull=True)
+        stale = DocumentChunk.objects.filter(document=self.doc).filter(in_range)
+        stale_ids = [str(pk) for pk in stale.values_list("id", flat=True)]
+        if stale_ids:
+            logger.info("ingest %s: removing %d uncommitted chunks past page %d",
+                        self.doc.id, len(stale_ids), self.resume_after)
+            for i in range(0, len(stale_ids), 1000):
+                self.qclient.delete_points(stale_ids[i:i + 1000])
+            stale.delete()
+        self._seed_near_duplicates()
+
+    def _seed_near_duplicates(self):
+        """
+        Representatives committed before the checkpoint still stand for later
+        near-duplicates: index them again, in chunk order, so the resumed pages
+        collapse onto them as they would have in one uninterrupted run.
+        """
+        if NEAR_DUP_MAX_DISTANCE < 0 or self.resume_after < self.start_page:
+            return
+        reps = (DocumentChunk.objects
+                .filter(document=self.doc, duplicate_of__isnull=True,
+                        page__gte=self.start_page, page__lte=self.resume_after)
+                .order_by("page", "chunk_index").values_list("id", "text"))
+        index = self._near_dups.setdefault(self.doc.id, NearDuplicateIndex())
+        for pk, text in reps.iterator(chunk_size=2000):
+            sig = simhash(text)
+            if sig is not None:
+                index.find_or_add(sig, pk)
+
+    # --- incremental (new version) mode -----------------------------------
+
+    def _load_existing(self):
+        rows = (DocumentChunk.objects.filter(document=self.doc)
+                .order_by("page", "chunk_index")
+                .values_list("id", "chunk_hash", "page", "chunk_index", "is_deleted", "duplicate_of_id"))
+        for row in rows.iterator(chunk_size=2000):
+            if row[5] is None:
+                self._existing.setdefault(row[1], deque()).append(row[:5])
+            elif not row[4]:
+                # near-duplicate rows have no point to keep; the new version gets its own, see _finish_incremental
+                self._old_pointers.append(row[0])
+
+    def _match_existing(self, batch):
+        """
+        Split off records whose chunk_hash matches an existing row; returns the
+        records that still need embedding and inserting.
+        """
+        fresh = []
+        for rec in batch:
+            rows = self._existing.get(rec["chunk_hash"])
+            if not rows or rec["duplicate_of"] is not None:
+                fresh.append(rec)
+                continue
+            pk, _, page, chunk_index, is_deleted = rows.popleft()
+            # a representative comes before its near-duplicates, so they see this before _persist
+            self._id_remap[rec["id"]] = pk
+            self.diff_stats["kept"] += 1
+            if page != rec["page"] or chunk_index != rec["chunk_index"] or is_deleted:
+                self._moved[pk] = rec
+        return fresh
+
+    def _finish_incremental(self):
+        # unchanged text that moved (or came back): update position, keep the vector
+        moved = list(self._moved.items())
+        for i in range(0, len(moved), 500):
+            part = moved[i:i + 500]
+            rows = [DocumentChunk(id=pk, page=rec["page"], chunk_index=rec["chunk_index"], is_deleted=False)
+                    for pk, rec in part]
+            with transaction.atomic():
+                DocumentChunk.objects.bulk_update(rows, ["page", "chunk_index", "is_deleted"])
+                self.qclient.set_payloads({
+                    str(pk): {"page": rec["page"], "chunk_index": rec["chunk_index"], "chunk_deleted": False}
+                    for pk, rec in part
+                })
+
+        # whatever is left was not in the new version
+        removed = [str(row[0]) for rows in self._existing.values() for row in rows if not row[4]]
+        for i in range(0, len(removed), 1000):
+            part = removed[i:i + 1000]
+            with transaction.atomic():
+                DocumentChunk.objects.filter(id__in=part).update(is_deleted=True)
+                self.qclient.set_payload(part, {"chunk_deleted": True})
+        self.diff_stats["removed"] = len(removed)
+        # near-duplicate rows of the previous version; this run wrote fresh ones
+        for i in range(0, len(self._old_pointers), 1000):
+            DocumentChunk.objects.filter(id__in=self._old_pointers[i:i + 1000]).update(is_deleted=True)
+
+    def run(self) -> dict:
+        page_q = queue.Queue(maxsize=PAGE_QUEUE_DEPTH)
+        batch_q = queue.Queue(maxsize=BATCH_QUEUE_DEPTH)
+        threads = [
+            threading.Thread(target=self._extract, args=(page_q,), name="ingest-extract", daemon=True),
+            threading.Thread(target=self._chunk, args=(page_q, batch_q), name="ingest-chunk", daemon=True),
+        ]
+        executor = self.executor or EmbeddingExecutor()
+        in_flight = deque()
+        embed_started = None
+
+        def complete_oldest():
+            batch, sources, to_embed = in_flight.popleft()
+            vectors = self._resolve_embed(sources, to_embed)
+            # embed throughput counts what the API returned; reused vectors are reported apart
+            self.stats["embed"].items += len(to_embed)
+            self.cached_chunks += len(vectors) - len(to_embed)
+            self._persist(batch, vectors)
+
+        t_start = time.monotonic()
+        if self.incremental:
+            self._load_existing()
+        else:
+            self._prepare_resume()
+        for t in threads:
+            t.start()
+        try:
+            while True:
+                batch = self._get(batch_q)
+                if batch is _DONE:
+                    break
+                if self.incremental:
+                    batch = self._match_existing(batch)
+                    if not batch:
+                        continue
+                if embed_started is None:
+                    embed_started = time.monotonic()
+                in_flight.append((batch, *self._submit_embed(executor, batch)))
+                while len(in_flight) > executor.max_workers:
+                    complete_oldest()
+            while in_flight:
+                complete_oldest()
+            if self.incremental:
+                self._finish_incremental()
+            if self.end_page is not None:
+                # trailing pages without text never produce a page_last chunk
+                self.last_done_page = self.end_page
+            self._report(force=True)
+        finally:
+            self.stop.set()
+            if self.executor is None:
+                executor.shutdown(wait=False)
+            for t in threads:
+                t.join(timeout=5)
+
+        if embed_started is not None:
+            # embedding overlaps everything else; report its wall-clock window
+            self.stats["embed"].seconds = time.monotonic() - embed_started
+        total = sum(self.cache_stats.values())
+        result = {
+            "created_chunks": self.created_chunks,
+            "pages": range_key(self.start_page, self.end_page or ""),
+            "resumed_after_page": self.resume_after,
+            **({"diff": {**self.diff_stats, "added": self.created_chunks}} if self.incremental else {}),
+            # each near-duplicate is one embedding and one point not made
+            "dedupe": {**self.dedupe_stats, "embeddings_saved": self.dedupe_stats["near_duplicates"]},
+            "embedding_cache": {
+                **self.cache_stats,
+                "hit_rate": round((total - self.cache_stats["embedded"]) / total, 3) if total else None,
+            },
+            "seconds": round(time.monotonic() - t_start, 3),
+            "stages": {name: st.as_dict() for name, st in self.stats.items()},
+        }
+        logger.info("ingest %s: %s", self.doc.id, result)
+        return result
+
+
+class DocumentGroupPipeline(IngestPipeline):
+    """
+    Several small documents through one pipeline, so their chunks share
+    embedding requests and upserts instead of each document making its own
+    partial-batch call. Documents are read one after another in order.
+
+    No checkpoints: a retry removes the group's rows and starts over, which is
+    cheap for the small documents this is used for.
+
+    progress maps document id -> ProgressReporter; each document's counters
+    are reported to its own reporter, as if it had been ingested alone.
+    """
+
+    use_checkpoints = False
+
+    def __init__(self, sources, qclient, executor: EmbeddingExecutor | None = None,
+                 cache: EmbeddingCache | None = None, progress: dict[str, ProgressReporter] | None = None):
+        # sources: [(doc, path), ...]
+        super().__init__(sources[0][0], None, qclient, executor=executor, cache=cache)
+        self.sources = sources
+        self.per_document = {str(doc.id): 0 for doc, _ in sources}
+        self.reporters = progress or {}
+        self.doc_progress = {str(doc.id): dict.fromkeys(PROGRESS_METRICS, 0) for doc, _ in sources}
+        self._touched = set()
+
+    def _iter_pages(self):
+        for doc, path in self.sources:
+            counts = self.doc_progress[str(doc.id)]
+            for page in self._iter_doc_pages(doc, path):
+                counts["pages_extracted"] += 1
+                yield page
+
+    def _count(self, batch, sign: int):
+        for rec in batch:
+            counts = self.doc_progress[str(rec["doc"].id)]
+            counts["chunks_created"] += sign
+            if rec["duplicate_of"] is None:
+                counts["chunks_embedded" if rec["embedded"] else "chunks_cached"] += sign
+                counts["points_upserted"] += sign
+            if rec["page_last"]:
+                counts["pages_done"] += sign
+
+    def _prepare_resume(self):
+        stale = DocumentChunk.objects.filter(document__in=[doc for doc, _ in self.sources])
+        stale_ids = [str(pk) for pk in stale.values_list("id", flat=True)]
+        if stale_ids:
+            logger.info("ingest group of %d: removing %d chunks from an earlier attempt",
+                        len(self.sources), len(stale_ids))
+            for i in range(0, len(stale_ids), 1000):
+                self.qclient.delete_points(stale_ids[i:i + 1000])
+            stale.delete()
+
+    def _persist(self, batch, vectors):
+        # counted first so the report at the end of the batch includes it
+        self._touched = {str(rec["doc"].id) for rec in batch}
+        self._count(batch, 1)
+        try:
+            super()._persist(batch, vectors)
+        except Exception:
+            self._count(batch, -1)
+            raise
+        for rec in batch:
+            self.per_document[str(rec["doc"].id)] += 1
+
+    def _report(self, force: bool = False):
+        # run() forces one report once everything is persisted; pages without text count as done then
+        for doc_id in (self.reporters if force else self._touched & self.reporters.keys()):
+            counts = self.doc_progress[doc_id]
+            if force:
+                counts["pages_done"] = counts["pages_extracted"]
+            self.reporters[doc_id].update(counts, force=force)
+
+    def run(self) -> dict:
+        result = super().run()
+        result.pop("pages", None)
+        result.pop("resumed_after_page", None)
+        result["documents"] = self.per_document
+        return result
@@ -0,0 +1,97 @@
+# backend/documents/management/commands/bench_chunker.py
+import math
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from documents.utils import count_tokens, token_chunks, tokenizer_name
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, math.ceil(len(text.split()) / 0.75))
+
+
+def chunk_text_legacy(text: str, chunk_tokens: int = 600, overlap: int = 80) -> list:
+    """
+    The previous line-accumulating chunker (word-count estimate, whitespace-joined
+    lines), kept here only as the benchmark baseline.
+    """
+    lines = [l.strip() for l in text.splitlines() if l.strip()]
+    chunks = []
+    cur = []
+    cur_tokens = 0
+    for line in lines:
+        tkns = _estimate_tokens(line)
+        if cur and (cur_tokens + tkns) > chunk_tokens:
+            chunks.append(" ".join(cur))
+            if overlap > 0:
+                last_words = " ".join(" ".join(cur).split()[-overlap:])
+                cur = [last_words] if last_words else []
+                cur_tokens = _estimate_tokens(last_words)
+            else:
+                cur = []
+                cur_tokens = 0
+        cur.append(line)
+        cur_tokens += tkns
+    if cur:
+        chunks.append(" ".join(cur))
+    return chunks
+
+
+def _synthetic_page(lines: int, seed: int = 0) -> str:
+    rnd = random.Random(seed)
+    vocab = ["torque", "valve", "assembly", "the", "of", "and", "pressure", "section", "maintenance",
+             "inspect", "replace", "warning", "figure", "table", "must", "be", "before", "operating"]
+    out = []
+    for i in range(lines):
+        words = [rnd.choice(vocab) for _ in range(rnd.randint(3, 14))]
+        line = " ".join(words).capitalize()
+        out.append(line + ("." if i % 3 == 0 else ""))
+        if i % 25 == 24:
+            out.append("")
+    return "\n".join(out)
+
+
+class Command(BaseCommand):
+    help = ("Compare the old line-accumulating chunker against token_chunks on synthetic dense pages. "
+            "'legacy' sizes chunks from a word-count estimate; 'legacy+count' adds the per-chunk "
+            "tokenizer pass it needs for a real token_count, which token_chunks always reports.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lines", type=int, nargs="+", default=[200, 1000, 5000, 20000])
+        parser.add_argument("--chunk-tokens", type=int, default=600)
+        parser.add_argument("--overlap", type=int, default=80)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def _time(self, fn, repeat):
+        best = float("inf")
+        result = None
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            result = fn()
+            best = min(best, time.perf_counter() - t0)
+        return best, result
+
+    def handle(self, *args, **opts):
+        self.stdout.write(f"tokenizer: {tokenizer_name()}")
+        self.stdout.write(
+            f"{'lines':>8} {'chars':>10} {'legacy s':>10} {'legacy+count s':>15} {'new s':>10} "
+            f"{'vs legacy':>10} {'vs +count':>10} {'chunks':>12}"
+        )
+        for lines in opts["lines"]:
+            page = _synthetic_page(lines)
+            legacy_s, legacy = self._time(
+                lambda: chunk_text_legacy(page, chunk_tokens=opts["chunk_tokens"], overlap=opts["overlap"]),
+                opts["repeat"])
+            counted_s, _ = self._time(
+                lambda: [(c, count_tokens(c)) for c in chunk_text_legacy(
+                    page, chunk_tokens=opts["chunk_tokens"], overlap=opts["overlap"])],
+                opts["repeat"])
+            new_s, new = self._time(
+                lambda: token_chunks(page, chunk_tokens=opts["chunk_tokens"], overlap=opts["overlap"]),
+                opts["repeat"])
+            self.stdout.write(
+                f"{lines:>8} {len(page):>10} {legacy_s:>10.4f} {counted_s:>15.4f} {new_s:>10.4f} "
+                f"{legacy_s / new_s:>9.1f}x {counted_s / new_s:>9.1f}x {len(legacy):>5}/{len(new):<6}"
+            )
@@ -0,0 +1,91 @@
+# backend/documents/management/commands/bench_extract.py
+import os
+import random
+import tempfile
+import time
+
+import fitz  # PyMuPDF
+from django.core.management.base import BaseCommand
+
+from documents import pdf_extract
+
+
+def _synthetic_pdf(path: str, pages: int, lines: int = 60, seed: int = 0):
+    rnd = random.Random(seed)
+    vocab = ["torque", "valve", "assembly", "the", "of", "and", "pressure", "section", "maintenance",
+             "inspect", "replace", "warning", "figure", "table", "must", "be", "before", "operating"]
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page()
+        text = "\n".join(" ".join(rnd.choice(vocab) for _ in range(rnd.randint(6, 14))) for _ in range(lines))
+        page.insert_textbox(page.rect + (36, 36, -36, -36), text, fontsize=7)
+    doc.save(path)
+    doc.close()
+
+
+class Command(BaseCommand):
+    help = ("Time page text extraction in-process against the extraction process pool "
+            "(pdf_extract.iter_page_texts) for several page counts and process counts.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pages", type=int, nargs="+", default=[16, 64, 256, 1024])
+        parser.add_argument("--processes", type=int, nargs="+", default=[2, 4, os.cpu_count() or 1])
+        parser.add_argument("--file", help="benchmark this PDF (its first N pages) instead of synthetic ones")
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def _time(self, path, pages, repeat):
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            n = sum(1 for _ in pdf_extract.iter_page_texts(path, range(1, pages + 1)))
+            best = min(best, time.perf_counter() - t0)
+        assert n == pages
+        return best
+
+    def _pool(self, processes):
+        # each process count gets its own pool; the first timed run would otherwise pay for spawning it
+        if pdf_extract._pool is not None:
+            pdf_extract._pool.shutdown(wait=True)
+            pdf_extract._pool = None
+        pdf_extract.PDF_EXTRACT_PROCESSES = processes
+        pdf_extract.PDF_EXTRACT_MIN_PAGES = 0
+        if processes > 1:
+            list(pdf_extract.iter_page_texts(self.path, range(1, min(self.max_pages, processes * 2) + 1)))
+
+    def handle(self, *args, **opts):
+        processes = sorted({p for p in opts["processes"] if p > 1})
+        tmp = None
+        if opts["file"]:
+            self.path = opts["file"]
+            with fitz.open(self.path) as doc:
+                available = doc.page_count
+            page_counts = sorted({min(p, available) for p in opts["pages"]})
+        else:
+            tmp = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
+            tmp.close()
+            self.path = tmp.name
+            page_counts = sorted(opts["pages"])
+            _synthetic_pdf(self.path, max(page_counts))
+        self.max_pages = max(page_counts)
+
+        saved = (pdf_extract.PDF_EXTRACT_PROCESSES, pdf_extract.PDF_EXTRACT_MIN_PAGES)
+        try:
+            self.stdout.write(f"cores: {os.cpu_count()}, slice: {pdf_extract.PDF_EXTRACT_SLICE_PAGES} pages")
+            self.stdout.write(f"{'pages':>8} {'serial s':>10}" + "".join(f" {f'{p} procs s':>12} {'speedup':>8}" for p in processes))
+            rows = {n: [] for n in page_counts}
+            self._pool(1)
+            serial = {n: self._time(self.path, n, opts["repeat"]) for n in page_counts}
+            for p in processes:
+                self._pool(p)
+                for n in page_counts:
+                    rows[n].append(self._time(self.path, n, opts["repeat"]))
+            for n in page_counts:
+                cells = "".join(f" {t:>12.3f} {serial[n] / t:>7.2f}x" for t in rows[n])
+                self.stdout.write(f"{n:>8} {serial[n]:>10.3f}{cells}")
+        finally:
+            if pdf_extract._pool is not None:
+                pdf_extract._pool.shutdown(wait=True)
+                pdf_extract._pool = None
+            pdf_extract.PDF_EXTRACT_PROCESSES, pdf_extract.PDF_EXTRACT_MIN_PAGES = saved
+            if tmp is not None:
+                os.unlink(tmp.name)
@@ -0,0 +1,96 @@
+# backend/documents/management/commands/bench_filtered_search.py
+import os
+import statistics
+import time
+import uuid
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as rest
+
+from documents.qdrant_schema import ensure_schema
+from documents.qdrant_search import _build_filter
+
+
+class Command(BaseCommand):
+    help = ("Project-filtered search latency on a scratch collection of --points points spread over "
+            "--projects projects: first with no payload indexes (how collections used to be created), "
+            "then after ensure_schema has added the indexes and per-project HNSW settings.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default=os.getenv("QDRANT_URL", "http://localhost:6333"))
+        parser.add_argument("--api-key", default=os.getenv("QDRANT_API_KEY"))
+        parser.add_argument("--points", type=int, default=1_000_000)
+        parser.add_argument("--projects", type=int, default=500)
+        parser.add_argument("--dim", type=int, default=128, help="vector size; smaller than production to seed faster")
+        parser.add_argument("--deleted", type=float, default=0.02, help="fraction of points flagged is_deleted")
+        parser.add_argument("--requests", type=int, default=200, help="timed searches per phase")
+        parser.add_argument("--keep", action="store_true", help="don't drop the scratch collection")
+
+    def _seed(self, name, opts):
+        rnd = np.random.default_rng(0)
+        batch = 2000
+        for start in range(0, opts["points"], batch):
+            n = min(batch, opts["points"] - start)
+            vectors = rnd.random((n, opts["dim"]), dtype=np.float32)
+            projects = rnd.integers(0, opts["projects"], n)
+            deleted = rnd.random(n) < opts["deleted"]
+            self.client.upsert(name, wait=False, points=[
+                rest.PointStruct(id=start + i, vector=vectors[i].tolist(), payload={
+                    "project_id": f"p{projects[i]}",
+                    "document_id": f"d{projects[i]}_{(start + i) % 50}",
+                    "is_deleted": bool(deleted[i]),
+                    "chunk_deleted": False,
+                })
+                for i in range(n)
+            ])
+            if start and start % 100_000 == 0:
+                self.stdout.write(f"  seeded {start}")
+
+    def _wait_indexed(self, name):
+        # time the steady state, not the optimizer catching up
+        t0 = time.monotonic()
+        while True:
+            info = self.client.get_collection(name)
+            if info.status == rest.CollectionStatus.GREEN and info.optimizer_status == rest.OptimizersStatusOneOf.OK:
+                return time.monotonic() - t0
+            time.sleep(2)
+
+    def _time(self, name, opts):
+        rnd = np.random.default_rng(1)
+        samples = []
+        for _ in range(opts["requests"]):
+            vector = rnd.random(opts["dim"], dtype=np.float32).tolist()
+            qfilter = rest.Filter(**_build_filter(f"p{rnd.integers(0, opts['projects'])}"))
+            t0 = time.perf_counter()
+            self.client.search(name, query_vector=vector, query_filter=qfilter, limit=25)
+            samples.append((time.perf_counter() - t0) * 1000)
+        samples.sort()
+        return statistics.mean(samples), samples[len(samples) // 2], samples[int(len(samples) * 0.95) - 1]
+
+    def handle(self, *args, **opts):
+        kwargs = {"url": opts["url"].rstrip("/"), "timeout": 300}
+        if opts["api_key"]:
+            kwargs["api_key"] = opts["api_key"]
+        self.client = QdrantClient(**kwargs)
+        name = f"bench_filter_{uuid.uuid4().hex[:8]}"
+        self.client.create_collection(name, vectors_config=rest.VectorParams(size=opts["dim"], distance=rest.Distance.COSINE))
+        try:
+            self.stdout.write(f"seeding {opts['points']} points over {opts['projects']} projects (dim {opts['dim']})")
+            self._seed(name, opts)
+            self.stdout.write(f"indexed in {self._wait_indexed(name):.0f}s")
+            before = self._time(name, opts)
+
+            for change in ensure_schema(self.client, name):
+                self.stdout.write(f"  {change}")
+            self.stdout.write(f"re-indexed in {self._wait_indexed(name):.0f}s")
+            after = self._time(name, opts)
+
+            self.stdout.write(f"{opts['requests']} searches per phase, limit 25, filter = _build_filter(project)")
+            self.stdout.write(f"{'phase':<28} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9}")
+            for label, (mean, p50, p95) in (("no payload indexes", before), ("indexes + per-project hnsw", after)):
+                self.stdout.write(f"{label:<28} {mean:>9.2f} {p50:>9.2f} {p95:>9.2f}")
+        finally:
+            if not opts["keep"]:
+                self.client.delete_collection(name)
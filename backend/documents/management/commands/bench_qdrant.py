@@ -0,0 +1,97 @@
+# backend/documents/management/commands/bench_qdrant.py
+import os
+import random
+import statistics
+import time
+import uuid
+
+import requests
+from django.core.management.base import BaseCommand
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as rest
+
+from documents.qdrant_client import QDRANT_GRPC_PORT, rest_session
+
+
+class Command(BaseCommand):
+    help = ("Search and upsert latency against a scratch collection: a new connection per call "
+            "(the old per-search requests.post / per-task client) vs the pooled process-wide transport, "
+            "and optionally gRPC.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default=os.getenv("QDRANT_URL", "http://localhost:6333"))
+        parser.add_argument("--api-key", default=os.getenv("QDRANT_API_KEY"))
+        parser.add_argument("--dim", type=int, default=768)
+        parser.add_argument("--points", type=int, default=2000, help="points seeded before timing")
+        parser.add_argument("--requests", type=int, default=200, help="timed calls per mode")
+        parser.add_argument("--upsert-batch", type=int, default=64)
+        parser.add_argument("--grpc", action="store_true", help=f"also time gRPC (port {QDRANT_GRPC_PORT})")
+
+    def _client(self, grpc=False):
+        kwargs = {"url": self.url}
+        if self.api_key:
+            kwargs["api_key"] = self.api_key
+        if grpc:
+            kwargs.update(prefer_grpc=True, grpc_port=QDRANT_GRPC_PORT)
+        return QdrantClient(**kwargs)
+
+    def _vec(self):
+        return [self.rnd.random() for _ in range(self.dim)]
+
+    def _points(self, n):
+        return [rest.PointStruct(id=str(uuid.uuid4()), vector=self._vec(), payload={"project_id": "bench"})
+                for _ in range(n)]
+
+    def _time(self, fn):
+        samples = []
+        for _ in range(self.n):
+            t0 = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - t0) * 1000)
+        samples.sort()
+        return statistics.mean(samples), samples[len(samples) // 2], samples[int(len(samples) * 0.95) - 1]
+
+    def handle(self, *args, **opts):
+        self.url, self.api_key, self.dim, self.n = opts["url"].rstrip("/"), opts["api_key"], opts["dim"], opts["requests"]
+        self.rnd = random.Random(0)
+        name = f"bench_{uuid.uuid4().hex[:8]}"
+        shared = self._client()
+        shared.create_collection(name, vectors_config=rest.VectorParams(size=self.dim, distance=rest.Distance.COSINE))
+        try:
+            for i in range(0, opts["points"], 256):
+                shared.upsert(name, points=self._points(min(256, opts["points"] - i)))
+            url = f"{self.url}/collections/{name}/points/search"
+            headers = {"Content-Type": "application/json", **({"api-key": self.api_key} if self.api_key else {})}
+            body = lambda: {"vector": self._vec(), "limit": 25, "with_payload": True}
+            session = rest_session(self.api_key)
+            batch = opts["upsert_batch"]
+
+            def fresh_client_upsert():
+                # what every ingest task used to do: new client, collection check, then write
+                c = self._client()
+                c.get_collections()
+                c.upsert(name, points=self._points(batch))
+                c.close()
+
+            modes = [
+                ("search, requests.post per call", lambda: requests.post(url, json=body(), headers=headers, timeout=15).raise_for_status()),
+                ("search, pooled session", lambda: session.post(url, json=body(), timeout=15).raise_for_status()),
+                ("search, shared client (http)", lambda: shared.search(name, query_vector=self._vec(), limit=25)),
+                (f"upsert x{batch}, new client per call", fresh_client_upsert),
+                (f"upsert x{batch}, shared client (http)", lambda: shared.upsert(name, points=self._points(batch))),
+            ]
+            if opts["grpc"]:
+                grpc = self._client(grpc=True)
+                modes += [
+                    ("search, shared client (grpc)", lambda: grpc.search(name, query_vector=self._vec(), limit=25)),
+                    (f"upsert x{batch}, shared client (grpc)", lambda: grpc.upsert(name, points=self._points(batch))),
+                ]
+
+            self.stdout.write(f"{self.n} calls per mode, dim {self.dim}, {opts['points']} seeded points")
+            self.stdout.write(f"{'mode':<40} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9}")
+            for label, fn in modes:
+                fn()  # warm-up, so the pooled modes are measured with an open connection
+                mean, p50, p95 = self._time(fn)
+                self.stdout.write(f"{label:<40} {mean:>9.2f} {p50:>9.2f} {p95:>9.2f}")
+        finally:
+            shared.delete_collection(name)
@@ -0,0 +1,118 @@
+# backend/documents/management/commands/bench_quantization.py
+import os
+import statistics
+import time
+import uuid
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as rest
+
+from documents.qdrant_schema import QDRANT_HNSW_M, hnsw_config, quantization_config, vector_params
+
+# (label, QDRANT_QUANTIZATION, QDRANT_VECTORS_ON_DISK)
+MODES = [
+    ("float32 in RAM", "none", False),
+    ("scalar int8 + disk", "scalar", True),
+    ("binary + disk", "binary", True),
+]
+VECTOR_BYTES = {"none": 4.0, "scalar": 1.0, "binary": 1 / 8}
+
+
+class Command(BaseCommand):
+    help = ("recall@k, search latency and estimated RAM for each storage mode (QDRANT_QUANTIZATION / "
+            "QDRANT_VECTORS_ON_DISK) on a synthetic clustered corpus, with and without rescoring and at "
+            "several oversampling factors. Ground truth is exact search on the float32 collection.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default=os.getenv("QDRANT_URL", "http://localhost:6333"))
+        parser.add_argument("--api-key", default=os.getenv("QDRANT_API_KEY"))
+        parser.add_argument("--points", type=int, default=100_000)
+        parser.add_argument("--dim", type=int, default=768)
+        parser.add_argument("--clusters", type=int, default=256, help="topics in the synthetic corpus")
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--k", type=int, default=10)
+        parser.add_argument("--oversampling", default="1,2,4", help="comma separated factors to try")
+        parser.add_argument("--keep", action="store_true", help="don't drop the scratch collections")
+
+    def _corpus(self, n, dim, clusters, rnd):
+        # unit vectors around topic centres, roughly how text embeddings sit
+        centres = rnd.standard_normal((clusters, dim)).astype(np.float32)
+        vectors = centres[rnd.integers(0, clusters, n)] + 0.6 * rnd.standard_normal((n, dim)).astype(np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    def _create(self, name, dim, mode, on_disk, vectors):
+        self.client.create_collection(name, vectors_config=vector_params(dim, on_disk=on_disk),
+                                      hnsw_config=hnsw_config(), quantization_config=quantization_config(mode))
+        for start in range(0, len(vectors), 1000):
+            chunk = vectors[start:start + 1000]
+            self.client.upsert(name, wait=False, points=[
+                rest.PointStruct(id=start + i, vector=v.tolist(), payload={"project_id": "bench"})
+                for i, v in enumerate(chunk)
+            ])
+        # measure the indexed steady state, not the optimizer catching up
+        while True:
+            info = self.client.get_collection(name)
+            if info.status == rest.CollectionStatus.GREEN and (info.points_count or 0) >= len(vectors):
+                return
+            time.sleep(2)
+
+    def _search(self, name, queries, k, params=None):
+        ids, samples = [], []
+        for q in queries:
+            t0 = time.perf_counter()
+            hits = self.client.search(name, query_vector=q.tolist(), limit=k, search_params=params)
+            samples.append((time.perf_counter() - t0) * 1000)
+            ids.append({h.id for h in hits})
+        samples.sort()
+        return ids, statistics.mean(samples), samples[int(len(samples) * 0.95) - 1]
+
+    def _ram_mb(self, n, dim, mode, on_disk):
+        # estimate of what the collection pins in RAM: vectors searched in RAM
+        # (quantized copy, or the originals when not on disk) plus level-0 HNSW links
+        vectors = n * dim * VECTOR_BYTES[mode]
+        if mode != "none" and not on_disk:
+            vectors += n * dim * 4
+        links = n * QDRANT_HNSW_M * 2 * 4
+        return (vectors + links) / 2 ** 20
+
+    def handle(self, *args, **opts):
+        kwargs = {"url": opts["url"].rstrip("/"), "timeout": 300}
+        if opts["api_key"]:
+            kwargs["api_key"] = opts["api_key"]
+        self.client = QdrantClient(**kwargs)
+        rnd = np.random.default_rng(0)
+        n, dim, k = opts["points"], opts["dim"], opts["k"]
+        vectors = self._corpus(n, dim, opts["clusters"], rnd)
+        # queries near, not on, corpus points
+        queries = vectors[rnd.integers(0, n, opts["queries"])] + 0.3 * rnd.standard_normal((opts["queries"], dim)).astype(np.float32) / np.sqrt(dim)
+        factors = [float(f) for f in opts["oversampling"].split(",") if f.strip()]
+
+        tag = uuid.uuid4().hex[:8]
+        names = {mode: f"bench_quant_{mode}_{tag}" for _, mode, _ in MODES}
+        try:
+            for label, mode, on_disk in MODES:
+                self.stdout.write(f"seeding {n} x {dim} into {label}")
+                self._create(names[mode], dim, mode, on_disk, vectors)
+
+            truth, _, _ = self._search(names["none"], queries, k, rest.SearchParams(exact=True))
+
+            self.stdout.write(f"{opts['queries']} queries, recall@{k} against exact float32 search")
+            self.stdout.write(f"{'mode':<22} {'rescore':>7} {'oversample':>10} {'recall':>7} {'mean ms':>8} {'p95 ms':>8} {'est RAM MB':>11}")
+            for label, mode, on_disk in MODES:
+                runs = [(None, None)] if mode == "none" else [(False, 1.0)] + [(True, f) for f in factors]
+                for rescore, factor in runs:
+                    params = None
+                    if rescore is not None:
+                        params = rest.SearchParams(quantization=rest.QuantizationSearchParams(rescore=rescore, oversampling=factor))
+                    found, mean, p95 = self._search(names[mode], queries, k, params)
+                    recall = statistics.mean(len(f & t) / k for f, t in zip(found, truth))
+                    self.stdout.write(
+                        f"{label:<22} {'-' if rescore is None else ('yes' if rescore else 'no'):>7} "
+                        f"{'-' if factor is None else f'{factor:g}x':>10} {recall:>7.3f} {mean:>8.2f} {p95:>8.2f} "
+                        f"{self._ram_mb(n, dim, mode, on_disk):>11.1f}")
+        finally:
+            if not opts["keep"]:
+                for name in names.values():
+                    self.client.delete_collection(name)
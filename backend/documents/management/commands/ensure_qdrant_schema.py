@@ -0,0 +1,38 @@
+# backend/documents/management/commands/ensure_qdrant_schema.py
+from django.core.management.base import BaseCommand
+
+from documents.models import CollectionBuild
+from documents.qdrant_client import QdrantClientWrapper
+
+
+class Command(BaseCommand):
+    help = ("Add the payload indexes (project_id, document_id, is_deleted, chunk_deleted), the "
+            "per-project HNSW settings and the storage mode (QDRANT_QUANTIZATION, QDRANT_VECTORS_ON_DISK) "
+            "to existing Qdrant collections. Only missing or different settings are changed, so it can "
+            "be re-run safely.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true",
+                            help="also collections of builds in progress or ready to switch to")
+        parser.add_argument("--dry-run", action="store_true", help="only list what would change")
+
+    def handle(self, *args, **opts):
+        q = QdrantClientWrapper()
+        names = [q.collection]
+        if opts["all"]:
+            names += [c for c in CollectionBuild.objects.filter(status__in=["building", "ready", "live"])
+                      .values_list("collection", flat=True) if c not in names]
+
+        for name in names:
+            if not q.client.collection_exists(name):
+                self.stdout.write(self.style.WARNING(f"{name}: collection missing, skipped"))
+                continue
+            changes = q.ensure_schema(name, dry_run=opts["dry_run"])
+            if not changes:
+                self.stdout.write(f"{name}: up to date")
+                continue
+            for change in changes:
+                self.stdout.write(f"{name}: {change}")
+            if not opts["dry_run"]:
+                self.stdout.write(self.style.SUCCESS(
+                    f"{name}: updated; Qdrant re-indexes existing segments in the background"))
@@ -0,0 +1,36 @@
+# backend/documents/management/commands/purge_deleted.py
+from django.core.management.base import BaseCommand
+
+from documents.purge import PURGE_GRACE_DAYS, run_purge
+from documents.tasks import purge_deleted_task
+
+
+def _mb(n):
+    return f"{n / 2 ** 20:.1f} MB"
+
+
+class Command(BaseCommand):
+    help = ("Hard-delete documents and projects soft-deleted more than PURGE_GRACE_DAYS ago: their "
+            "Qdrant points, chunk rows, stored files and cached text. Reports what was reclaimed.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--grace-days", type=float, default=None,
+                            help=f"override PURGE_GRACE_DAYS ({PURGE_GRACE_DAYS:g}) for this run")
+        parser.add_argument("--dry-run", action="store_true", help="report what would be purged, delete nothing")
+        parser.add_argument("--queue", action="store_true", help="run as a Celery task instead of in this process")
+
+    def handle(self, *args, **opts):
+        if opts["queue"]:
+            purge_deleted_task.delay()
+            self.stdout.write(self.style.SUCCESS("queued purge"))
+            return
+
+        stats, _ = run_purge(dry_run=opts["dry_run"], grace_days=opts["grace_days"])
+        verb = "would purge" if opts["dry_run"] else "purged"
+        self.stdout.write(f"{verb} {stats.documents} documents, {stats.projects} projects, "
+                          f"{stats.chunks} chunks, {stats.points} points, {stats.files} files")
+        self.stdout.write(f"  stored files   {_mb(stats.file_bytes)}")
+        self.stdout.write(f"  text cache     {_mb(stats.text_cache_bytes)}")
+        self.stdout.write(f"  chunk text     {_mb(stats.chunk_text_bytes)}")
+        self.stdout.write(f"  vectors (est.) {_mb(stats.vector_bytes)}")
+        self.stdout.write(self.style.SUCCESS(f"  total          {_mb(stats.total_bytes)}"))
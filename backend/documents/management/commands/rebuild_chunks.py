@@ -0,0 +1,94 @@
+# backend/documents/management/commands/rebuild_chunks.py
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from documents.models import Document
+from documents.qdrant_client import QdrantClientWrapper
+from documents.embed_executor import EmbeddingExecutor
+from documents.ingest_pipeline import IngestPipeline, chunk_config
+from documents.tasks import _mark_done, schedule_ingest
+
+
+class Command(BaseCommand):
+    help = ("Re-chunk documents whose chunking config (chunker, tokenizer, tokens, overlap, dedupe, "
+            "extractor) differs from the current one. Page text comes from the extracted-text cache and "
+            "chunks whose hash did not change keep their row and vector, so only changed chunks are embedded, "
+            "with the model of the live collection. Documents already on the current config are skipped: an "
+            "interrupted run can simply be re-run. A different embedding model or dimension needs "
+            "rebuild_collection, which re-embeds every chunk into a new collection.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--project", help="project id to rebuild")
+        parser.add_argument("--all", action="store_true", help="rebuild every project")
+        parser.add_argument("--local", action="store_true",
+                            help="run in this process instead of queueing through the ingest scheduler")
+        parser.add_argument("--workers", type=int, default=4, help="documents rebuilt in parallel with --local")
+        parser.add_argument("--dry-run", action="store_true", help="only list the documents that would be rebuilt")
+
+    def _stale(self, opts):
+        if not (opts["project"] or opts["all"]):
+            raise CommandError("pass --project <id> or --all")
+        docs = Document.objects.filter(is_deleted=False, status="done")
+        if opts["project"]:
+            docs = docs.filter(project_id=opts["project"])
+        # model and dimension are left out: rebuild_collection re-embeds for those
+        # (a subquery, as exclude() on JSON keys would skip rows missing the key)
+        current = docs.filter(**{f"metadata__ingest_config__{key}": value for key, value in chunk_config().items()})
+        return docs.exclude(id__in=current.values("id")).order_by("uploaded_at")
+
+    def _rebuild(self, doc_id, qclient, executor):
+        close_old_connections()
+        try:
+            doc = Document.objects.select_related("project").get(id=doc_id)
+            path = os.path.join(settings.MEDIA_ROOT, doc.metadata["path"])
+            result = IngestPipeline(doc, path, qclient, executor=executor, incremental=True).run()
+            _mark_done(doc, qclient.embed_model, qclient.embed_dim)
+            return result
+        finally:
+            close_old_connections()
+
+    def handle(self, *args, **opts):
+        docs = self._stale(opts)
+        total = docs.count()
+        self.stdout.write(f"{total} documents on an outdated ingest config")
+        if opts["dry_run"] or not total:
+            for doc in docs.only("id", "filename"):
+                self.stdout.write(f"  {doc.id} {doc.filename}")
+            return
+
+        if not opts["local"]:
+            for doc in docs.iterator():
+                schedule_ingest(doc, incremental=True)
+            self.stdout.write(self.style.SUCCESS(f"queued {total} incremental ingests"))
+            return
+
+        qclient = QdrantClientWrapper()
+        t0 = time.monotonic()
+        done = failed = 0
+        kept = added = 0
+        ids = list(docs.values_list("id", flat=True))
+        # one embedding pool (and rate limiter) shared by all workers
+        with EmbeddingExecutor() as executor, ThreadPoolExecutor(max_workers=max(1, opts["workers"])) as pool:
+            futures = {pool.submit(self._rebuild, doc_id, qclient, executor): doc_id for doc_id in ids}
+            for fut in as_completed(futures):
+                try:
+                    diff = fut.result().get("diff", {})
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f"{futures[fut]}: {exc}")
+                    continue
+                done += 1
+                kept += diff.get("kept", 0)
+                added += diff.get("added", 0)
+                self.stdout.write(f"[{done + failed}/{total}] {futures[fut]}: kept {diff.get('kept', 0)}, "
+                                  f"embedded {diff.get('added', 0)}, removed {diff.get('removed', 0)}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"rebuilt {done} documents in {time.monotonic() - t0:.1f}s "
+            f"({kept} chunks kept, {added} new); {failed} failed"
+        ))
@@ -0,0 +1,101 @@
+# backend/documents/management/commands/rebuild_collection.py
+from django.core.management.base import BaseCommand, CommandError
+
+from documents.models import CollectionBuild
+from documents.qdrant_client import QdrantClientWrapper
+from documents import collection_rebuild as rebuild
+from documents.tasks import rebuild_collection_task, reconcile_collection_task
+
+
+class Command(BaseCommand):
+    help = ("Blue/green rebuild of the Qdrant collection for another embedding model or dimension. "
+            "A new versioned collection is filled from DocumentChunk text in the background while search "
+            "keeps using the current one, then the QDRANT_COLLECTION_NAME alias is switched to it.\n"
+            "  start --model M --dim D   create the collection and queue the build\n"
+            "  status                    builds and their progress\n"
+            "  resume                    continue an interrupted or failed build from where it stopped\n"
+            "  switch                    point the alias at the ready build (after start --no-switch)\n"
+            "  rollback                  point the alias back at the previous collection\n"
+            "  cancel                    stop the running build and drop its collection\n"
+            "  reconcile                 catch the live collection up with recent ingests")
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=["start", "status", "resume", "switch", "rollback", "cancel", "reconcile"])
+        parser.add_argument("--model", help="embedding model of the new collection")
+        parser.add_argument("--dim", type=int, help="vector size of the new collection")
+        parser.add_argument("--no-switch", action="store_true", help="leave the build ready instead of switching")
+        parser.add_argument("--replace-legacy", action="store_true",
+                            help="allow deleting a plain (pre-alias) collection named like the alias on switch")
+        parser.add_argument("--local", action="store_true", help="run in this process instead of a Celery task")
+
+    def handle(self, *args, **opts):
+        try:
+            getattr(self, f"_{opts['action']}")(opts)
+        except rebuild.RebuildError as exc:
+            raise CommandError(str(exc))
+
+    def _start(self, opts):
+        if not (opts["model"] and opts["dim"]):
+            raise CommandError("start needs --model and --dim")
+        build = rebuild.start_build(opts["model"], opts["dim"], auto_switch=not opts["no_switch"])
+        self.stdout.write(f"created {build.collection}")
+        self._run(build, opts)
+
+    def _resume(self, opts):
+        build = CollectionBuild.objects.filter(status__in=["building", "failed"]).order_by("-created_at").first()
+        if build is None:
+            raise CommandError("no build in progress or failed")
+        if build.status == "failed":
+            self.stdout.write(f"resuming failed build {build.collection} (error: {build.error[:200]})")
+            build = rebuild.resume_failed(build)
+        self._run(build, opts)
+
+    def _run(self, build, opts):
+        if opts["local"]:
+            rebuild.run_build(build.id, replace_legacy=opts["replace_legacy"])
+            build.refresh_from_db()
+            self._status(opts)
+        else:
+            rebuild_collection_task.delay(build.id, replace_legacy=opts["replace_legacy"])
+            self.stdout.write(self.style.SUCCESS(f"queued build of {build.collection}; follow it with `status`"))
+
+    def _status(self, opts):
+        q = QdrantClientWrapper()
+        self.stdout.write(f"alias {q.alias} -> {q.collection} ({q.embed_model}/{q.embed_dim})")
+        for b in CollectionBuild.objects.order_by("-created_at")[:10]:
+            pct = f"{100 * b.done / b.total:.1f}%" if b.total else "-"
+            line = (f"  {b.collection:<60} {b.status:<12} {b.phase:<9} {b.done}/{b.total} ({pct}) "
+                    f"embedded {b.embedded}, cached {b.cached}")
+            if b.error:
+                line += f"  error: {b.error[:200]}"
+            self.stdout.write(line)
+
+    def _switch(self, opts):
+        build = CollectionBuild.objects.filter(status="ready").order_by("-created_at").first()
+        if build is None:
+            raise CommandError("no ready build to switch to")
+        rebuild.switch(build, replace_legacy=opts["replace_legacy"])
+        self.stdout.write(self.style.SUCCESS(f"alias now points at {build.collection}"))
+
+    def _rollback(self, opts):
+        restored = rebuild.rollback()
+        self.stdout.write(self.style.SUCCESS(f"alias now points at {restored.collection}"))
+
+    def _cancel(self, opts):
+        build = CollectionBuild.objects.filter(status__in=["building", "ready"]).order_by("-created_at").first()
+        if build is None:
+            raise CommandError("no build to cancel")
+        CollectionBuild.objects.filter(id=build.id).update(status="cancelled")
+        QdrantClientWrapper().client.delete_collection(build.collection)
+        self.stdout.write(self.style.SUCCESS(f"cancelled {build.collection} and dropped the collection"))
+
+    def _reconcile(self, opts):
+        build = CollectionBuild.objects.filter(status="live").order_by("-switched_at").first()
+        if build is None:
+            raise CommandError("the live collection has no build record; nothing to reconcile")
+        if opts["local"]:
+            rebuild.reconcile(build.id)
+            self.stdout.write(self.style.SUCCESS(f"reconciled {build.collection}"))
+        else:
+            reconcile_collection_task.delay(build.id)
+            self.stdout.write(self.style.SUCCESS(f"queued reconcile of {build.collection}"))
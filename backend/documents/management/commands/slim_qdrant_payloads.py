@@ -0,0 +1,52 @@
+# backend/documents/management/commands/slim_qdrant_payloads.py
+from django.core.management.base import BaseCommand
+from qdrant_client.http import models as rest
+
+from documents.qdrant_client import QdrantClientWrapper
+
+# payload keys that duplicated DocumentChunk.text
+TEXT_KEYS = ["text", "chunk_text", "text_snippet"]
+
+
+class Command(BaseCommand):
+    help = "Strip chunk text from existing Qdrant payloads in place (text is hydrated from DocumentChunk)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=512, help="points per scroll page / delete call")
+        parser.add_argument("--dry-run", action="store_true", help="only count points that still carry text")
+
+    def handle(self, *args, **opts):
+        q = QdrantClientWrapper()
+        # only points that still have any of the text keys; already-slim points are skipped,
+        # so the command can be interrupted and re-run
+        scroll_filter = rest.Filter(should=[
+            rest.Filter(must_not=[rest.IsEmptyCondition(is_empty=rest.PayloadField(key=k))])
+            for k in TEXT_KEYS
+        ])
+
+        total = 0
+        offset = None
+        last_ids = None
+        while True:
+            points, next_offset = q.client.scroll(
+                collection_name=q.collection,
+                scroll_filter=scroll_filter,
+                limit=opts["batch"],
+                offset=offset,
+                with_payload=False,
+                with_vectors=False,
+            )
+            ids = [p.id for p in points]
+            if ids and ids == last_ids:
+                raise RuntimeError("payload deletion is not taking effect; aborting")
+            last_ids = ids
+            if ids and not opts["dry_run"]:
+                q.client.delete_payload(collection_name=q.collection, keys=TEXT_KEYS, points=ids)
+            total += len(ids)
+            self.stdout.write(f"{'would slim' if opts['dry_run'] else 'slimmed'} {total} points")
+            if next_offset is None:
+                break
+            # after deleting, the filter no longer matches these points; page from the start again
+            offset = next_offset if opts["dry_run"] else None
+
+        self.stdout.write(self.style.SUCCESS(f"done: {total} points {'to slim' if opts['dry_run'] else 'slimmed'}"))
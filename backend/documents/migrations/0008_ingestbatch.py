@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:15
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0007_documentchunk_is_deleted'),
+        ('projects', '0003_project_is_deleted'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestBatch',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('total', models.IntegerField(default=0)),
+                ('duplicates', models.IntegerField(default=0)),
+                ('metadata', models.JSONField(default=dict)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='projects.project')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='documents', to='documents.ingestbatch'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0009_documentchunk_duplicate_of'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CollectionBuild',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('collection', models.CharField(max_length=255, unique=True)),
+                ('embed_model', models.CharField(max_length=128)),
+                ('embed_dim', models.IntegerField()),
+                ('status', models.CharField(default='building', max_length=32)),
+                ('previous_collection', models.CharField(blank=True, default='', max_length=255)),
+                ('auto_switch', models.BooleanField(default=True)),
+                ('phase', models.CharField(default='copy', max_length=32)),
+                ('cursor', models.UUIDField(blank=True, null=True)),
+                ('total', models.IntegerField(default=0)),
+                ('done', models.IntegerField(default=0)),
+                ('embedded', models.IntegerField(default=0)),
+                ('cached', models.IntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('switched_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -3,6 +3,21 @@ import uuid
 from django.utils import timezone
 from projects.models import Project
 
+class IngestBatch(models.Model):
+    """
+    One bulk upload (many files or an archive); its documents are ingested
+    together and progress is reported across all of them.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    project = models.ForeignKey(Project, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    total = models.IntegerField(default=0)
+    duplicates = models.IntegerField(default=0)
+    metadata = models.JSONField(default=dict)
+
+    def __str__(self):
+        return f"Batch {self.id} ({self.total} files)"
+
 class Document(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     filename = models.CharField(max_length=512)
@@ -13,6 +28,9 @@ class Document(models.Model):
     metadata = models.JSONField(default=dict)
     project = models.ForeignKey(Project, null=True, blank=True, on_delete=models.CASCADE)  # new field
     is_deleted = models.BooleanField(default=False)
+    # start of the grace period before purge.py removes the document for good
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    batch = models.ForeignKey(IngestBatch, null=True, blank=True, on_delete=models.SET_NULL, related_name="documents")
 
     def __str__(self):
         return f"{self.filename} ({self.id})"
@@ -27,6 +45,11 @@ class DocumentChunk(models.Model):
     token_count = models.IntegerField(null=True, blank=True)
     chunk_hash = models.CharField(max_length=64, db_index=True)#, unique=True)
     created_at = models.DateTimeField(default=timezone.now)
+    # set when a newer version of the document no longer contains this chunk
+    is_deleted = models.BooleanField(default=False)
+    # near-duplicate of an earlier chunk of the same document: no vector of its own,
+    # retrieval goes through the representative (see dedupe.py)
+    duplicate_of = models.ForeignKey("self", null=True, blank=True, on_delete=models.CASCADE, related_name="duplicates")
 
     class Meta:
         ordering = ("document", "page", "chunk_index")
@@ -37,3 +60,54 @@ class DocumentChunk(models.Model):
 
     def __str__(self):
         return f"Chunk {self.id} doc={self.document_id} page={self.page} idx={self.chunk_index}"
+
+
+class EmbeddingCache(models.Model):
+    """
+    Content-addressed embedding store: one vector per (model, dim, chunk_hash).
+    Vectors are packed float32 bytes.
+    """
+    model = models.CharField(max_length=128)
+    dim = models.IntegerField()
+    chunk_hash = models.CharField(max_length=64)
+    vector = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["model", "dim", "chunk_hash"], name="uniq_embedding_cache_key"),
+        ]
+
+    def __str__(self):
+        return f"Embedding {self.model}/{self.dim} {self.chunk_hash[:12]}"
+
+
+class CollectionBuild(models.Model):
+    """
+    One Qdrant collection built (or being built) for an embedding model; the
+    QDRANT_COLLECTION_NAME alias points at the live one (see collection_rebuild.py).
+    """
+    STATUSES = ("building", "ready", "live", "retired", "failed", "cancelled", "rolled_back")
+
+    collection = models.CharField(max_length=255, unique=True)
+    embed_model = models.CharField(max_length=128)
+    embed_dim = models.IntegerField()
+    status = models.CharField(max_length=32, default="building")
+    # collection the alias pointed at before this build went live; rollback target
+    previous_collection = models.CharField(max_length=255, blank=True, default="")
+    auto_switch = models.BooleanField(default=True)
+    # copy: first pass over all chunks; catch_up: second pass for chunks added or changed meanwhile
+    phase = models.CharField(max_length=32, default="copy")
+    # progress of the current pass: chunk ids are walked in order, cursor is the last one synced
+    cursor = models.UUIDField(null=True, blank=True)
+    total = models.IntegerField(default=0)
+    done = models.IntegerField(default=0)
+    embedded = models.IntegerField(default=0)
+    cached = models.IntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    switched_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.collection} ({self.embed_model}/{self.embed_dim}, {self.status})"
@@ -0,0 +1,215 @@
+# backend/documents/pdf_extract.py
+import os
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterable, Iterator, Tuple
+
+import fitz  # PyMuPDF
+
+# no Django imports: this module is imported by the spawned extraction processes
+
+logger = logging.getLogger(__name__)
+
+# processes extracting page text; 1 extracts in the calling thread, 0 means one per core
+PDF_EXTRACT_PROCESSES = int(os.getenv("PDF_EXTRACT_PROCESSES", 1))
+# runs shorter than this are extracted in the calling thread; pool round trips would cost more
+PDF_EXTRACT_MIN_PAGES = int(os.getenv("PDF_EXTRACT_MIN_PAGES", 32))
+# pages per task; with at most 2 tasks per process in flight this bounds the text held in memory
+PDF_EXTRACT_SLICE_PAGES = int(os.getenv("PDF_EXTRACT_SLICE_PAGES", 8))
+# extraction processes are replaced after this many tasks, so MuPDF allocations can't pile up
+PDF_EXTRACT_MAX_TASKS_PER_CHILD = int(os.getenv("PDF_EXTRACT_MAX_TASKS_PER_CHILD", 200))
+
+
+def extract_processes() -> int:
+    return (os.cpu_count() or 1) if PDF_EXTRACT_PROCESSES <= 0 else PDF_EXTRACT_PROCESSES
+
+
+def page_text(doc, page_no: int) -> str:
+    """
+    Text of one page (1-based). A page MuPDF can't parse gives "" instead of
+    failing the whole document.
+    """
+    try:
+        return doc.load_page(page_no - 1).get_text("text")
+    except Exception as exc:
+        logger.warning("pdf extract: page %d of %s failed, using empty text: %s", page_no, doc.name, exc)
+        return ""
+
+
+def _iter_serial(path: str, page_numbers) -> Iterator[Tuple[int, str]]:
+    doc = fitz.open(path)
+    try:
+        for p in page_numbers:
+            yield p, page_text(doc, p)
+    finally:
+        doc.close()
+
+
+# --- extraction processes ----------------------------------------------
+
+_worker_doc = None  # (path, fitz.Document), kept open across slices of the same file
+
+
+def _extract_slice(path: str, pages: list[int]) -> list[Tuple[int, str]]:
+    global _worker_doc
+    if _worker_doc is None or _worker_doc[0] != path:
+        if _worker_doc is not None:
+            _worker_doc[1].close()
+        _worker_doc = (path, fitz.open(path))
+    out = [(p, page_text(_worker_doc[1], p)) for p in pages]
+    # drop MuPDF's object/font cache between slices; it is what grows on large files
+    fitz.TOOLS.store_shrink(100)
+    return out
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_unavailable = False
+
+
+def _daemonic() -> bool:
+    # Celery's prefork pool runs tasks in daemonic (billiard) processes, which may not
+    # start children; the check only fires on the first submit, so look before trying
+    try:
+        import billiard
+        if billiard.current_process().daemon:
+            return True
+    except ImportError:
+        pass
+    return multiprocessing.current_process().daemon
+
+
+def _disable_pool(reason):
+    global _pool, _pool_unavailable
+    with _pool_lock:
+        broken, _pool = _pool, None
+        if not _pool_unavailable:
+            logger.warning("pdf extract: no process pool (%s); extracting in-process", reason)
+        _pool_unavailable = True
+    if broken is not None:
+        broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _get_pool():
+    global _pool, _pool_unavailable
+    if not _pool_unavailable and _daemonic():
+        _disable_pool("daemonic worker process, e.g. Celery's prefork pool; run the worker with "
+                      "--pool threads or solo to extract with PDF_EXTRACT_PROCESSES > 1")
+    with _pool_lock:
+        if _pool is None and not _pool_unavailable:
+            try:
+                # spawn, not fork: forking a process that runs pipeline threads is unsafe
+                _pool = ProcessPoolExecutor(
+                    max_workers=extract_processes(),
+                    mp_context=multiprocessing.get_context("spawn"),
+                    max_tasks_per_child=PDF_EXTRACT_MAX_TASKS_PER_CHILD,
+                )
+            except Exception as exc:
+                logger.warning("pdf extract: no process pool (%s); extracting in-process", exc)
+                _pool_unavailable = True
+        return _pool
+
+
+def _reset_pool(broken):
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _isolate(path: str, pages: list[int]) -> list[Tuple[int, str]]:
+    # a process died inside this slice (MuPDF crash on a corrupt page): redo it one page per
+    # task, so only the page that kills a process again is lost
+    out = []
+    for p in pages:
+        pool = _get_pool()
+        if pool is None:
+            out.extend(_iter_serial(path, [p]))
+            continue
+        try:
+            fut = pool.submit(_extract_slice, path, [p])
+        except BrokenProcessPool:
+            _reset_pool(pool)
+            out.extend(_iter_serial(path, [p]))
+            continue
+        except Exception as exc:
+            _disable_pool(exc)
+            out.extend(_iter_serial(path, [p]))
+            continue
+        try:
+            out.extend(fut.result())
+        except BrokenProcessPool:
+            logger.warning("pdf extract: page %d of %s crashed the extractor, using empty text", p, path)
+            _reset_pool(pool)
+            out.append((p, ""))
+    return out
+
+
+def iter_page_texts(path: str, page_numbers: Iterable[int]) -> Iterator[Tuple[int, str]]:
+    """
+    Yields (page_number, text) for the given 1-based pages, in the order given.
+    With PDF_EXTRACT_PROCESSES > 1 and enough pages the work is split into
+    PDF_EXTRACT_SLICE_PAGES slices handled by a process pool; results are still
+    yielded in order, and at most 2 slices per process are in flight (or
+    finished but not yet consumed). Failing pages yield "".
+    """
+    page_numbers = list(page_numbers)
+    procs = extract_processes()
+    pool = _get_pool() if procs > 1 and len(page_numbers) >= PDF_EXTRACT_MIN_PAGES else None
+    if pool is None:
+        yield from _iter_serial(path, page_numbers)
+        return
+
+    size = max(1, PDF_EXTRACT_SLICE_PAGES)
+    slices = iter([page_numbers[i:i + size] for i in range(0, len(page_numbers), size)])
+    window = deque()
+
+    def submit(pages):
+        current = _get_pool()
+        fut = None
+        if current is not None:
+            try:
+                fut = current.submit(_extract_slice, path, pages)
+            except BrokenProcessPool:
+                _reset_pool(current)
+                current = None
+            except Exception as exc:
+                # processes start on the first submit; if they can't (daemonic parent,
+                # resource limits) extract in-process from now on
+                _disable_pool(exc)
+                current = None
+        if fut is None:
+            fut = Future()
+            fut.set_result(list(_iter_serial(path, pages)))
+        window.append((pages, current, fut))
+
+    try:
+        for _ in range(procs * 2):
+            pages = next(slices, None)
+            if pages is None:
+                break
+            submit(pages)
+        while window:
+            pages, used, fut = window.popleft()
+            try:
+                result = fut.result()
+            except BrokenProcessPool:
+                _reset_pool(used)
+                result = _isolate(path, pages)
+                # the rest of the window went down with the pool; resubmit it
+                stale = [w[0] for w in window]
+                window.clear()
+                for p in stale:
+                    submit(p)
+            yield from result
+            pages = next(slices, None)
+            if pages is not None:
+                submit(pages)
+    finally:
+        for _, _, fut in window:
+            fut.cancel()
@@ -0,0 +1,208 @@
+# backend/documents/progress.py
+import os
+import json
+import time
+import logging
+
+from django.db import transaction
+
+from .models import Document
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# how often a running pipeline writes its counters to Redis / snapshots them into Document.metadata
+PROGRESS_FLUSH_SECONDS = float(os.getenv("INGEST_PROGRESS_FLUSH_SECONDS", 1.0))
+PROGRESS_DB_FLUSH_SECONDS = float(os.getenv("INGEST_PROGRESS_DB_FLUSH_SECONDS", 30.0))
+PROGRESS_TTL = int(os.getenv("INGEST_PROGRESS_TTL", 24 * 3600))
+# documents stay in a project's "recent" set this long after their last update
+PROGRESS_RECENT_SECONDS = int(os.getenv("INGEST_PROGRESS_RECENT_SECONDS", 3600))
+
+KEY_PREFIX = "askyourdocs:ingest:progress"
+
+# per-part counters; a part is one pipeline run (a page range, or the whole document).
+# chunks_embedded counts vectors the embedding API returned, chunks_cached the ones reused
+METRICS = ("pages_extracted", "pages_done", "chunks_created", "chunks_embedded", "chunks_cached",
+           "points_upserted")
+
+
+def _doc_key(doc_id) -> str:
+    return f"{KEY_PREFIX}:doc:{doc_id}"
+
+
+def _recent_key(project_id) -> str:
+    return f"{KEY_PREFIX}:recent:{project_id}"
+
+
+def events_channel(project_id) -> str:
+    """Pub/sub channel carrying status/progress changes of a project's documents (see events.py)."""
+    return f"{KEY_PREFIX}:events:{project_id}"
+
+
+def _redis():
+    try:
+        return get_redis()
+    except Exception as exc:
+        logger.warning("ingest progress: redis unavailable: %s", exc)
+        return None
+
+
+def _touch(pipe, doc_id, project_id, now):
+    pipe.expire(_doc_key(doc_id), PROGRESS_TTL)
+    if project_id:
+        pipe.zadd(_recent_key(project_id), {str(doc_id): now})
+        pipe.zremrangebyscore(_recent_key(project_id), "-inf", now - PROGRESS_RECENT_SECONDS)
+        pipe.expire(_recent_key(project_id), PROGRESS_RECENT_SECONDS)
+
+
+def _publish(r, doc_id, project_id, event: str):
+    # subscribers get the whole current state, not a delta, so a missed message is harmless
+    if not project_id:
+        return
+    state = _parse(r.hgetall(_doc_key(doc_id)))
+    if state:
+        r.publish(events_channel(project_id), json.dumps({"event": event, "document_id": str(doc_id), **state}))
+
+
+def set_status(doc_id, project_id, status: str, **fields):
+    """
+    Record a status change (queued / ingesting / done / error). Progress is
+    best effort: Redis errors are logged, never raised.
+    """
+    r = _redis()
+    if r is None:
+        return
+    now = time.time()
+    try:
+        pipe = r.pipeline(transaction=False)
+        pipe.hset(_doc_key(doc_id), mapping={"status": status, "project_id": str(project_id or ""),
+                                             "updated_at": now, **fields})
+        _touch(pipe, doc_id, project_id, now)
+        pipe.execute()
+        _publish(r, doc_id, project_id, "status")
+    except Exception as exc:
+        logger.warning("ingest progress: status update failed for %s: %s", doc_id, exc)
+
+
+def start(doc_id, project_id, pages_total: int):
+    """
+    A fresh ingestion attempt: drop counters from earlier attempts and record the page count.
+    """
+    r = _redis()
+    if r is not None:
+        try:
+            r.delete(_doc_key(doc_id))
+        except Exception as exc:
+            logger.warning("ingest progress: reset failed for %s: %s", doc_id, exc)
+    set_status(doc_id, project_id, "ingesting", pages_total=pages_total, started_at=time.time())
+
+
+def _parse(raw: dict) -> dict | None:
+    if not raw:
+        return None
+    raw = {k.decode(): v.decode() for k, v in raw.items()}
+    totals = dict.fromkeys(METRICS, 0)
+    for key, val in raw.items():
+        if key.startswith("part:"):
+            metric = key.rsplit(":", 1)[1]
+            if metric in totals:
+                totals[metric] += int(val)
+    now = time.time()
+    pages_total = int(raw["pages_total"]) if raw.get("pages_total") else None
+    started_at = float(raw["started_at"]) if raw.get("started_at") else None
+    out = {
+        "status": raw.get("status"),
+        "pages_total": pages_total,
+        **totals,
+        "started_at": started_at,
+        "updated_at": float(raw["updated_at"]) if raw.get("updated_at") else None,
+        "pages_per_sec": None,
+        "eta_seconds": None,
+    }
+    if started_at and totals["pages_done"] and out["status"] == "ingesting":
+        rate = totals["pages_done"] / max(now - started_at, 1e-3)
+        out["pages_per_sec"] = round(rate, 2)
+        if pages_total:
+            out["eta_seconds"] = int(max(pages_total - totals["pages_done"], 0) / rate)
+    return out
+
+
+def read(doc_id) -> dict | None:
+    r = _redis()
+    if r is None:
+        return None
+    try:
+        return _parse(r.hgetall(_doc_key(doc_id)))
+    except Exception as exc:
+        logger.warning("ingest progress: read failed for %s: %s", doc_id, exc)
+        return None
+
+
+def read_project(project_id) -> dict[str, dict]:
+    """
+    Progress of the project's documents updated in the last PROGRESS_RECENT_SECONDS.
+    Redis only.
+    """
+    r = _redis()
+    if r is None:
+        return {}
+    try:
+        ids = [i.decode() for i in r.zrangebyscore(_recent_key(project_id), time.time() - PROGRESS_RECENT_SECONDS, "+inf")]
+        pipe = r.pipeline(transaction=False)
+        for doc_id in ids:
+            pipe.hgetall(_doc_key(doc_id))
+        return {doc_id: p for doc_id, p in zip(ids, map(_parse, pipe.execute())) if p}
+    except Exception as exc:
+        logger.warning("ingest progress: project read failed for %s: %s", project_id, exc)
+        return {}
+
+
+class ProgressReporter:
+    """
+    Counters of one pipeline run, written as absolute values under
+    "part:<part>:<metric>" so retries of a part overwrite rather than add up.
+    update() is cheap to call often: Redis is written at most every
+    PROGRESS_FLUSH_SECONDS and Document.metadata["progress"] every
+    PROGRESS_DB_FLUSH_SECONDS.
+    """
+
+    def __init__(self, doc_id, project_id, part: str = "all"):
+        self.doc_id = doc_id
+        self.project_id = project_id
+        self.part = part
+        self.r = _redis()
+        self._last_flush = 0.0
+        self._last_db_flush = time.monotonic()
+
+    def update(self, values: dict, force: bool = False):
+        now = time.monotonic()
+        if self.r is None or (not force and now - self._last_flush < PROGRESS_FLUSH_SECONDS):
+            return
+        self._last_flush = now
+        try:
+            wall = time.time()
+            pipe = self.r.pipeline(transaction=False)
+            pipe.hset(_doc_key(self.doc_id), mapping={
+                **{f"part:{self.part}:{k}": int(v) for k, v in values.items()},
+                "updated_at": wall,
+            })
+            _touch(pipe, self.doc_id, self.project_id, wall)
+            pipe.execute()
+            _publish(self.r, self.doc_id, self.project_id, "progress")
+        except Exception as exc:
+            logger.warning("ingest progress: update failed for %s: %s", self.doc_id, exc)
+            return
+        if force or now - self._last_db_flush >= PROGRESS_DB_FLUSH_SECONDS:
+            self._last_db_flush = now
+            self.flush_db()
+
+    def flush_db(self):
+        snapshot = read(self.doc_id)
+        if snapshot is None:
+            return
+        # other parts of the same document write metadata too; lock and merge
+        with transaction.atomic():
+            locked = Document.objects.select_for_update().only("id", "metadata").get(id=self.doc_id)
+            metadata = locked.metadata or {}
+            metadata["progress"] = snapshot
+            Document.objects.filter(id=self.doc_id).update(metadata=metadata)
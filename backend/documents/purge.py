@@ -0,0 +1,277 @@
+# backend/documents/purge.py
+import os
+import time
+import logging
+from dataclasses import dataclass, asdict
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.db.models.functions import Length
+from django.utils import timezone
+from qdrant_client.http import models as rest
+
+from projects.models import Project
+from .models import CollectionBuild, Document, DocumentChunk
+from .qdrant_client import CollectionSpec, QdrantClientWrapper, collection_spec
+from . import text_cache
+
+logger = logging.getLogger(__name__)
+
+# deleted documents and projects stay restorable (re-upload revives a document) this long
+PURGE_GRACE_DAYS = float(os.getenv("PURGE_GRACE_DAYS", 7))
+# chunk rows deleted per statement
+PURGE_CHUNK_BATCH = int(os.getenv("PURGE_CHUNK_BATCH", 1000))
+# chunk rows + Qdrant points removed per second, so a large purge doesn't crowd out
+# ingestion and search on the database and Qdrant; 0 = unlimited
+PURGE_MAX_CHUNKS_PER_SECOND = float(os.getenv("PURGE_MAX_CHUNKS_PER_SECOND", 2000))
+# Document.status while a purge is removing it; such a row can no longer be restored
+PURGING = "purging"
+
+
+@dataclass
+class PurgeStats:
+    documents: int = 0
+    projects: int = 0
+    chunks: int = 0
+    points: int = 0
+    files: int = 0
+    # reclaimed bytes: stored uploads, cached page text, chunk text rows, vectors (points x dim x 4)
+    file_bytes: int = 0
+    text_cache_bytes: int = 0
+    chunk_text_bytes: int = 0
+    vector_bytes: int = 0
+
+    @property
+    def total_bytes(self) -> int:
+        return self.file_bytes + self.text_cache_bytes + self.chunk_text_bytes + self.vector_bytes
+
+    def as_dict(self) -> dict:
+        return {**asdict(self), "total_bytes": self.total_bytes}
+
+
+class _Pace:
+    """Sleeps as needed to keep removals at or below PURGE_MAX_CHUNKS_PER_SECOND."""
+
+    def __init__(self, per_second: float):
+        self.per_second = per_second
+        self.start = time.monotonic()
+        self.spent = 0
+
+    def take(self, n: int):
+        if self.per_second <= 0 or not n:
+            return
+        self.spent += n
+        ahead = self.spent / self.per_second - (time.monotonic() - self.start)
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+def soft_delete_project(project):
+    """
+    Mark a project and its live documents deleted; their grace period starts
+    now. Vectors are flagged so nothing finds them before the purge removes them.
+    """
+    now = timezone.now()
+    project.is_deleted = True
+    project.deleted_at = now
+    project.save(update_fields=["is_deleted", "deleted_at"])
+    Document.objects.filter(project=project, is_deleted=False).update(is_deleted=True, deleted_at=now)
+    from .qdrant_search import set_project_deleted
+    project_id = str(project.id)
+    transaction.on_commit(lambda: set_project_deleted(project_id))
+
+
+def _stamp_undated():
+    """
+    Rows soft-deleted before deleted_at existed (or by other code paths) start
+    their grace period now; documents of projects deleted before deletes
+    cascaded are marked deleted along with them.
+    """
+    now = timezone.now()
+    Project.objects.filter(is_deleted=True, deleted_at__isnull=True).update(deleted_at=now)
+    Document.objects.filter(is_deleted=True, deleted_at__isnull=True).update(deleted_at=now)
+    Document.objects.filter(project__is_deleted=True, is_deleted=False).update(is_deleted=True, deleted_at=now)
+
+
+def _point_collections(q) -> list[CollectionSpec]:
+    # the live collection plus every build collection still around: a rollback target
+    # or an in-progress build would otherwise keep (or resurrect) the points
+    specs = [collection_spec(q.collection)]
+    for name in CollectionBuild.objects.exclude(collection=q.collection).values_list("collection", flat=True):
+        if q.client.collection_exists(name):
+            specs.append(collection_spec(name))
+    return specs
+
+
+def _delete_points(q, collections, doc, stats, dry_run) -> int:
+    # one filtered delete per collection; document_id is indexed (qdrant_schema.py)
+    selector = rest.Filter(must=[rest.FieldCondition(key="document_id", match=rest.MatchValue(value=str(doc.id)))])
+    points = 0
+    for spec in collections:
+        found = q.client.count(collection_name=spec.name, count_filter=selector, exact=True).count
+        if found and not dry_run:
+            q.client.delete(collection_name=spec.name, points_selector=rest.FilterSelector(filter=selector))
+        points += found
+        stats.vector_bytes += found * spec.dim * 4
+    stats.points += points
+    return points
+
+
+def _delete_chunks(doc, stats, pace, dry_run):
+    qs = DocumentChunk.objects.filter(document_id=doc.id)
+    if dry_run:
+        stats.chunks += qs.count()
+        stats.chunk_text_bytes += qs.aggregate(n=Sum(Length("text")))["n"] or 0
+        return
+    # pointer rows first: deleting a representative would cascade into them unbatched.
+    # One short transaction per batch; the pause happens between them, never inside
+    for part in (qs.filter(duplicate_of__isnull=False), qs):
+        while True:
+            with transaction.atomic():
+                ids = list(part.values_list("id", flat=True)[:PURGE_CHUNK_BATCH])
+                if not ids:
+                    break
+                batch = DocumentChunk.objects.filter(id__in=ids)
+                stats.chunk_text_bytes += batch.aggregate(n=Sum(Length("text")))["n"] or 0
+                stats.chunks += batch.delete()[1].get(DocumentChunk._meta.label, 0)
+            pace.take(len(ids))
+
+
+def _dir_bytes(path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.path.getsize(os.path.join(root, f))
+            except OSError:
+                pass
+    return total
+
+
+def _stored_versions(doc):
+    """(path, sha256) of the current upload and of every earlier version (views.new_version)."""
+    metadata = doc.metadata or {}
+    seen = [(metadata.get("path"), doc.sha256)]
+    for v in metadata.get("versions") or []:
+        seen.append((v.get("path"), v.get("sha256")))
+    return seen
+
+
+def _used_elsewhere(doc, path=None, sha256=None) -> bool:
+    # another row's current upload or one of its earlier versions
+    others = Document.objects.exclude(id=doc.id)
+    if path:
+        return others.filter(Q(metadata__path=path) | Q(metadata__versions__icontains=path)).exists()
+    return others.filter(Q(sha256=sha256) | Q(metadata__versions__icontains=sha256)).exists()
+
+
+def _delete_upload(doc, path, stats, dry_run):
+    if _used_elsewhere(doc, path=path):
+        return
+    try:
+        size = default_storage.size(path)
+        if not dry_run:
+            default_storage.delete(path)
+        stats.files += 1
+        stats.file_bytes += size
+    except FileNotFoundError:
+        pass
+    except Exception:
+        logger.exception("purge: could not delete stored file %s of document %s", path, doc.id)
+
+
+def _delete_files(doc, stats, dry_run):
+    # uploads and cached text are content-addressed: keep them while another row uses the same bytes
+    paths, shas = set(), set()
+    for path, sha in _stored_versions(doc):
+        if path and path not in paths:
+            paths.add(path)
+            _delete_upload(doc, path, stats, dry_run)
+        if sha and sha not in shas:
+            shas.add(sha)
+            if not _used_elsewhere(doc, sha256=sha):
+                stats.text_cache_bytes += _dir_bytes(os.path.join(text_cache.TEXT_CACHE_DIR, sha[:2], sha))
+                if not dry_run:
+                    text_cache.clear(sha)
+
+
+def _claim(doc, cutoff) -> bool:
+    # a claimed row stays claimed, so an interrupted purge resumes with it next run
+    return bool(
+        Document.objects.filter(id=doc.id, is_deleted=True)
+        .filter(Q(deleted_at__lte=cutoff) | Q(status=PURGING))
+        .update(status=PURGING)
+    )
+
+
+def purge_document(doc, q, collections, stats, pace, cutoff, dry_run=False) -> bool:
+    """
+    Remove one deleted document for good: vectors, chunk rows, stored files
+    (every version) and cached text, then the row itself. Each step can be
+    repeated, and the row goes last, so an interrupted purge picks the
+    document up again next run.
+
+    The row is first claimed (status "purging") in one conditional update: a
+    re-upload restores a document by updating this row and skips claimed rows
+    (views._restore), so it either lands before the claim (and the document is
+    skipped) or becomes a new document. After that every step commits on its
+    own: points outside any transaction, chunks in short per-batch
+    transactions, and only the final re-check and delete hold the row lock.
+    Returns False if the document was restored meanwhile.
+    """
+    if dry_run:
+        pace.take(_delete_points(q, collections, doc, stats, dry_run))
+        _delete_chunks(doc, stats, pace, dry_run)
+        _delete_files(doc, stats, dry_run)
+        stats.documents += 1
+        return True
+    if not _claim(doc, cutoff):
+        return False
+    doc = Document.objects.get(id=doc.id)
+    pace.take(_delete_points(q, collections, doc, stats, dry_run))
+    _delete_chunks(doc, stats, pace, dry_run)
+    _delete_files(doc, stats, dry_run)
+    with transaction.atomic():
+        if Document.objects.select_for_update().filter(id=doc.id, status=PURGING).exists():
+            doc.delete()
+    stats.documents += 1
+    return True
+
+
+def run_purge(deadline: float | None = None, dry_run: bool = False, grace_days: float | None = None,
+              stats: PurgeStats | None = None) -> tuple[PurgeStats, bool]:
+    """
+    Purge documents and projects deleted more than the grace period ago,
+    oldest first. Past `deadline` (time.monotonic()) it stops between
+    documents and returns (stats, False); calling again carries on.
+    """
+    stats = stats or PurgeStats()
+    cutoff = timezone.now() - timedelta(days=PURGE_GRACE_DAYS if grace_days is None else grace_days)
+    if not dry_run:
+        _stamp_undated()
+
+    q = QdrantClientWrapper()
+    collections = _point_collections(q)
+    pace = _Pace(PURGE_MAX_CHUNKS_PER_SECOND)
+
+    docs = (Document.objects.filter(is_deleted=True)
+            .filter(Q(deleted_at__lte=cutoff) | Q(status=PURGING))
+            .only("id").order_by("deleted_at", "id"))
+    for doc in docs.iterator(chunk_size=100):
+        if deadline is not None and time.monotonic() > deadline:
+            return stats, False
+        if not purge_document(doc, q, collections, stats, pace, cutoff, dry_run=dry_run):
+            logger.info("purge: document %s was restored, skipped", doc.id)
+
+    # a project goes once its documents have; its conversations and batches cascade with it
+    for project in Project.objects.filter(is_deleted=True, deleted_at__lte=cutoff):
+        if dry_run or not Document.objects.filter(project=project).exists():
+            if not dry_run:
+                project.delete()
+            stats.projects += 1
+
+    if stats.documents or stats.projects:
+        logger.info("purge%s: %s", " (dry run)" if dry_run else "", stats.as_dict())
+    return stats, True
@@ -1,41 +1,260 @@
 import os
+import re
+import time
+import threading
+from dataclasses import dataclass
+
+import requests
+from requests.adapters import HTTPAdapter
 from qdrant_client import QdrantClient
 from qdrant_client.http import models as rest
 from qdrant_client.http import exceptions as qexc
 
+from .models import CollectionBuild
+from .gemini_client import EMBED_MODEL
+from .qdrant_schema import ensure_schema, hnsw_config, quantization_config, quantization_mode, vector_params
+
 def _env(name, default=None):
     return os.getenv(name, default)
 
+# how long an alias -> collection lookup is reused. Callers search/write the resolved
+# collection, not the alias, so a stale entry means the previous collection for a few
+# seconds, never vectors of one model searched with another
+QDRANT_ALIAS_CACHE_SECONDS = float(_env("QDRANT_ALIAS_CACHE_SECONDS", 5))
+# gRPC (protobuf vectors instead of JSON) for client calls; needs Qdrant's gRPC port reachable
+QDRANT_PREFER_GRPC = _env("QDRANT_PREFER_GRPC", "0") == "1"
+QDRANT_GRPC_PORT = int(_env("QDRANT_GRPC_PORT", 6334))
+QDRANT_TIMEOUT = int(_env("QDRANT_TIMEOUT", 30))
+# keep-alive connections per process for the raw REST calls in qdrant_search.py
+QDRANT_HTTP_POOL_SIZE = int(_env("QDRANT_HTTP_POOL_SIZE", 16))
+
+
+# --- process-wide transport ------------------------------------------------
+
+_clients = {}  # (url, api_key) -> QdrantClient
+_sessions = {}  # api_key -> requests.Session
+_transport_lock = threading.Lock()
+
+
+def get_qdrant(url: str, api_key: str | None = None) -> QdrantClient:
+    """
+    One QdrantClient per (url, api_key) per process, so its HTTP keep-alive
+    pool (or gRPC channel) is reused instead of reconnecting on every task.
+    """
+    key = (url.rstrip("/"), api_key or None)
+    with _transport_lock:
+        client = _clients.get(key)
+        if client is None:
+            kwargs = {"url": key[0], "timeout": QDRANT_TIMEOUT}
+            if QDRANT_PREFER_GRPC:
+                kwargs.update(prefer_grpc=True, grpc_port=QDRANT_GRPC_PORT)
+            if api_key:
+                kwargs["api_key"] = api_key
+            client = _clients[key] = QdrantClient(**kwargs)
+        return client
+
+
+def rest_session(api_key: str | None = None) -> requests.Session:
+    """
+    Pooled keep-alive session for hand-written REST calls (qdrant_search.py).
+    """
+    with _transport_lock:
+        session = _sessions.get(api_key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=QDRANT_HTTP_POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["Content-Type"] = "application/json"
+            if api_key:
+                session.headers["api-key"] = api_key
+            _sessions[api_key] = session
+        return session
+
+
+def reset_transport():
+    """
+    Drop clients, sessions and alias lookups inherited from a parent process;
+    sockets and gRPC channels don't survive fork. Called at worker_process_init.
+    """
+    with _transport_lock:
+        _clients.clear()
+        _sessions.clear()
+    _resolved.clear()
+
+
+@dataclass(frozen=True)
+class CollectionSpec:
+    """A physical collection and the embedding model its vectors come from."""
+    name: str
+    model: str
+    dim: int
+
+
+_resolved = {}  # alias -> (expires_at, CollectionSpec)
+
+
+def alias_target(client, alias: str) -> str | None:
+    for a in client.get_aliases().aliases:
+        if a.alias_name == alias:
+            return a.collection_name
+    return None
+
+
+def handover_alias(alias: str) -> str:
+    """
+    Stand-in for `alias` while a plain collection of that name is replaced by
+    the alias (QdrantClientWrapper.replace_with_alias): Qdrant can't hold both.
+    """
+    return f"{alias}__handover"
+
+
+def collection_spec(name: str) -> CollectionSpec:
+    row = CollectionBuild.objects.filter(collection=name).values_list("embed_model", "embed_dim").first()
+    if row:
+        return CollectionSpec(name, row[0], row[1])
+    # collections from before rebuilds existed: the env settings describe them
+    return CollectionSpec(name, EMBED_MODEL, int(_env("EMBED_DIM", 768)))
+
+
+def resolve_collection(client, alias: str) -> CollectionSpec | None:
+    """
+    The collection `alias` currently means (an alias target, or a plain
+    collection of that name) with its embedding model; None if neither exists.
+    During a handover the stand-in alias wins over the plain collection.
+    """
+    hit = _resolved.get(alias)
+    if hit and hit[0] > time.monotonic():
+        return hit[1]
+    aliases = {a.alias_name: a.collection_name for a in client.get_aliases().aliases}
+    name = aliases.get(alias) or aliases.get(handover_alias(alias))
+    if name is None:
+        if not client.collection_exists(alias):
+            return None
+        name = alias
+    spec = collection_spec(name)
+    _resolved[alias] = (time.monotonic() + QDRANT_ALIAS_CACHE_SECONDS, spec)
+    return spec
+
+
+def versioned_name(alias: str, model: str, dim: int, suffix: str = "") -> str:
+    name = f"{alias}__{re.sub(r'[^A-Za-z0-9]+', '-', model).strip('-')}_{dim}"
+    return f"{name}_{suffix}" if suffix else name
+
+
 class QdrantClientWrapper:
+    """
+    Reads and writes go to the collection behind the QDRANT_COLLECTION_NAME
+    alias as resolved at construction, so one wrapper never mixes collections
+    (or embedding models) even if the alias is switched meanwhile. embed_model
+    and embed_dim say how vectors for it must be made.
+    """
+
     def __init__(self, url: str | None = None, collection: str | None = None, api_key: str | None = None):
         self.url = url or _env("QDRANT_URL", "http://localhost:6333")
         self.api_key = api_key or _env("QDRANT_API_KEY", None)
-        self.collection = collection or _env("QDRANT_COLLECTION_NAME", "documents")
-        # embedding dim must be set in env
-        embed_dim = int(_env("EMBED_DIM", 768))
-        self.embed_dim = embed_dim
-
-        # instantiate client (if API key needed, pass it)
-        if self.api_key:
-            self.client = QdrantClient(url=self.url, api_key=self.api_key)
-        else:
-            self.client = QdrantClient(url=self.url)
-
-        # ensure collection exists with correct vector params
+        self.alias = collection or _env("QDRANT_COLLECTION_NAME", "documents")
+
+        # shared per process; constructing a wrapper per task is cheap
+        self.client = get_qdrant(self.url, self.api_key)
+
+        # ensure collection exists with correct vector params. The lookup is cached for
+        # QDRANT_ALIAS_CACHE_SECONDS, so this is not a round trip per wrapper
         try:
-            if not self._collection_exists(self.collection):
-                self._create_collection(self.collection, self.embed_dim)
+            spec = resolve_collection(self.client, self.alias) or self._create_initial()
         except Exception as exc:
             # raise a helpful message in dev
             raise RuntimeError(f"Failed to ensure Qdrant collection: {exc}") from exc
+        self.collection = spec.name
+        self.embed_model = spec.model
+        self.embed_dim = spec.dim
 
     def _collection_exists(self, name: str) -> bool:
-        cols = self.client.get_collections().collections
-        return any(c.name == name for c in cols)
+        return self.client.collection_exists(name)
 
     def _create_collection(self, name: str, dim: int):
-        params = rest.VectorParams(size=dim, distance=rest.Distance.COSINE)
-        self.client.recreate_collection(collection_name=name, vectors_config=params)
+        # storage mode from QDRANT_QUANTIZATION / QDRANT_VECTORS_ON_DISK (qdrant_schema.py)
+        self.client.create_collection(
+            collection_name=name,
+            vectors_config=vector_params(dim),
+            hnsw_config=hnsw_config(),
+            quantization_config=quantization_config(),
+        )
+        # indexes while the collection is empty, so segments are built with them from the start
+        self.ensure_schema(name)
+
+    def ensure_schema(self, name: str | None = None, dry_run: bool = False,
+                      quantization: str | None = None, on_disk: bool | None = None) -> list[str]:
+        """
+        Apply payload indexes and the storage mode (quantization, vectors on disk)
+        to a collection, by default the one this wrapper resolved. See qdrant_schema.ensure_schema.
+        """
+        return ensure_schema(self.client, name or self.collection, dry_run=dry_run,
+                             quantization=quantization, on_disk=on_disk)
+
+    def storage_mode(self) -> dict:
+        """Quantization and vector placement the collection actually has right now."""
+        config = self.client.get_collection(self.collection).config
+        vectors = config.params.vectors
+        return {
+            "quantization": quantization_mode(config.quantization_config),
+            "vectors_on_disk": bool(getattr(vectors, "on_disk", False)),
+        }
+
+    def _create_initial(self) -> CollectionSpec:
+        # fresh install: a versioned collection behind the alias, so later rebuilds can swap it
+        spec = collection_spec(versioned_name(self.alias, EMBED_MODEL, int(_env("EMBED_DIM", 768))))
+        try:
+            self._create_collection(spec.name, spec.dim)
+            self.switch_alias(spec.name)
+        except qexc.UnexpectedResponse:
+            # another process got there first
+            _resolved.pop(self.alias, None)
+            spec = resolve_collection(self.client, self.alias)
+            if spec is None:
+                raise
+        return spec
+
+    def switch_alias(self, target: str):
+        """
+        Point the alias at another collection. Removing the old alias and
+        creating the new one is a single Qdrant request, applied atomically.
+        """
+        ops = []
+        if alias_target(self.client, self.alias) is not None:
+            ops.append(rest.DeleteAliasOperation(delete_alias=rest.DeleteAlias(alias_name=self.alias)))
+        ops.append(rest.CreateAliasOperation(
+            create_alias=rest.CreateAlias(collection_name=target, alias_name=self.alias)))
+        self.client.update_collection_aliases(change_aliases_operations=ops)
+        _resolved.pop(self.alias, None)
+
+    def replace_with_alias(self, target: str):
+        """
+        Replace a plain collection named like the alias (from before aliases)
+        with the alias pointing at target, without a moment where the name
+        resolves to nothing. The stand-in alias goes up first and resolvers
+        prefer it; once every process's cached lookup has expired, the plain
+        collection is dropped, then the alias created and the stand-in removed
+        in one request.
+        """
+        stand_in = handover_alias(self.alias)
+        ops = []
+        if alias_target(self.client, stand_in) is not None:
+            ops.append(rest.DeleteAliasOperation(delete_alias=rest.DeleteAlias(alias_name=stand_in)))
+        ops.append(rest.CreateAliasOperation(
+            create_alias=rest.CreateAlias(collection_name=target, alias_name=stand_in)))
+        self.client.update_collection_aliases(change_aliases_operations=ops)
+        _resolved.pop(self.alias, None)
+        if alias_target(self.client, stand_in) != target:
+            raise RuntimeError(f"stand-in alias {stand_in} does not resolve to {target}")
+
+        time.sleep(QDRANT_ALIAS_CACHE_SECONDS + 1)
+        self.client.delete_collection(self.alias)
+        self.client.update_collection_aliases(change_aliases_operations=[
+            rest.CreateAliasOperation(create_alias=rest.CreateAlias(collection_name=target, alias_name=self.alias)),
+            rest.DeleteAliasOperation(delete_alias=rest.DeleteAlias(alias_name=stand_in)),
+        ])
+        _resolved.pop(self.alias, None)
 
     def upsert_vectors(self, ids: list[str], vectors: list[list[float]], payloads: list[dict]):
         """
@@ -50,6 +269,45 @@ class QdrantClientWrapper:
         ]
         self.client.upsert(collection_name=self.collection, points=points)
 
+    def delete_points(self, ids: list[str]):
+        """
+        Hard-delete points by id.
+        """
+        if not ids:
+            return
+        self.client.delete(collection_name=self.collection, points_selector=rest.PointIdsList(points=ids))
+
+    def set_payload(self, ids: list[str], payload: dict):
+        """
+        Merge the same payload keys into every point in ids.
+        """
+        if not ids:
+            return
+        self.client.set_payload(collection_name=self.collection, payload=payload, points=ids)
+
+    def set_payloads(self, payloads: dict[str, dict]):
+        """
+        Merge per-point payload keys ({point_id: {...}}) in one batch request.
+        """
+        if not payloads:
+            return
+        ops = [
+            rest.SetPayloadOperation(set_payload=rest.SetPayload(payload=payload, points=[pid]))
+            for pid, payload in payloads.items()
+        ]
+        self.client.batch_update_points(collection_name=self.collection, update_operations=ops)
+
+    def retrieve_vectors(self, ids: list[str]) -> dict[str, list[float]]:
+        """
+        Fetch stored vectors by point id. Ids that don't exist are absent from the result.
+        """
+        if not ids:
+            return {}
+        points = self.client.retrieve(
+            collection_name=self.collection, ids=ids, with_payload=False, with_vectors=True
+        )
+        return {str(p.id): p.vector for p in points}
+
     def search(self, vector: list[float], top: int = 12):
         """
         Returns a list of qdrant search results (PointResult objects).
@@ -57,4 +315,5 @@ class QdrantClientWrapper:
         return self.client.search(collection_name=self.collection, query_vector=vector, limit=top)
 
     def health(self) -> dict:
-        return {"url": self.url, "collection": self.collection, "embed_dim": self.embed_dim}
+        return {"url": self.url, "alias": self.alias, "collection": self.collection,
+                "embed_model": self.embed_model, "embed_dim": self.embed_dim}
@@ -0,0 +1,126 @@
+# backend/documents/qdrant_schema.py
+import logging
+import os
+
+from qdrant_client.http import models as rest
+
+logger = logging.getLogger(__name__)
+
+# every search filters on project_id and the deleted flags (qdrant_search._build_filter),
+# deletes and flag updates scroll on document_id. Without an index each of those
+# conditions is checked by reading payloads point by point
+PAYLOAD_INDEXES = {
+    "project_id": rest.PayloadSchemaType.KEYWORD,
+    "document_id": rest.PayloadSchemaType.KEYWORD,
+    "is_deleted": rest.PayloadSchemaType.BOOL,
+    "chunk_deleted": rest.PayloadSchemaType.BOOL,
+}
+
+# with payload_m set Qdrant also links points within each indexed project_id value,
+# so a project-filtered search walks that project's graph instead of the global one
+QDRANT_HNSW_PAYLOAD_M = int(os.getenv("QDRANT_HNSW_PAYLOAD_M", 16))
+# links of the global graph across all projects. Nothing searches unfiltered, so 0
+# (per-project graphs only, much cheaper indexing) is an option for large installs
+QDRANT_HNSW_M = int(os.getenv("QDRANT_HNSW_M", 16))
+
+# compressed copy of every vector kept in RAM for the HNSW walk: "scalar" (int8, 4x
+# smaller than float32), "binary" (1 bit per dimension, 32x) or "none"
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "none").lower()
+QUANTIZATION_MODES = ("none", "scalar", "binary")
+# original float32 vectors in a memory-mapped file instead of RAM; only read to rescore
+# the top candidates. Defaults to on whenever quantization is on
+QDRANT_VECTORS_ON_DISK = os.getenv("QDRANT_VECTORS_ON_DISK", "1" if QDRANT_QUANTIZATION != "none" else "0") == "1"
+
+
+def hnsw_config() -> rest.HnswConfigDiff:
+    return rest.HnswConfigDiff(m=QDRANT_HNSW_M, payload_m=QDRANT_HNSW_PAYLOAD_M)
+
+
+def quantization_config(mode: str | None = None):
+    """Qdrant quantization config for a mode in QUANTIZATION_MODES (None for "none")."""
+    mode = mode or QDRANT_QUANTIZATION
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"unknown quantization mode {mode!r}; expected one of {QUANTIZATION_MODES}")
+    if mode == "scalar":
+        return rest.ScalarQuantization(scalar=rest.ScalarQuantizationConfig(
+            type=rest.ScalarType.INT8, quantile=0.99, always_ram=True))
+    if mode == "binary":
+        return rest.BinaryQuantization(binary=rest.BinaryQuantizationConfig(always_ram=True))
+    return None
+
+
+def quantization_mode(config) -> str:
+    if isinstance(config, rest.ScalarQuantization):
+        return "scalar"
+    if isinstance(config, rest.BinaryQuantization):
+        return "binary"
+    if isinstance(config, rest.ProductQuantization):
+        return "product"
+    return "none"
+
+
+def vector_params(dim: int, on_disk: bool | None = None) -> rest.VectorParams:
+    on_disk = QDRANT_VECTORS_ON_DISK if on_disk is None else on_disk
+    return rest.VectorParams(size=dim, distance=rest.Distance.COSINE, on_disk=on_disk)
+
+
+def _data_type(index_info):
+    data_type = getattr(index_info, "data_type", None)
+    return getattr(data_type, "value", data_type)
+
+
+def ensure_schema(client, collection: str, dry_run: bool = False,
+                  quantization: str | None = None, on_disk: bool | None = None) -> list[str]:
+    """
+    Bring a collection's payload indexes, HNSW, quantization and vector
+    storage settings in line with the ones above (quantization/on_disk
+    override the env for one call). Only what differs is changed, so it is
+    safe to run any number of times. Returns the changes made (or, with
+    dry_run, that would be made).
+
+    Indexes go in before the HNSW update: per-project graphs are only built for
+    fields that are indexed when a segment is (re)indexed, and the HNSW change
+    is what makes Qdrant rebuild existing segments.
+    """
+    info = client.get_collection(collection)
+    existing = info.payload_schema or {}
+    changes = []
+
+    for field, schema in PAYLOAD_INDEXES.items():
+        current = _data_type(existing.get(field))
+        if current == schema.value:
+            continue
+        if current is not None:
+            changes.append(f"{field}: re-index as {schema.value} (was {current})")
+            if not dry_run:
+                client.delete_payload_index(collection, field)
+        else:
+            changes.append(f"{field}: add {schema.value} index")
+        if not dry_run:
+            client.create_payload_index(collection, field, field_schema=schema)
+
+    hnsw = info.config.hnsw_config
+    if (hnsw.m, hnsw.payload_m) != (QDRANT_HNSW_M, QDRANT_HNSW_PAYLOAD_M):
+        changes.append(f"hnsw: m {hnsw.m} -> {QDRANT_HNSW_M}, payload_m {hnsw.payload_m} -> {QDRANT_HNSW_PAYLOAD_M}")
+        if not dry_run:
+            client.update_collection(collection, hnsw_config=hnsw_config())
+
+    # both trigger a background rebuild of the segments; search keeps working meanwhile
+    mode = quantization or QDRANT_QUANTIZATION
+    current_mode = quantization_mode(info.config.quantization_config)
+    if current_mode != mode:
+        changes.append(f"quantization: {current_mode} -> {mode}")
+        if not dry_run:
+            client.update_collection(collection, quantization_config=quantization_config(mode) or rest.Disabled.DISABLED)
+
+    want_on_disk = QDRANT_VECTORS_ON_DISK if on_disk is None else on_disk
+    vectors = info.config.params.vectors
+    if isinstance(vectors, rest.VectorParams) and bool(vectors.on_disk) != want_on_disk:
+        changes.append(f"vectors on disk: {bool(vectors.on_disk)} -> {want_on_disk}")
+        if not dry_run:
+            # "" is the unnamed (default) vector
+            client.update_collection(collection, vectors_config={"": rest.VectorParamsDiff(on_disk=want_on_disk)})
+
+    if changes and not dry_run:
+        logger.info("qdrant schema of %s updated: %s", collection, "; ".join(changes))
+    return changes
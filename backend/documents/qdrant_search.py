@@ -1,9 +1,11 @@
 # backend/documents/qdrant_search.py
 import os
-import json
+import inspect
 import logging
-import requests
-from qdrant_client import QdrantClient
+
+from qdrant_client.http import models as rest
+
+from .qdrant_client import QDRANT_PREFER_GRPC, collection_spec, get_qdrant, resolve_collection, rest_session
 
 
 SCROLL_BATCH = 500  # tune if needed
@@ -14,20 +16,11 @@ logger = logging.getLogger(__name__)
 QDRANT_URL = os.getenv("QDRANT_URL", "http://qdrant:6333")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
 COLLECTION = os.getenv("QDRANT_COLLECTION_NAME", "documents")
-
-_client = None
-
-
-
-
-import inspect
-import json
-import requests
-import logging
-
-logger = logging.getLogger(__name__)
-
-SCROLL_BATCH = 500  # tune if needed
+# defaults for quantized collections (QDRANT_QUANTIZATION): fetch oversampling * top_k
+# candidates with the compressed vectors, then rescore them with the originals. Unset
+# leaves Qdrant's own defaults; both are ignored by collections without quantization
+QDRANT_SEARCH_OVERSAMPLING = os.getenv("QDRANT_SEARCH_OVERSAMPLING")
+QDRANT_SEARCH_RESCORE = os.getenv("QDRANT_SEARCH_RESCORE")
 
 
 def _rest_scroll_point_ids(document_id, project_id=None):
@@ -36,9 +29,7 @@ def _rest_scroll_point_ids(document_id, project_id=None):
     and returns a list of point ids (strings).
     """
     url = QDRANT_URL.rstrip("/") + f"/collections/{COLLECTION}/points/scroll"
-    headers = {"Content-Type": "application/json"}
-    if QDRANT_API_KEY:
-        headers["api-key"] = QDRANT_API_KEY
+    session = rest_session(QDRANT_API_KEY)
 
     filt = {"must": [{"key": "document_id", "match": {"value": str(document_id)}}]}
     if project_id:
@@ -51,7 +42,7 @@ def _rest_scroll_point_ids(document_id, project_id=None):
     while True:
         body = {"filter": filt, "limit": limit, "offset": offset, "with_payload": False}
         try:
-            r = requests.post(url, json=body, headers=headers, timeout=30)
+            r = session.post(url, json=body, timeout=30)
             r.raise_for_status()
             body_json = r.json()
         except Exception as exc:
@@ -206,14 +197,7 @@ def _get_point_ids_for_document(qc, document_id, project_id=None):
     return _rest_scroll_point_ids(document_id, project_id)
 
 def client():
-    global _client
-    if _client is None:
-        url = QDRANT_URL.rstrip("/")
-        if QDRANT_API_KEY:
-            _client = QdrantClient(url=url, api_key=QDRANT_API_KEY)
-        else:
-            _client = QdrantClient(url=url)
-    return _client
+    return get_qdrant(QDRANT_URL, QDRANT_API_KEY)
 
 
 def _build_filter(project_id):
@@ -230,11 +214,17 @@ def _build_filter(project_id):
             {
                 "key": "is_deleted",
                 "match": {"value": True}
+            },
+            {
+                # chunk dropped by a newer version of its document
+                "key": "chunk_deleted",
+                "match": {"value": True}
             }
         ]
     }
 
-def _search_via_rest(query_embedding, top_k, qfilter, score_threshold: float = 0.6):
+def _search_via_rest(query_embedding, top_k, qfilter, score_threshold: float = 0.6, collection: str | None = None,
+                     params: dict | None = None):
     """
     REST fallback to Qdrant /collections/<col>/points/search
 
@@ -247,10 +237,11 @@ def _search_via_rest(query_embedding, top_k, qfilter, score_threshold: float = 0
                        cosine/dot; for L2 distance a lower value is better). This function
                        simply forwards the threshold to the server and also applies a
                        defensive client-side >= comparison on the returned `score`.
+      params: dict|None search params (see _search_params)
     Returns:
       list of normalized items: {"id":..., "score":..., "payload": {...}} (filtered by score_threshold if provided)
     """
-    url = QDRANT_URL.rstrip("/") + f"/collections/{COLLECTION}/points/search"
+    url = QDRANT_URL.rstrip("/") + f"/collections/{collection or COLLECTION}/points/search"
     payload = {
         "vector": query_embedding,
         "limit": top_k,
@@ -258,6 +249,8 @@ def _search_via_rest(query_embedding, top_k, qfilter, score_threshold: float = 0
     }
     if qfilter:
         payload["filter"] = qfilter
+    if params:
+        payload["params"] = params
 
     # forward score_threshold if provided (Qdrant REST supports this)
     if score_threshold is not None:
@@ -267,11 +260,7 @@ def _search_via_rest(query_embedding, top_k, qfilter, score_threshold: float = 0
             # ignore bad value but log
             logger.debug("invalid score_threshold provided to _search_via_rest: %r", score_threshold)
 
-    headers = {"Content-Type": "application/json"}
-    if QDRANT_API_KEY:
-        headers["api-key"] = QDRANT_API_KEY
-
-    r = requests.post(url, json=payload, headers=headers, timeout=15)
+    r = rest_session(QDRANT_API_KEY).post(url, json=payload, timeout=15)
     r.raise_for_status()
     body = r.json()
 
@@ -294,8 +283,7 @@ def _search_via_rest(query_embedding, top_k, qfilter, score_threshold: float = 0
     # normalize items first
     normalized = [_normalize_result_item(p) for p in pts]
 
-    print("REST search returned", len(normalized), "items.")
-    print("QDRANT SEARCH via REST fallback succeeded10\n",'\n'.join([str({r['score']:r['payload']['text'][:100]}) for r in normalized]))
+    logger.debug("REST search returned %d items", len(normalized))
 
 
     # defensive client-side filtering by score_threshold if provided
@@ -327,6 +315,82 @@ def _search_via_rest(query_embedding, top_k, qfilter, score_threshold: float = 0
     return normalized
 
 
+def _search_via_client(query_embedding, top_k, qfilter, score_threshold: float = 0.6, collection: str | None = None,
+                       params: dict | None = None):
+    """
+    Same as _search_via_rest through the shared client, i.e. over gRPC when
+    QDRANT_PREFER_GRPC is set (vectors travel as protobuf floats, not JSON).
+    """
+    points = client().search(
+        collection_name=collection or COLLECTION,
+        query_vector=query_embedding,
+        query_filter=rest.Filter(**qfilter) if qfilter else None,
+        limit=top_k,
+        score_threshold=score_threshold,
+        search_params=rest.SearchParams(**params) if params else None,
+        with_payload=True,
+    )
+    return [_normalize_result_item(p) for p in points]
+
+
+def _search_batch_via_rest(query_embeddings, top_k, qfilter, score_threshold: float = 0.6, collection: str | None = None,
+                           params: dict | None = None):
+    """
+    All query vectors in one POST to /collections/<col>/points/search/batch.
+    Every search carries the same filter; returns one normalized list per vector, in order.
+    """
+    url = QDRANT_URL.rstrip("/") + f"/collections/{collection or COLLECTION}/points/search/batch"
+    searches = []
+    for emb in query_embeddings:
+        search = {"vector": emb, "limit": top_k, "with_payload": True}
+        if qfilter:
+            search["filter"] = qfilter
+        if score_threshold is not None:
+            search["score_threshold"] = float(score_threshold)
+        if params:
+            search["params"] = params
+        searches.append(search)
+
+    r = rest_session(QDRANT_API_KEY).post(url, json={"searches": searches}, timeout=15)
+    r.raise_for_status()
+    body = r.json()
+    batches = body.get("result") if isinstance(body, dict) else body
+    if not isinstance(batches, list) or len(batches) != len(searches):
+        raise ValueError(f"unexpected search/batch response shape: {str(body)[:200]}")
+
+    results = []
+    for pts in batches:
+        normalized = [_normalize_result_item(p) for p in (pts or [])]
+        if score_threshold is not None:
+            # same defensive >= check as _search_via_rest
+            normalized = [i for i in normalized if i.get("score") is not None and float(i["score"]) >= float(score_threshold)]
+        results.append(normalized)
+    logger.debug("REST batch search: %d queries, %s items", len(results), [len(x) for x in results])
+    return results
+
+
+def _search_batch_via_client(query_embeddings, top_k, qfilter, score_threshold: float = 0.6, collection: str | None = None,
+                             params: dict | None = None):
+    """_search_batch_via_rest through the shared client (gRPC when QDRANT_PREFER_GRPC is set)."""
+    query_filter = rest.Filter(**qfilter) if qfilter else None
+    search_params = rest.SearchParams(**params) if params else None
+    batches = client().search_batch(
+        collection_name=collection or COLLECTION,
+        requests=[
+            rest.SearchRequest(
+                vector=emb,
+                filter=query_filter,
+                limit=top_k,
+                score_threshold=score_threshold,
+                params=search_params,
+                with_payload=True,
+            )
+            for emb in query_embeddings
+        ],
+    )
+    return [[_normalize_result_item(p) for p in points] for points in batches]
+
+
 def _normalize_result_item(item):
     # keep your existing normalization logic (same as before)
     try:
@@ -390,10 +454,7 @@ def set_document_deleted(document_id: str, deleted: bool = True, project_id: str
             try:
                 url = QDRANT_URL.rstrip("/") + f"/collections/{COLLECTION}/points/payload"
                 body = {"payload": payload, "points": [{"id": pid} for pid in batch]}
-                headers = {"Content-Type": "application/json"}
-                if QDRANT_API_KEY:
-                    headers["api-key"] = QDRANT_API_KEY
-                r = requests.put(url, json=body, headers=headers, timeout=30)
+                r = rest_session(QDRANT_API_KEY).put(url, json=body, timeout=30)
                 r.raise_for_status()
                 updated = True
             except Exception:
@@ -402,15 +463,100 @@ def set_document_deleted(document_id: str, deleted: bool = True, project_id: str
 
     return True
 
-def search_vectors(query_embedding, top_k=100, project_id=None):
+def set_project_deleted(project_id: str, deleted: bool = True):
+    """
+    Flag every point of a project at once (a filtered set_payload), for project
+    deletes; per-document flags go through set_document_deleted.
+    """
+    selector = rest.Filter(must=[rest.FieldCondition(key="project_id", match=rest.MatchValue(value=str(project_id)))])
+    try:
+        client().set_payload(collection_name=COLLECTION, payload={"is_deleted": bool(deleted)}, points=selector)
+    except Exception:
+        # search never crosses projects, so the flags are a second line of defence here
+        logger.exception("could not flag qdrant points of project %s as deleted", project_id)
+        return False
+    return True
+
+
+def live_collection():
+    """
+    CollectionSpec (physical name + embedding model) currently behind the
+    QDRANT_COLLECTION_NAME alias. Embed the query with spec.model and pass
+    spec.name to search_vectors so both sides agree across an alias switch.
+    """
+    try:
+        return resolve_collection(client(), COLLECTION) or collection_spec(COLLECTION)
+    except Exception:
+        logger.exception("could not resolve qdrant alias %s; using it as a collection name", COLLECTION)
+        return collection_spec(COLLECTION)
+
+
+def _search_params(oversampling=None, rescore=None):
+    """
+    Qdrant search "params" for quantized collections, falling back to
+    QDRANT_SEARCH_OVERSAMPLING / QDRANT_SEARCH_RESCORE; None when neither is set.
+    """
+    if oversampling is None and QDRANT_SEARCH_OVERSAMPLING:
+        oversampling = float(QDRANT_SEARCH_OVERSAMPLING)
+    if rescore is None and QDRANT_SEARCH_RESCORE:
+        rescore = QDRANT_SEARCH_RESCORE == "1"
+    quantization = {}
+    if oversampling is not None:
+        quantization["oversampling"] = float(oversampling)
+    if rescore is not None:
+        quantization["rescore"] = bool(rescore)
+    return {"quantization": quantization} if quantization else None
+
+
+def search_vectors(query_embedding, top_k=100, project_id=None, hydrate=True, collection=None,
+                   oversampling=None, rescore=None):
     """
     Robust search that enforces exclusion of is_deleted points.
-    Returns list of dicts {id, score, payload}.
+    Returns list of dicts {id, score, payload}; with hydrate=True payload["text"]
+    is filled from DocumentChunk in one bulk fetch (points no longer store text).
+    collection defaults to the QDRANT_COLLECTION_NAME alias (see live_collection).
+    oversampling/rescore tune search on a quantized collection (see _search_params).
     Raises ValueError if project_id is missing (keep current strictness) or if embedding empty.
     """
     if not project_id:
         raise ValueError("project_id is required for search_vectors() — refusing cross-project search.")
 
     qfilter = _build_filter(project_id)
+    params = _search_params(oversampling, rescore)
+
+    if QDRANT_PREFER_GRPC:
+        results = _search_via_client(query_embedding, top_k, qfilter, collection=collection, params=params)
+    else:
+        results = _search_via_rest(query_embedding, top_k, qfilter, collection=collection, params=params)
+    if hydrate:
+        from .hydration import hydrate_results
+        hydrate_results(results)
+    return results
 
-    return _search_via_rest(query_embedding, top_k, qfilter)
\ No newline at end of file
+
+def search_vectors_batch(query_embeddings, top_k=100, project_id=None, hydrate=True, collection=None,
+                         oversampling=None, rescore=None):
+    """
+    search_vectors for several query vectors in a single Qdrant round trip
+    (points/search/batch), all with the same project filter. Returns one result
+    list per embedding, in input order — the shape reciprocal_rank_fusion takes.
+    Hydration is one chunk-text fetch across every list. oversampling/rescore as in search_vectors.
+    """
+    if not project_id:
+        raise ValueError("project_id is required for search_vectors_batch() — refusing cross-project search.")
+    query_embeddings = list(query_embeddings)
+    if not query_embeddings:
+        return []
+
+    qfilter = _build_filter(project_id)
+    params = _search_params(oversampling, rescore)
+
+    if QDRANT_PREFER_GRPC:
+        results = _search_batch_via_client(query_embeddings, top_k, qfilter, collection=collection, params=params)
+    else:
+        results = _search_batch_via_rest(query_embeddings, top_k, qfilter, collection=collection, params=params)
+    if hydrate:
+        from .hydration import hydrate_results
+        # the lists hold the same dicts, so hydrating the flattened view fills them all
+        hydrate_results([r for per_query in results for r in per_query])
+    return results
@@ -1,6 +1,7 @@
 # backend/documents/rag_service.py
 from .gemini_client import gemini_embed_batch, call_gemini_chat
-from .qdrant_search import search_vectors
+from .qdrant_search import live_collection, search_vectors_batch
+from .hydration import hydrate_results
 from documents.models import DocumentChunk, Document
 from django.db import transaction
 import textwrap
@@ -19,6 +20,8 @@ PROMPT_EXPANSION = (
 )
 
 def build_context_snippets(retrieved):
+    # no-op for results search_vectors already hydrated
+    hydrate_results(retrieved)
     parts = []
     for idx, r in enumerate(retrieved, start=1):
         p = r.get("payload", {}) or {}
@@ -200,19 +203,18 @@ def answer_query(conversation, user_text, top_k=10, temperature=0.0, max_output_
     print("Expanded Queries:", expanded_queries)
     
     # 2) Parallel Embedding
-    all_embeddings = gemini_embed_batch(expanded_queries)
+    # with the model of the collection we are about to search (they change together on a rebuild)
+    collection = live_collection()
+    all_embeddings = gemini_embed_batch(expanded_queries, model=collection.model, dim=collection.dim)
     
-    all_retrieved_results = []
-    
-    # 3) Parallel Retrieval (using the existing search_vectors)
-    for query_emb in all_embeddings:
-        # Note: We retrieve a large number of results for RRF to work well
-        retrieved_for_query = search_vectors(
-            query_emb, 
-            top_k=int(top_k * 2.5), # Retrieve more results than the final top_k
-            project_id=conversation.project_id
-        )
-        all_retrieved_results.append(retrieved_for_query)
+    # 3) Retrieval: every expanded query in one batch request to Qdrant
+    # Note: We retrieve a large number of results for RRF to work well
+    all_retrieved_results = search_vectors_batch(
+        all_embeddings,
+        top_k=int(top_k * 2.5), # Retrieve more results than the final top_k
+        project_id=conversation.project_id,
+        collection=collection.name,
+    )
         
     # 4) Reciprocal Rank Fusion (RRF)
     # The RRF function will deduplicate and re-rank the results.
@@ -0,0 +1,22 @@
+# backend/documents/redis_client.py
+import os
+import logging
+import redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL") or getattr(settings, "CELERY_BROKER_URL", "redis://127.0.0.1:6379/0")
+
+_client = None
+
+
+def get_redis():
+    """
+    Process-wide Redis client (the Celery broker instance unless REDIS_URL is set).
+    Connections are pooled by redis-py, so callers should not close it.
+    """
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(REDIS_URL, socket_timeout=5, socket_connect_timeout=5)
+    return _client
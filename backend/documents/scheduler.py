@@ -0,0 +1,257 @@
+# backend/documents/scheduler.py
+import os
+import json
+import time
+import uuid
+import logging
+
+from celery import current_app
+
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# ingest jobs handed to Celery at once; the rest wait here, queued per project
+INGEST_MAX_INFLIGHT = int(os.getenv("INGEST_MAX_INFLIGHT", 4))
+# extra slots only the priority lane may use, so small uploads never wait behind a full house
+INGEST_PRIORITY_RESERVE = int(os.getenv("INGEST_PRIORITY_RESERVE", 1))
+# interactive uploads up to this size go to the priority lane
+INGEST_PRIORITY_MAX_BYTES = int(os.getenv("INGEST_PRIORITY_MAX_BYTES", 5 * 1024 * 1024))
+# admission control: reject new uploads (429) past these queued-job counts
+INGEST_MAX_BACKLOG = int(os.getenv("INGEST_MAX_BACKLOG", 10000))
+INGEST_MAX_PROJECT_BACKLOG = int(os.getenv("INGEST_MAX_PROJECT_BACKLOG", 2000))
+# a dispatched job that never reports back (hard time limit, dead worker) frees its slot
+# after this. Unset: Celery's task_time_limit plus INGEST_LEASE_GRACE, renewed each time
+# the task (or a retry of it) starts, since no attempt can run longer than the limit
+INGEST_LEASE_TTL = int(os.getenv("INGEST_LEASE_TTL", 0))
+INGEST_LEASE_GRACE = int(os.getenv("INGEST_LEASE_GRACE", 120))
+
+PRIORITY, NORMAL = "priority", "normal"
+# Celery queues per lane; page-range subtasks of fanned-out documents use "ingest_bulk" (see celery.py)
+LANE_QUEUES = {PRIORITY: "ingest_priority", NORMAL: "celery"}
+
+KEY_PREFIX = "askyourdocs:ingest:sched"
+
+# KEYS: project queue, round-robin list ; ARGV: job, project
+_ENQUEUE_LUA = """
+local n = redis.call('RPUSH', KEYS[1], ARGV[1])
+if n == 1 then
+  redis.call('LREM', KEYS[2], 0, ARGV[2])
+  redis.call('RPUSH', KEYS[2], ARGV[2])
+end
+return n
+"""
+
+# KEYS: priority list, round-robin list, leases ; ARGV: now, ttl, max, reserve, queue prefix
+# a project is in the round-robin list iff its queue is non-empty
+_NEXT_LUA = """
+local now = tonumber(ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', now)
+local inflight = redis.call('ZCARD', KEYS[3])
+local max = tonumber(ARGV[3])
+local job = false
+if inflight < max + tonumber(ARGV[4]) then
+  job = redis.call('LPOP', KEYS[1])
+end
+if not job and inflight < max then
+  local n = redis.call('LLEN', KEYS[2])
+  for i = 1, n do
+    local project = redis.call('LPOP', KEYS[2])
+    if not project then break end
+    local q = ARGV[5] .. project
+    job = redis.call('LPOP', q)
+    if redis.call('LLEN', q) > 0 then
+      redis.call('RPUSH', KEYS[2], project)
+    end
+    if job then break end
+  end
+end
+if not job then return false end
+local id = cjson.decode(job)['id']
+redis.call('ZADD', KEYS[3], now + tonumber(ARGV[2]), id)
+return job
+"""
+
+
+def lease_ttl() -> int:
+    if INGEST_LEASE_TTL > 0:
+        return INGEST_LEASE_TTL
+    return int(current_app.conf.task_time_limit or 3600) + INGEST_LEASE_GRACE
+
+
+class Backpressure(Exception):
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class IngestScheduler:
+    """
+    Fair queueing in front of the Celery ingest tasks.
+
+    Jobs wait in Redis, one list per project; dispatch() hands them to Celery
+    round-robin across projects (plus a priority lane for small interactive
+    uploads, served first) while keeping at most INGEST_MAX_INFLIGHT in
+    Celery. A project with 5,000 queued files therefore gets one turn per
+    round like a project with one. Slots are leases in a sorted set, freed by
+    release() when the task finishes or fails, or by expiry if it never
+    reports back; dispatch_ingest_task (beat) picks up expired slots.
+    """
+
+    def __init__(self, r=None, prefix: str = KEY_PREFIX):
+        self.r = r or get_redis()
+        self.k_priority = f"{prefix}:priority"
+        self.k_rr = f"{prefix}:projects"
+        self.k_leases = f"{prefix}:leases"
+        self.k_avg = f"{prefix}:avg_seconds"
+        self.k_started = f"{prefix}:started"
+        self.queue_prefix = f"{prefix}:q:"
+        self._enqueue = self.r.register_script(_ENQUEUE_LUA)
+        self._next = self.r.register_script(_NEXT_LUA)
+
+    # --- admission -------------------------------------------------------
+
+    def backlog(self, project_id=None) -> dict:
+        projects = [p.decode() for p in self.r.lrange(self.k_rr, 0, -1)]
+        pipe = self.r.pipeline(transaction=False)
+        for p in projects:
+            pipe.llen(self.queue_prefix + p)
+        per_project = dict(zip(projects, pipe.execute()))
+        return {
+            "priority": self.r.llen(self.k_priority),
+            "queued": sum(per_project.values()),
+            "inflight": self.r.zcount(self.k_leases, time.time(), "+inf"),
+            "projects": per_project,
+        }
+
+    def avg_job_seconds(self) -> float:
+        val = self.r.get(self.k_avg)
+        return float(val) if val is not None else 60.0
+
+    def estimate_wait(self, project_id, lane: str = NORMAL, backlog: dict | None = None) -> int:
+        """
+        Rough seconds until a new job for project_id would start: jobs ahead of
+        it in its lane (one per active project per round for the normal lane),
+        divided across the dispatch slots.
+        """
+        b = backlog or self.backlog()
+        if lane == PRIORITY:
+            ahead = b["priority"]
+            slots = INGEST_MAX_INFLIGHT + INGEST_PRIORITY_RESERVE
+        else:
+            own = b["projects"].get(str(project_id), 0)
+            rounds = own + 1
+            # each round serves every project that still has work
+            ahead = b["priority"] + sum(min(n, rounds) for p, n in b["projects"].items() if p != str(project_id)) + own
+            slots = INGEST_MAX_INFLIGHT
+        return int(ahead * self.avg_job_seconds() / max(1, slots))
+
+    def admit(self, project_id, count: int = 1, lane: str = NORMAL) -> int:
+        """
+        Raise Backpressure if accepting count more jobs would pass the backlog
+        limits; otherwise return the estimated wait in seconds.
+        """
+        b = self.backlog()
+        own = b["projects"].get(str(project_id), 0)
+        total = b["queued"] + b["priority"]
+        if total + count > INGEST_MAX_BACKLOG or own + count > INGEST_MAX_PROJECT_BACKLOG:
+            retry_after = max(30, self.estimate_wait(project_id, lane, b))
+            raise Backpressure(
+                f"ingestion backlog is full ({total} queued, {own} for this project)", retry_after
+            )
+        return self.estimate_wait(project_id, lane, b)
+
+    # --- dispatch --------------------------------------------------------
+
+    def submit(self, task_name: str, project_id, args=(), kwargs=None, lane: str = NORMAL) -> str:
+        job = {
+            "id": str(uuid.uuid4()),
+            "task": task_name,
+            "args": list(args),
+            "kwargs": kwargs or {},
+            "project": str(project_id),
+            "lane": lane,
+            "enqueued_at": time.time(),
+        }
+        data = json.dumps(job)
+        if lane == PRIORITY:
+            self.r.rpush(self.k_priority, data)
+        else:
+            self._enqueue(keys=[self.queue_prefix + job["project"], self.k_rr], args=[data, job["project"]])
+        self.dispatch()
+        return job["id"]
+
+    def dispatch(self) -> int:
+        """
+        Move jobs to Celery while slots are free. Safe to call from anywhere,
+        any number of times; picking a job is one atomic script.
+        """
+        sent = 0
+        while True:
+            data = self._next(
+                keys=[self.k_priority, self.k_rr, self.k_leases],
+                args=[time.time(), lease_ttl(), INGEST_MAX_INFLIGHT, INGEST_PRIORITY_RESERVE, self.queue_prefix],
+            )
+            if not data:
+                return sent
+            job = json.loads(data)
+            try:
+                current_app.send_task(
+                    job["task"], args=job["args"], kwargs=job["kwargs"],
+                    task_id=job["id"], queue=LANE_QUEUES[job["lane"]],
+                )
+            except Exception:
+                # put it back at the front of its lane and give the slot back
+                logger.exception("failed to dispatch ingest job %s", job["id"])
+                self.r.zrem(self.k_leases, job["id"])
+                if job["lane"] == PRIORITY:
+                    self.r.lpush(self.k_priority, data)
+                elif self.r.lpush(self.queue_prefix + job["project"], data) == 1:
+                    self.r.rpush(self.k_rr, job["project"])
+                raise
+            self.r.hset(self.k_started, job["id"], time.time())
+            sent += 1
+
+    def renew(self, job_id: str, seconds: int | None = None):
+        """
+        Push a running job's lease out to now + seconds (default lease_ttl()).
+        Only existing leases are touched, so a late renew can't resurrect one.
+        """
+        if job_id:
+            self.r.zadd(self.k_leases, {job_id: time.time() + (seconds or lease_ttl())}, xx=True)
+
+    def release(self, job_id: str):
+        """
+        A dispatched job finished (for good, not a retry): free its slot,
+        update the average job time and dispatch the next job.
+        """
+        if not job_id:
+            return
+        freed = self.r.zrem(self.k_leases, job_id)
+        started = self.r.hget(self.k_started, job_id)
+        self.r.hdel(self.k_started, job_id)
+        if freed and started is not None:
+            seconds = time.time() - float(started)
+            avg = self.avg_job_seconds()
+            self.r.set(self.k_avg, 0.8 * avg + 0.2 * seconds)
+        if freed:
+            self.dispatch()
+
+    def stats(self) -> dict:
+        b = self.backlog()
+        return {
+            **b,
+            "max_inflight": INGEST_MAX_INFLIGHT,
+            "priority_reserve": INGEST_PRIORITY_RESERVE,
+            "avg_job_seconds": round(self.avg_job_seconds(), 1),
+        }
+
+
+_scheduler = None
+
+
+def get_scheduler() -> IngestScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = IngestScheduler()
+    return _scheduler
@@ -4,6 +4,10 @@ from .models import Document
 class UploadSerializer(serializers.Serializer):
     file = serializers.FileField()
 
+class BatchUploadSerializer(serializers.Serializer):
+    files = serializers.ListField(child=serializers.FileField(), required=False)
+    archive = serializers.FileField(required=False)
+
 class DocumentListSerializer(serializers.ModelSerializer):
     class Meta:
         model = Document
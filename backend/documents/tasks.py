@@ -1,113 +1,397 @@
 # backend/documents/tasks.py
-from celery import shared_task
+from celery import shared_task, chord
+from celery.signals import task_failure, task_postrun, task_prerun, worker_process_init
 from django.conf import settings
-from .models import Document, DocumentChunk
-from .utils import extract_text_from_pdf, chunk_text, sha256_text
+from .models import Document, IngestBatch
 import os
-from .qdrant_client import QdrantClientWrapper
-from .gemini_client import gemini_embed_batch
+import time
+import logging
+from .qdrant_client import QdrantClientWrapper, collection_spec, reset_transport
+from .ingest_pipeline import (IngestPipeline, DocumentGroupPipeline, plan_page_ranges, ingest_config, range_key,
+                              collapse_range_duplicates)
+from .ingest_clone import find_clone_source, clone_document, CloneUnavailable
+from .text_cache import text_profile
+from .scheduler import get_scheduler, lease_ttl, PRIORITY, NORMAL, INGEST_PRIORITY_MAX_BYTES
+from . import progress
+from .progress import ProgressReporter
+
+logger = logging.getLogger(__name__)
 
-BATCH_SIZE = int(os.getenv("EMBED_BATCH", 64))
 EMBED_DIM = int(os.getenv("EMBED_DIM", 768))
 QDRANT_COLL = os.getenv("QDRANT_COLLECTION_NAME", "documents")
+# bulk uploads: documents up to this many pages are ingested in groups that share embedding batches
+GROUP_MAX_DOC_PAGES = int(os.getenv("INGEST_GROUP_MAX_DOC_PAGES", 20))
+# pages per group task
+GROUP_TARGET_PAGES = int(os.getenv("INGEST_GROUP_TARGET_PAGES", 200))
+
+
+def _set_status(doc, status: str):
+    doc.status = status
+    doc.save(update_fields=["status"])
+    progress.set_status(doc.id, doc.project_id, status)
+
+
+def _mark_done(doc, embed_model: str, embed_dim: int, **extra_metadata):
+    doc.status = "done"
+    progress.set_status(doc.id, doc.project_id, "done")
+    snapshot = progress.read(doc.id)
+    if snapshot:
+        doc.metadata["progress"] = snapshot
+    doc.metadata.pop("ingest_checkpoints", None)
+    # lets later uploads of the same bytes clone these chunks (ingest_clone.py)
+    doc.metadata["ingest_config"] = ingest_config(embed_model, embed_dim)
+    doc.metadata.pop("cloned_from", None)
+    doc.metadata.update(extra_metadata)
+    doc.save(update_fields=["status", "metadata"])
+
+
+def schedule_ingest(doc, incremental: bool = False, interactive: bool = False) -> str:
+    """
+    Queue a document for ingestion through the fair scheduler (see scheduler.py)
+    instead of calling ingest_document_task.delay directly. Small interactive
+    uploads take the priority lane.
+    """
+    lane = PRIORITY if interactive and (doc.size or 0) <= INGEST_PRIORITY_MAX_BYTES else NORMAL
+    progress.set_status(doc.id, doc.project_id, "queued")
+    return get_scheduler().submit(
+        ingest_document_task.name, doc.project_id,
+        args=[str(doc.id)], kwargs={"incremental": True} if incremental else {}, lane=lane,
+    )
+
 
 @shared_task(bind=True, max_retries=3, default_retry_delay=10)
-def ingest_document_task(self, doc_id: str):
+def ingest_document_task(self, doc_id: str, incremental: bool = False):
     """
     Full ingestion:
     - read Document.metadata.path (relative to MEDIA_ROOT)
-    - extract text pages
-    - chunk text
-    - create DocumentChunk rows (idempotent by chunk_hash)
-    - batch embed chunks, upsert to Qdrant
+    - small documents: stream pages through extract -> chunk -> embed -> upsert here (see IngestPipeline)
+    - large documents: fan out page ranges to ingest_page_range_task, finalize_ingest_task sets status
+    - checkpoint committed pages in metadata["ingest_checkpoints"]; a retry resumes there
+    - incremental=True (new version upload): diff chunk hashes against the existing
+      rows, embed only new chunks, soft-delete removed ones; always single-task
+    - same file already ingested elsewhere (any project, same config): clone its
+      chunks and points instead of extracting and embedding
     """
     try:
         doc = Document.objects.get(id=doc_id)
-        doc.status = "ingesting"
-        doc.save(update_fields=["status"])
+        _set_status(doc, "ingesting")
 
         path = doc.metadata.get("path")
         if not path:
-            doc.status = "error"
-            doc.save(update_fields=["status"])
+            _set_status(doc, "error")
             return {"error": "no path in metadata"}
 
         if not getattr(doc, "project", None):
             # mark error and bail out - we require project for ingestion
-            doc.status = "error"
-            doc.save(update_fields=["status"])
+            _set_status(doc, "error")
             return {"error": "document has no project; cannot ingest without project"}
-    
+
         # resolve storage path; default_storage saved path relative to MEDIA_ROOT
         full_path = os.path.join(settings.MEDIA_ROOT, path)
 
-        # extract
-        pages = extract_text_from_pdf(full_path)  # list of (page_no, text)
         qclient = QdrantClientWrapper()
+        source = None if incremental else find_clone_source(doc, qclient)
+        if source is not None:
+            try:
+                result = clone_document(source, doc, qclient)
+                _mark_done(doc, qclient.embed_model, qclient.embed_dim, cloned_from=str(source.id))
+                return {"status": "ok", **result}
+            except CloneUnavailable as exc:
+                logger.warning("ingest %s: clone from %s unavailable (%s); ingesting normally", doc_id, source.id, exc)
 
-        to_upsert_ids, to_upsert_vectors, to_upsert_payloads = [], [], []
-        created_chunks = []
-
-        for page_no, page_text in pages:
-            chunks = chunk_text(page_text, chunk_tokens=int(os.getenv("CHUNK_TOKENS", 600)),
-                                overlap=int(os.getenv("CHUNK_OVERLAP", 80)))
-            for idx, chunk in enumerate(chunks):
-                chunk_hash = sha256_text(chunk)
-                # idempotency: check if chunk exists
-                # exists = DocumentChunk.objects.filter(chunk_hash=chunk_hash).first()
-                # if exists:
-                #     continue
-                # create DB row
-                chunk_obj = DocumentChunk.objects.create(
-                    document=doc,
-                    text=chunk,
-                    project=doc.project,   # new
-                    page=page_no,
-                    chunk_index=idx,
-                    token_count=len(chunk.split()),
-                    chunk_hash=chunk_hash
-                )
-                created_chunks.append(chunk_obj)
-
-                # prepare payload & id for qdrant
-                point_id = str(chunk_obj.id)
-                # payload: keep doc id, page, chunk_index and short snippet
-                payload = {
-                    "document_id": str(doc.id),
-                    "chunk_id": point_id,   
-                    "project_id": str(doc.project.id) if doc.project else None,
-                    "page": page_no,
-                    "chunk_index": idx,
-                    "text": chunk,                    # full chunk text
-                    "chunk_text": chunk,              # alias some code might expect
-                    "text_snippet": chunk[:800],       # short preview for quick embeds / UI
-                    "is_deleted": False
-                }
-                to_upsert_ids.append(point_id)
-                # we'll fill vectors in batches below
-                to_upsert_payloads.append(payload)
-
-                # batch when enough
-                if len(to_upsert_ids) >= BATCH_SIZE:
-                    texts = [p["text_snippet"] for p in to_upsert_payloads]
-                    vectors = gemini_embed_batch(texts)
-                    qclient.upsert_vectors(to_upsert_ids, vectors, to_upsert_payloads)
-                    to_upsert_ids, to_upsert_vectors, to_upsert_payloads = [], [], []
-
-        # remaining
-        if to_upsert_ids:
-            texts = [p["text_snippet"] for p in to_upsert_payloads]
-            vectors = gemini_embed_batch(texts)
-            qclient.upsert_vectors(to_upsert_ids, vectors, to_upsert_payloads)
-
-        doc.status = "done"
-        doc.save(update_fields=["status"])
-        return {"status": "ok", "created_chunks": len(created_chunks)}
+        page_count, avg_chars = text_profile(full_path, doc.sha256)
+        progress.start(doc.id, doc.project_id, page_count)
+        ranges = plan_page_ranges(page_count, avg_chars)
+        if len(ranges) > 1 and not incremental:
+            header = [ingest_page_range_task.s(doc_id, start, end) for start, end in ranges]
+            # the scheduler slot stays taken until the finalizer / errback releases it
+            job_id = self.request.id
+            # each range is bounded by the time limit too; worst case they run one after another
+            get_scheduler().renew(job_id, lease_ttl() * len(ranges))
+            body = finalize_ingest_task.s(doc_id, job_id).on_error(mark_ingest_failed_task.si(doc_id, job_id))
+            chord(header)(body)
+            logger.info("ingest %s: %d pages fanned out as %d ranges", doc_id, page_count, len(ranges))
+            return {"status": "fanned_out", "pages": page_count, "ranges": len(ranges)}
+
+        # extract -> chunk -> embed -> upsert, streamed through bounded queues
+        reporter = ProgressReporter(doc.id, doc.project_id, part=range_key(1, page_count))
+        result = IngestPipeline(doc, full_path, qclient, start_page=1, end_page=page_count,
+                                incremental=incremental, progress=reporter).run()
+
+        _mark_done(doc, qclient.embed_model, qclient.embed_dim)
+        return {"status": "ok", **result}
     except Exception as exc:
         # update doc status and bubble error
         try:
-            doc.status = "error"
-            doc.save(update_fields=["status"])
+            _set_status(doc, "error")
         except Exception:
             pass
-        raise self.retry(exc=exc)
+        # retries resume from the last checkpoint, so back off rather than hammer
+        raise self.retry(exc=exc, countdown=10 * 2 ** self.request.retries)
+
+
+@shared_task(bind=True, max_retries=5, default_retry_delay=10)
+def ingest_page_range_task(self, doc_id: str, start_page: int, end_page: int):
+    """
+    Ingest pages start_page..end_page (inclusive) of one document.
+    Leaves Document.status alone; the chord's finalizer / errback owns it.
+    """
+    try:
+        doc = Document.objects.get(id=doc_id)
+        full_path = os.path.join(settings.MEDIA_ROOT, doc.metadata["path"])
+        qclient = QdrantClientWrapper()
+        reporter = ProgressReporter(doc.id, doc.project_id, part=range_key(start_page, end_page))
+        result = IngestPipeline(doc, full_path, qclient, start_page=start_page, end_page=end_page,
+                                progress=reporter).run()
+        # the finalizer records the model of the collection the vectors went to
+        return {**result, "collection": qclient.collection}
+    except Document.DoesNotExist:
+        return {"error": "document not found", "created_chunks": 0}
+    except Exception as exc:
+        raise self.retry(exc=exc, countdown=10 * 2 ** self.request.retries)
+
+
+@shared_task
+def finalize_ingest_task(results, doc_id: str, job_id: str | None = None):
+    """
+    Chord callback: aggregate page-range results, dedupe across the ranges
+    and mark the document done.
+    """
+    get_scheduler().release(job_id)
+    doc = Document.objects.get(id=doc_id)
+    stages = {}
+    for r in results:
+        for name, st in (r.get("stages") or {}).items():
+            agg = stages.setdefault(name, {"items": 0, "seconds": 0.0})
+            agg["items"] += st.get("items") or 0
+            agg["seconds"] += st.get("seconds") or 0.0
+    collapsed = 0
+    try:
+        collapsed = collapse_range_duplicates(doc, QdrantClientWrapper())
+    except Exception:
+        # only costs the extra points; the document is complete either way
+        logger.exception("ingest %s: cross-range dedupe failed", doc_id)
+    collections = sorted({r["collection"] for r in results if r.get("collection")})
+    if len(collections) > 1:
+        logger.warning("ingest %s: ranges went to %s (alias switched mid-ingest)", doc_id, collections)
+    if collections:
+        spec = collection_spec(collections[-1])
+        _mark_done(doc, spec.model, spec.dim)
+    else:
+        qclient = QdrantClientWrapper()
+        _mark_done(doc, qclient.embed_model, qclient.embed_dim)
+    return {
+        "status": "ok",
+        "ranges": len(results),
+        "created_chunks": sum(r.get("created_chunks") or 0 for r in results),
+        "cross_range_duplicates": collapsed,
+        "stages": stages,
+    }
+
+
+@shared_task
+def mark_ingest_failed_task(doc_id: str, job_id: str | None = None):
+    """
+    Chord errback: a page range exhausted its retries. Checkpoints are kept so
+    re-queueing the document resumes the unfinished ranges.
+    """
+    Document.objects.filter(id=doc_id).update(status="error")
+    project_id = Document.objects.filter(id=doc_id).values_list("project_id", flat=True).first()
+    progress.set_status(doc_id, project_id, "error")
+    get_scheduler().release(job_id)
+
+
+@shared_task
+def ingest_batch_task(batch_id: str):
+    """
+    Schedule the documents of a bulk upload. Small documents are packed into
+    groups for ingest_document_group_task so they share embedding batches;
+    large ones and ones that can be cloned go through ingest_document_task.
+    """
+    docs = list(Document.objects.filter(batch_id=batch_id, status="queued", is_deleted=False)
+                .order_by("uploaded_at"))
+    # one query for the whole batch instead of find_clone_source per document
+    qclient = QdrantClientWrapper()
+    cloneable = set(
+        Document.objects.filter(
+            sha256__in={d.sha256 for d in docs}, status="done", is_deleted=False,
+            metadata__ingest_config=ingest_config(qclient.embed_model, qclient.embed_dim),
+        ).values_list("sha256", flat=True)
+    )
+
+    singles, groups, group, group_pages = [], [], [], 0
+    for doc in docs:
+        if doc.sha256 in cloneable:
+            singles.append(str(doc.id))
+            continue
+        try:
+            page_count, _ = text_profile(os.path.join(settings.MEDIA_ROOT, doc.metadata["path"]), doc.sha256)
+        except Exception:
+            # let the single-document task record the failure
+            singles.append(str(doc.id))
+            continue
+        if page_count > GROUP_MAX_DOC_PAGES:
+            singles.append(str(doc.id))
+            continue
+        group.append(str(doc.id))
+        group_pages += page_count
+        if group_pages >= GROUP_TARGET_PAGES:
+            groups.append(group)
+            group, group_pages = [], 0
+    if group:
+        groups.append(group)
+
+    batch = IngestBatch.objects.get(id=batch_id)
+    scheduler = get_scheduler()
+    for doc_id in singles:
+        scheduler.submit(ingest_document_task.name, batch.project_id, args=[doc_id])
+    for doc_ids in groups:
+        scheduler.submit(ingest_document_group_task.name, batch.project_id, args=[doc_ids])
+
+    schedule = {"single": len(singles), "groups": len(groups), "grouped": sum(len(g) for g in groups)}
+    batch.metadata["schedule"] = schedule
+    batch.save(update_fields=["metadata"])
+    logger.info("batch %s: %s", batch_id, schedule)
+    return schedule
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=10)
+def ingest_document_group_task(self, doc_ids: list[str]):
+    """
+    Ingest several small documents through one DocumentGroupPipeline. If the
+    group keeps failing, its documents are re-queued one by one so a single
+    bad file doesn't take the others down with it.
+    """
+    docs = list(Document.objects.filter(id__in=doc_ids, is_deleted=False).select_related("project"))
+    if not docs:
+        return {"status": "ok", "documents": {}}
+    ids = [d.id for d in docs]
+    Document.objects.filter(id__in=ids).update(status="ingesting")
+    try:
+        sources = [(d, os.path.join(settings.MEDIA_ROOT, d.metadata["path"])) for d in docs]
+        # per-document progress, same as a single-document ingest; page counts come from the text cache
+        reporters = {}
+        for d, path in sources:
+            progress.start(d.id, d.project_id, text_profile(path, d.sha256)[0])
+            reporters[str(d.id)] = ProgressReporter(d.id, d.project_id)
+        qclient = QdrantClientWrapper()
+        result = DocumentGroupPipeline(sources, qclient, progress=reporters).run()
+        for d in docs:
+            _mark_done(d, qclient.embed_model, qclient.embed_dim)
+        return {"status": "ok", **result}
+    except Exception as exc:
+        if self.request.retries >= self.max_retries:
+            logger.warning("group of %d failed %d times (%s); ingesting individually", len(ids), self.request.retries + 1, exc)
+            Document.objects.filter(id__in=ids).update(status="queued")
+            for d in docs:
+                schedule_ingest(d)
+            return {"status": "split", "documents": len(ids)}
+        Document.objects.filter(id__in=ids).update(status="error")
+        for d in docs:
+            progress.set_status(d.id, d.project_id, "error")
+        raise self.retry(exc=exc, countdown=10 * 2 ** self.request.retries)
+
+
+SCHEDULED_TASKS = {ingest_document_task.name, ingest_document_group_task.name}
+
+
+@task_postrun.connect
+def _release_ingest_slot(sender=None, task_id=None, state=None, retval=None, **kwargs):
+    """
+    Free the scheduler slot of a finished ingest job. Retries keep it; a
+    fanned-out document keeps it until finalize_ingest_task / mark_ingest_failed_task.
+    """
+    if sender is None or sender.name not in SCHEDULED_TASKS or state == "RETRY":
+        return
+    if isinstance(retval, dict) and retval.get("status") == "fanned_out":
+        return
+    try:
+        get_scheduler().release(task_id)
+    except Exception:
+        logger.exception("failed to release ingest slot for %s", task_id)
+
+
+@task_prerun.connect
+def _renew_ingest_slot(sender=None, task_id=None, **kwargs):
+    # every attempt (first run or retry) gets a full lease_ttl() before the slot can expire
+    if sender is None or sender.name not in SCHEDULED_TASKS:
+        return
+    try:
+        get_scheduler().renew(task_id)
+    except Exception:
+        logger.exception("failed to renew ingest slot for %s", task_id)
+
+
+@task_failure.connect
+def _release_failed_ingest_slot(sender=None, task_id=None, **kwargs):
+    """
+    Also sent by the worker's main process when the child running the task
+    died (WorkerLostError), where task_postrun never fires. Releasing twice is harmless.
+    """
+    if sender is None or sender.name not in SCHEDULED_TASKS:
+        return
+    try:
+        get_scheduler().release(task_id)
+    except Exception:
+        logger.exception("failed to release ingest slot for %s", task_id)
+
+
+@shared_task
+def dispatch_ingest_task():
+    """
+    Beat-driven dispatch: dispatch() otherwise only runs on a new upload or a
+    finished job, so slots freed by lease expiry would sit idle with work queued.
+    """
+    return get_scheduler().dispatch()
+
+
+@worker_process_init.connect
+def _init_vector_store(**kwargs):
+    """
+    Fresh Qdrant transport in each forked worker process, and the collection
+    bootstrap (alias lookup / first-time creation) done once here instead of
+    in the first task.
+    """
+    reset_transport()
+    try:
+        QdrantClientWrapper()
+    except Exception:
+        logger.exception("qdrant bootstrap at worker start failed; tasks will retry it")
+
+
+# the global task_time_limit (celery.py) also bounds these; they stop short of it and re-queue themselves
+REBUILD_TASK_SECONDS = int(os.getenv("COLLECTION_REBUILD_TASK_SECONDS", 480))
+
+
+@shared_task
+def rebuild_collection_task(build_id: int, replace_legacy: bool = False):
+    """
+    One slice of a collection build (see collection_rebuild.py); progress is
+    saved per batch, so the next slice (or a manual resume) carries on.
+    """
+    from .collection_rebuild import run_build
+    if not run_build(build_id, replace_legacy=replace_legacy, deadline=time.monotonic() + REBUILD_TASK_SECONDS):
+        rebuild_collection_task.apply_async(args=[build_id], kwargs={"replace_legacy": replace_legacy})
+
+
+@shared_task
+def reconcile_collection_task(build_id: int, resume: bool = False):
+    from .collection_rebuild import reconcile
+    if not reconcile(build_id, resume=resume, deadline=time.monotonic() + REBUILD_TASK_SECONDS):
+        reconcile_collection_task.apply_async(args=[build_id], kwargs={"resume": True})
+
+
+PURGE_TASK_SECONDS = int(os.getenv("PURGE_TASK_SECONDS", 480))
+
+
+@shared_task
+def purge_deleted_task():
+    """
+    Hard-delete documents and projects past their grace period (see purge.py);
+    runs on the beat schedule and re-queues itself until the backlog is done.
+    """
+    from .purge import run_purge
+    stats, finished = run_purge(deadline=time.monotonic() + PURGE_TASK_SECONDS)
+    if not finished:
+        purge_deleted_task.delay()
+    return stats.as_dict()
@@ -1,3 +1,518 @@
-from django.test import TestCase
+import hashlib
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+import uuid
+import zipfile
+from collections import deque
+from concurrent.futures import Future
+from types import SimpleNamespace
+from unittest import mock, skipIf
 
-# Create your tests here.
+try:
+    import fakeredis
+except ImportError:  # requirements.txt; only the Redis-backed tests need it
+    fakeredis = None
+
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as rest
+
+from projects.models import Project
+from . import collection_rebuild, gemini_client, purge, qdrant_client, scheduler, uploads, utils, views
+from .dedupe import NearDuplicateIndex, normalize_line, simhash, strip_boilerplate
+from .ingest_pipeline import IngestPipeline, range_key
+from .models import CollectionBuild, Document, DocumentChunk
+
+
+class SplitBatchesTests(SimpleTestCase):
+    def test_respects_item_limit(self):
+        texts = [f"t{i}" for i in range(7)]
+        with mock.patch.object(gemini_client, "EMBED_MAX_BATCH_ITEMS", 3):
+            batches = list(gemini_client._split_batches(texts))
+        self.assertEqual([start for start, _ in batches], [0, 3, 6])
+        self.assertEqual([t for _, batch in batches for t in batch], texts)
+
+    def test_respects_byte_limit(self):
+        # "é" is two bytes: the limit counts encoded bytes, not characters
+        texts = ["é" * 5, "a" * 10, "b" * 10, "c"]
+        with mock.patch.object(gemini_client, "EMBED_MAX_BATCH_BYTES", 20):
+            batches = list(gemini_client._split_batches(texts))
+        self.assertEqual(batches, [(0, ["é" * 5, "a" * 10]), (2, ["b" * 10, "c"])])
+
+    def test_oversized_text_gets_its_own_batch(self):
+        texts = ["a", "x" * 50, "b"]
+        with mock.patch.object(gemini_client, "EMBED_MAX_BATCH_BYTES", 10):
+            batches = list(gemini_client._split_batches(texts))
+        self.assertEqual(batches, [(0, ["a"]), (1, ["x" * 50]), (2, ["b"])])
+
+    def test_empty(self):
+        self.assertEqual(list(gemini_client._split_batches([])), [])
+
+
+class EmbedBatchTests(SimpleTestCase):
+    def setUp(self):
+        for name, value in (("API_KEY", "k"), ("EMBED_MAX_RETRIES", 2)):
+            patcher = mock.patch.object(gemini_client, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(gemini_client.time, "sleep")
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _response(self, vectors, status=200):
+        resp = mock.Mock(status_code=status)
+        resp.json.return_value = {"embeddings": [{"values": v} for v in vectors]}
+        return resp
+
+    def test_network_errors_are_retried(self):
+        with mock.patch.object(gemini_client.requests, "post", side_effect=[
+                gemini_client.requests.ConnectionError("reset"), gemini_client.requests.Timeout("slow"),
+                self._response([[1.0, 2.0]])]) as post:
+            self.assertEqual(gemini_client.gemini_embed_batch(["a"], dim=2), [[1.0, 2.0]])
+        self.assertEqual(post.call_count, 3)
+        self.assertEqual([c.args for c in self.sleep.call_args_list], [(1,), (2,)])
+
+    def test_network_errors_give_up_after_the_retries(self):
+        with mock.patch.object(gemini_client.requests, "post",
+                               side_effect=gemini_client.requests.ConnectionError("down")) as post:
+            with self.assertRaises(gemini_client.requests.ConnectionError):
+                gemini_client.gemini_embed_batch(["a"])
+        self.assertEqual(post.call_count, 3)
+
+    def test_every_vector_must_have_the_dimension(self):
+        with mock.patch.object(gemini_client.requests, "post", return_value=self._response([[1.0, 2.0], [1.0]])):
+            with self.assertRaises(RuntimeError):
+                gemini_client.gemini_embed_batch(["a", "b"], dim=2)
+            with self.assertRaises(RuntimeError):
+                gemini_client.gemini_embed_batch(["a", "b"])
+
+    def test_embedding_count_must_match_the_input(self):
+        with mock.patch.object(gemini_client.requests, "post", return_value=self._response([[1.0, 2.0]])):
+            with self.assertRaises(RuntimeError):
+                gemini_client.gemini_embed_batch(["a", "b"], dim=2)
+
+
+class MatchExistingTests(SimpleTestCase):
+    def setUp(self):
+        qclient = SimpleNamespace(embed_model="m", embed_dim=3)
+        self.pipeline = IngestPipeline(SimpleNamespace(id=uuid.uuid4(), metadata={}), "doc.pdf", qclient,
+                                       cache=mock.Mock(), incremental=True)
+        self.old = [uuid.uuid4() for _ in range(3)]
+        # chunk_hash -> rows (id, hash, page, chunk_index, is_deleted), as _load_existing builds them
+        self.pipeline._existing = {
+            "same": deque([(self.old[0], "same", 1, 0, False), (self.old[1], "same", 4, 2, False)]),
+            "gone": deque([(self.old[2], "gone", 2, 0, True)]),
+        }
+
+    def _rec(self, chunk_hash, page, chunk_index, duplicate_of=None):
+        return {"id": uuid.uuid4(), "chunk_hash": chunk_hash, "page": page,
+                "chunk_index": chunk_index, "duplicate_of": duplicate_of}
+
+    def test_unchanged_chunks_keep_their_rows(self):
+        first, new = self._rec("same", 1, 0), self._rec("new", 1, 1)
+        fresh = self.pipeline._match_existing([first, new])
+        self.assertEqual(fresh, [new])
+        self.assertEqual(self.pipeline._id_remap, {first["id"]: self.old[0]})
+        self.assertEqual(self.pipeline._moved, {})
+        self.assertEqual(self.pipeline.diff_stats["kept"], 1)
+
+    def test_repeated_text_matches_rows_in_order(self):
+        a, b, c = self._rec("same", 1, 0), self._rec("same", 3, 0), self._rec("same", 5, 0)
+        fresh = self.pipeline._match_existing([a, b, c])
+        self.assertEqual(fresh, [c])
+        self.assertEqual(self.pipeline._id_remap, {a["id"]: self.old[0], b["id"]: self.old[1]})
+        # the second row moved from page 4 to page 3
+        self.assertEqual(self.pipeline._moved, {self.old[1]: b})
+
+    def test_returning_chunk_is_revived(self):
+        rec = self._rec("gone", 2, 0)
+        self.assertEqual(self.pipeline._match_existing([rec]), [])
+        self.assertEqual(self.pipeline._moved, {self.old[2]: rec})
+
+    def test_near_duplicates_are_always_fresh(self):
+        rep = self._rec("same", 1, 0)
+        dup = self._rec("same", 1, 1, duplicate_of=rep["id"])
+        self.assertEqual(self.pipeline._match_existing([rep, dup]), [dup])
+        self.assertEqual(len(self.pipeline._existing["same"]), 1)
+
+
+class TokenChunksTests(SimpleTestCase):
+    def setUp(self):
+        # the built-in tokenizer, whatever CHUNK_TOKENIZER is set to
+        patcher = mock.patch.object(utils, "get_tokenizer", return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_builtin_tokenizer_splits_punctuation(self):
+        self.assertEqual(utils.count_tokens("Torque: 12 N·m (max)."), 10)
+
+    def test_windows_and_overlap_are_exact(self):
+        text = " ".join(f"w{i}" for i in range(1000))
+        chunks = utils.token_chunks(text, chunk_tokens=100, overlap=20, respect_boundaries=False)
+        self.assertEqual([c.token_count for c in chunks[:-1]], [100] * (len(chunks) - 1))
+        for a, b in zip(chunks, chunks[1:]):
+            self.assertEqual(utils.count_tokens(text[b.start_char:a.end_char]), 20)
+        self.assertTrue(chunks[-1].text.endswith("w999"))
+
+    def test_token_count_is_the_count_of_the_chunk_text(self):
+        lines = [f"Step {i}: inspect the valve-seat (part #{i}), then torque it." for i in range(300)]
+        text = "\n".join(lines[:100]) + "\n\n" + "\n".join(lines[100:])
+        chunks = utils.token_chunks(text, chunk_tokens=120, overlap=15)
+        self.assertGreater(len(chunks), 1)
+        for c in chunks:
+            self.assertEqual(c.text, text[c.start_char:c.end_char])
+            self.assertEqual(c.token_count, utils.count_tokens(c.text))
+            self.assertLessEqual(c.token_count, 120)
+
+    def test_prefers_paragraph_breaks(self):
+        para = " ".join(["word"] * 70) + "."
+        text = para + "\n\n" + para
+        first = utils.token_chunks(text, chunk_tokens=100, overlap=10)[0]
+        self.assertEqual(first.text, para)
+
+    def test_empty_text(self):
+        self.assertEqual(utils.token_chunks("  \n\n "), [])
+
+
+class StreamToTempTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.storage = FileSystemStorage(location=self.root)
+
+    def test_hashes_while_writing(self):
+        data = os.urandom(3 * 1024 + 7)
+        with mock.patch.object(uploads, "UPLOAD_CHUNK_SIZE", 1024):
+            stored = uploads.stream_to_temp(SimpleUploadedFile("a.pdf", data), self.storage)
+        self.assertEqual(stored.sha256, hashlib.sha256(data).hexdigest())
+        self.assertEqual(stored.size, len(data))
+        with self.storage.open(stored.tmp_path, "rb") as fh:
+            self.assertEqual(fh.read(), data)
+
+    def test_promote_reuses_identical_content(self):
+        first = uploads.stream_to_temp(SimpleUploadedFile("a.pdf", b"%PDF same"), self.storage)
+        second = uploads.stream_to_temp(SimpleUploadedFile("b.PDF", b"%PDF same"), self.storage)
+        path = uploads.promote(first, "a.pdf", self.storage)
+        self.assertEqual(uploads.promote(second, "b.pdf", self.storage), path)
+        self.assertEqual(path, uploads.content_path(first.sha256, "a.pdf"))
+        self.assertFalse(self.storage.exists(second.tmp_path))
+
+
+class StoreArchiveTests(SimpleTestCase):
+    MEMBERS = {"dir/a.pdf": b"%PDF a", "__MACOSX/dir/._a.pdf": b"x", "notes.txt": b"x",
+               "dir/.hidden.pdf": b"x", "B.PDF": b"%PDF b"}
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.storage = FileSystemStorage(location=self.root)
+
+    def _stored(self, name, data):
+        return [(n, s.sha256, s.size) for n, s in uploads.store_archive(SimpleUploadedFile(name, data), self.storage)]
+
+    def _expected(self):
+        return [(name, hashlib.sha256(data).hexdigest(), len(data))
+                for name, data in (("a.pdf", b"%PDF a"), ("B.PDF", b"%PDF b"))]
+
+    def test_zip_yields_only_ingestible_members(self):
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w") as zf:
+            for name, data in self.MEMBERS.items():
+                zf.writestr(name, data)
+        self.assertEqual(self._stored("set.zip", buf.getvalue()), self._expected())
+
+    def test_tar_is_read_as_a_stream(self):
+        buf = io.BytesIO()
+        with tarfile.open(fileobj=buf, mode="w:gz") as tf:
+            for name, data in self.MEMBERS.items():
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tf.addfile(info, io.BytesIO(data))
+        self.assertEqual(self._stored("set.tar.gz", buf.getvalue()), self._expected())
+
+    def test_oversized_members_are_skipped(self):
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w") as zf:
+            zf.writestr("big.pdf", b"x" * 100)
+            zf.writestr("small.pdf", b"x")
+        with mock.patch.object(uploads, "ARCHIVE_MAX_MEMBER_BYTES", 10):
+            self.assertEqual([n for n, _, _ in self._stored("set.zip", buf.getvalue())], ["small.pdf"])
+
+    def test_unreadable_archives_raise_upload_error(self):
+        with self.assertRaises(uploads.UploadError):
+            self._stored("broken.zip", b"not a zip")
+        with self.assertRaises(uploads.UploadError):
+            self._stored("set.rar", b"whatever")
+
+
+@skipIf(fakeredis is None, "fakeredis not installed")
+class IngestSchedulerTests(SimpleTestCase):
+    def setUp(self):
+        self.r = fakeredis.FakeRedis()
+        self.sched = scheduler.IngestScheduler(r=self.r, prefix="test")
+        self.sent = []
+        app = mock.Mock()
+        app.conf.task_time_limit = 600
+        app.send_task.side_effect = lambda name, **kw: self.sent.append(kw["task_id"])
+        for name, value in (("current_app", app), ("INGEST_MAX_INFLIGHT", 1), ("INGEST_PRIORITY_RESERVE", 1)):
+            patcher = mock.patch.object(scheduler, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_projects_take_turns(self):
+        big = [self.sched.submit("t", "big") for _ in range(4)]
+        small = self.sched.submit("t", "small")
+        self.assertEqual(self.sent, big[:1])
+        for _ in range(3):
+            self.sched.release(self.sent[-1])
+        # one job per project per round, not the whole backlog of "big" first
+        self.assertEqual(self.sent, [big[0], big[1], small, big[2]])
+
+    def test_priority_lane_uses_the_reserve(self):
+        normal = [self.sched.submit("t", "p") for _ in range(2)]
+        urgent = self.sched.submit("t", "p", lane=scheduler.PRIORITY)
+        self.assertEqual(self.sent, [normal[0], urgent])
+        self.sched.release(urgent)
+        # the reserve is for the priority lane only
+        self.assertEqual(self.sent, [normal[0], urgent])
+
+    def test_expired_lease_frees_its_slot(self):
+        first = self.sched.submit("t", "p")
+        second = self.sched.submit("t", "p")
+        self.assertEqual(self.sent, [first])
+        self.r.zadd(self.sched.k_leases, {first: 0})
+        self.assertEqual(self.sched.dispatch(), 1)
+        self.assertEqual(self.sent, [first, second])
+
+    def test_renew_never_creates_a_lease(self):
+        self.sched.renew("ghost", 100)
+        self.assertIsNone(self.r.zscore(self.sched.k_leases, "ghost"))
+
+    def test_release_is_idempotent(self):
+        first = self.sched.submit("t", "p")
+        second = self.sched.submit("t", "p")
+        third = self.sched.submit("t", "p")
+        self.sched.release(first)
+        self.sched.release(first)
+        self.assertEqual(self.sent, [first, second])
+        self.assertEqual(self.sched.backlog()["queued"], 1)
+        self.assertNotIn(third, self.sent)
+
+    def test_admit_applies_backpressure(self):
+        for _ in range(3):
+            self.sched.submit("t", "p")
+        with mock.patch.object(scheduler, "INGEST_MAX_PROJECT_BACKLOG", 3):
+            self.assertGreaterEqual(self.sched.admit("other"), 0)
+            with self.assertRaises(scheduler.Backpressure) as ctx:
+                self.sched.admit("p", count=2)
+        self.assertGreaterEqual(ctx.exception.retry_after, 30)
+
+
+class BoilerplateTests(SimpleTestCase):
+    def test_page_numbers_are_masked_in_short_lines_only(self):
+        self.assertEqual(normalize_line("  Page 3 of  120 "), "page # of #")
+        long_line = "Tighten bolt 4 to 12 Nm before you install the cover plate"
+        self.assertEqual(normalize_line(long_line), long_line.lower())
+
+    def test_strip_boilerplate(self):
+        boilerplate = frozenset({"acme corp confidential", "page # of #"})
+        text = "ACME Corp  Confidential\nReplace the valve.\nPage 7 of 90"
+        self.assertEqual(strip_boilerplate(text, boilerplate), ("Replace the valve.", 2))
+        self.assertEqual(strip_boilerplate("Replace the valve.", boilerplate), ("Replace the valve.", 0))
+        self.assertEqual(strip_boilerplate(text, frozenset()), (text, 0))
+
+
+class NearDuplicateIndexTests(SimpleTestCase):
+    TEXT = " ".join(f"word{i}" for i in range(40))
+
+    def test_simhash_needs_enough_shingles(self):
+        self.assertIsNone(simhash("too short to say anything"))
+        self.assertEqual(simhash(self.TEXT), simhash(self.TEXT.upper()))
+
+    def test_near_duplicates_map_to_the_first_seen(self):
+        index = NearDuplicateIndex(max_distance=3)
+        sig = simhash(self.TEXT)
+        self.assertIsNone(index.find_or_add(sig, "rep"))
+        # within max_distance bits, in any band
+        self.assertEqual(index.find_or_add(sig ^ 0b111, "a"), "rep")
+        self.assertEqual(index.find_or_add(sig ^ (1 << 63) ^ (1 << 20), "b"), "rep")
+        self.assertIsNone(index.find_or_add(sig ^ 0b1111, "far"))
+        self.assertEqual(index.find_or_add(sig ^ 0b1111, "again"), "far")
+
+
+class RunPurgeTests(TestCase):
+    def setUp(self):
+        for name, value in (("QdrantClientWrapper", mock.Mock()), ("_point_collections", lambda q: []),
+                            ("PURGE_MAX_CHUNKS_PER_SECOND", 0), ("PURGE_CHUNK_BATCH", 2)):
+            patcher = mock.patch.object(purge, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.project = Project.objects.create(name="p")
+        # purged oldest first: deleted[0], then deleted[1]
+        self.deleted = [self._doc(f"{i}" * 64, deleted_at=timezone.now() - timezone.timedelta(days=30 - i))
+                        for i in range(2)]
+        self.recent = self._doc("r" * 64, deleted_at=timezone.now())
+        self.live = self._doc("l" * 64)
+
+    def _doc(self, sha, deleted_at=None):
+        doc = Document.objects.create(filename=f"{sha[:4]}.pdf", sha256=sha, project=self.project,
+                                      is_deleted=deleted_at is not None, deleted_at=deleted_at)
+        rep = DocumentChunk.objects.create(document=doc, text="representative", chunk_hash="h")
+        for i in range(3):
+            DocumentChunk.objects.create(document=doc, text=f"chunk {i}", chunk_hash=f"h{i}", duplicate_of=rep)
+        return doc
+
+    def _remaining(self):
+        return set(Document.objects.values_list("id", flat=True))
+
+    def test_stops_at_the_deadline_and_resumes(self):
+        stats, done = purge.run_purge(deadline=time.monotonic() - 1)
+        self.assertFalse(done)
+        self.assertEqual(stats.documents, 0)
+        stats, done = purge.run_purge(deadline=time.monotonic() + 60)
+        self.assertTrue(done)
+        self.assertEqual(stats.documents, 2)
+        self.assertEqual(stats.chunks, 8)
+        self.assertEqual(self._remaining(), {self.recent.id, self.live.id})
+        self.assertFalse(DocumentChunk.objects.filter(document_id__in=[d.id for d in self.deleted]).exists())
+
+    def test_interrupted_document_is_finished_next_run(self):
+        with mock.patch.object(purge, "_delete_files", side_effect=[None, RuntimeError("storage down")]):
+            with self.assertRaises(RuntimeError):
+                purge.run_purge()
+        interrupted = Document.objects.get(id=self.deleted[1].id)
+        self.assertEqual(interrupted.status, purge.PURGING)
+        self.assertFalse(interrupted.chunks.exists())
+        # its vectors are gone: a re-upload must not revive it
+        with mock.patch.object(views, "set_document_deleted"):
+            self.assertFalse(views._restore(interrupted))
+        stats, done = purge.run_purge()
+        self.assertTrue(done)
+        self.assertEqual(stats.documents, 1)
+        self.assertEqual(self._remaining(), {self.recent.id, self.live.id})
+
+    def test_restored_document_is_kept(self):
+        with mock.patch.object(views, "set_document_deleted"):
+            self.assertTrue(views._restore(self.deleted[0]))
+        stats, _ = purge.run_purge()
+        self.assertEqual(stats.documents, 1)
+        self.assertIn(self.deleted[0].id, self._remaining())
+        self.assertEqual(self.deleted[0].chunks.count(), 4)
+
+    def test_project_goes_after_its_documents(self):
+        self.project.is_deleted = True
+        self.project.deleted_at = timezone.now() - timezone.timedelta(days=30)
+        self.project.save()
+        stats, _ = purge.run_purge()
+        # the recent and live documents were marked deleted with the project, but are still in their grace period
+        self.assertEqual(stats.projects, 0)
+        stats, _ = purge.run_purge(grace_days=0)
+        self.assertEqual(stats.projects, 1)
+        self.assertFalse(Project.objects.filter(id=self.project.id).exists())
+
+
+class _Executor:
+    max_workers = 2
+
+    def __init__(self):
+        self.calls = []
+
+    def submit(self, texts, model=None, dim=None):
+        self.calls.append(list(texts))
+        fut = Future()
+        fut.set_result([[0.1, 0.2, 0.3] for _ in texts])
+        return fut
+
+
+class PipelineDedupeTests(TestCase):
+    # long enough for a SimHash (16+ shingles), well under one chunk
+    TEXT = " ".join(f"word{i}" for i in range(60))
+
+    def setUp(self):
+        self.doc = Document.objects.create(filename="a.pdf", sha256="a" * 64)
+        self.qclient = SimpleNamespace(embed_model="m", embed_dim=3, upsert_vectors=mock.Mock(),
+                                       delete_points=mock.Mock())
+        self.executor = _Executor()
+        self.cache = mock.Mock()
+        self.cache.get_many.return_value = {}
+
+    def _run(self, pages):
+        pipeline = IngestPipeline(self.doc, "a.pdf", self.qclient, executor=self.executor, cache=self.cache)
+        with mock.patch.object(pipeline, "_iter_pages",
+                               lambda: ((self.doc, n, text) for n, text in pages if n > pipeline.resume_after)):
+            return pipeline.run()
+
+    def test_resumed_run_collapses_onto_committed_representatives(self):
+        self._run([(1, self.TEXT)])
+        rep = DocumentChunk.objects.get(document=self.doc)
+        self.doc.metadata = {"ingest_checkpoints": {range_key(1, ""): 1}}
+        self.doc.save()
+        self.executor.calls.clear()
+        result = self._run([(1, self.TEXT), (2, self.TEXT.replace("word59", "changed"))])
+        self.assertEqual(result["dedupe"]["near_duplicates"], 1)
+        self.assertEqual(self.executor.calls, [])
+        self.assertEqual(DocumentChunk.objects.get(document=self.doc, page=2).duplicate_of_id, rep.id)
+
+    def test_embed_counts_only_api_vectors(self):
+        cached, fresh = "Cached chunk text.", "Fresh chunk text."
+        self.cache.get_many.side_effect = lambda hashes: {
+            h: [0.0, 0.0, 1.0] for h in hashes if h == utils.sha256_text(cached)}
+        result = self._run([(1, cached), (2, fresh), (3, fresh)])
+        self.assertEqual(self.executor.calls, [[fresh]])
+        self.assertEqual(result["stages"]["embed"]["items"], 1)
+        self.assertEqual(result["embedding_cache"], {"hits": 1, "deduped": 1, "embedded": 1, "hit_rate": 0.667})
+
+
+class LegacyCollectionSwitchTests(TestCase):
+    ALIAS = "docs"
+
+    def setUp(self):
+        self.client = QdrantClient(location=":memory:")
+        for name, value in (("get_qdrant", lambda *a, **kw: self.client), ("_resolved", {})):
+            patcher = mock.patch.object(qdrant_client, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(collection_rebuild, "_schedule_reconcile")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for name in (self.ALIAS, "docs__m_3"):
+            self.client.create_collection(name, vectors_config=rest.VectorParams(size=3, distance=rest.Distance.COSINE))
+        self.build = CollectionBuild.objects.create(collection="docs__m_3", embed_model="m", embed_dim=3,
+                                                    status="ready")
+
+    def _resolve(self):
+        qdrant_client._resolved.clear()
+        spec = qdrant_client.resolve_collection(self.client, self.ALIAS)
+        return spec and spec.name
+
+    def test_refuses_without_replace_legacy(self):
+        q = qdrant_client.QdrantClientWrapper(collection=self.ALIAS)
+        with self.assertRaises(collection_rebuild.RebuildError):
+            collection_rebuild.switch(self.build, q)
+        self.assertEqual(self._resolve(), self.ALIAS)
+
+    def test_name_always_resolves_during_the_handover(self):
+        q = qdrant_client.QdrantClientWrapper(collection=self.ALIAS)
+        self.assertEqual(q.collection, self.ALIAS)
+        seen = []
+
+        def settle(seconds):
+            # searches already go to the build, while the legacy collection still exists
+            seen.append((self._resolve(), self.client.collection_exists(self.ALIAS)))
+
+        with mock.patch.object(qdrant_client.time, "sleep", side_effect=settle):
+            collection_rebuild.switch(self.build, q, replace_legacy=True)
+        self.assertEqual(seen, [("docs__m_3", True)])
+        self.assertEqual(qdrant_client.alias_target(self.client, self.ALIAS), "docs__m_3")
+        self.assertIsNone(qdrant_client.alias_target(self.client, qdrant_client.handover_alias(self.ALIAS)))
+        self.assertEqual(self._resolve(), "docs__m_3")
+        self.build.refresh_from_db()
+        self.assertEqual((self.build.status, self.build.previous_collection), ("live", ""))
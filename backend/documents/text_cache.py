@@ -0,0 +1,179 @@
+# backend/documents/text_cache.py
+import os
+import gzip
+import json
+import uuid
+import fcntl
+import shutil
+import logging
+from contextlib import contextmanager
+
+import fitz  # PyMuPDF
+from django.conf import settings
+
+from .utils import iter_pdf_pages, pdf_text_profile
+from .pdf_extract import iter_page_texts
+
+logger = logging.getLogger(__name__)
+
+TEXT_CACHE_ENABLED = os.getenv("TEXT_CACHE_ENABLED", "1") == "1"
+TEXT_CACHE_DIR = os.getenv("TEXT_CACHE_DIR") or os.path.join(settings.MEDIA_ROOT, "text_cache")
+# pages per cache file; page-range subtasks fill the blocks they touch
+TEXT_CACHE_BLOCK_PAGES = 64
+# bump when extraction output changes (PyMuPDF upgrade, different get_text options)
+EXTRACTOR_VERSION = f"pymupdf-{fitz.VersionBind}-text-1"
+
+
+def _dir(sha256: str) -> str:
+    return os.path.join(TEXT_CACHE_DIR, sha256[:2], sha256, EXTRACTOR_VERSION)
+
+
+def _block_path(sha256: str, block: int) -> str:
+    return os.path.join(_dir(sha256), f"{block:06d}.jsonl.gz")
+
+
+def _atomic_write(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(data)
+    os.replace(tmp, path)
+
+
+def _read_block(sha256: str, block: int) -> dict[int, str]:
+    try:
+        with gzip.open(_block_path(sha256, block), "rt", encoding="utf-8") as fh:
+            return {rec["p"]: rec["t"] for rec in map(json.loads, fh)}
+    except FileNotFoundError:
+        return {}
+    except Exception as exc:
+        logger.warning("text cache: unreadable block %s/%d, ignoring: %s", sha256, block, exc)
+        return {}
+
+
+def _write_block(sha256: str, block: int, pages: dict[int, str]):
+    lines = "".join(json.dumps({"p": p, "t": pages[p]}) + "\n" for p in sorted(pages))
+    try:
+        _atomic_write(_block_path(sha256, block), gzip.compress(lines.encode("utf-8"), compresslevel=6))
+    except OSError as exc:
+        logger.warning("text cache: could not write block %s/%d: %s", sha256, block, exc)
+
+
+@contextmanager
+def _block_lock(sha256: str, block: int):
+    # page-range subtasks of one file can fill the same block at once; without the
+    # lock each rewrites the block from what it read and the last writer drops pages
+    path = _block_path(sha256, block) + ".lock"
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def _merge_block(sha256: str, block: int, new_pages: dict[int, str]) -> dict[int, str]:
+    """
+    Add pages to a block: re-read under the block's lock, merge, rewrite atomically.
+    """
+    try:
+        with _block_lock(sha256, block):
+            pages = _read_block(sha256, block)
+            pages.update(new_pages)
+            _write_block(sha256, block, pages)
+            return pages
+    except OSError as exc:
+        logger.warning("text cache: could not lock block %s/%d: %s", sha256, block, exc)
+        return {**_read_block(sha256, block), **new_pages}
+
+
+def _fill(path: str, sha256: str, wanted_by_block: dict[int, list[int]]):
+    """
+    Yields (block, {page: text}) covering the wanted pages of each block, in
+    block order. Pages missing from the cache are extracted as one ordered
+    stream (so extraction processes stay busy across block boundaries) and
+    merged into their block, which is rewritten (see _merge_block); blocks may
+    be partial when a page-range subtask only covered part of them.
+    """
+    gaps = {}
+    for block, wanted in wanted_by_block.items():
+        cached = _read_block(sha256, block)
+        gaps[block] = [p for p in wanted if p not in cached]
+    extracted = iter_page_texts(path, [p for gap in gaps.values() for p in gap])
+    try:
+        for block in wanted_by_block:
+            # re-read instead of keeping every block from the first pass: one block in memory at a time
+            if gaps[block]:
+                new_pages = dict(next(extracted) for _ in gaps[block])
+                pages = _merge_block(sha256, block, new_pages)
+            else:
+                pages = _read_block(sha256, block)
+            yield block, pages
+    finally:
+        extracted.close()
+
+
+def text_profile(path: str, sha256: str | None):
+    """
+    pdf_text_profile(), memoized next to the cached text.
+    """
+    if not (TEXT_CACHE_ENABLED and sha256):
+        return pdf_text_profile(path)
+    meta_path = os.path.join(_dir(sha256), "meta.json")
+    try:
+        with open(meta_path) as fh:
+            meta = json.load(fh)
+        return meta["page_count"], meta["avg_chars"]
+    except (FileNotFoundError, ValueError, KeyError):
+        pass
+    page_count, avg_chars = pdf_text_profile(path)
+    try:
+        _atomic_write(meta_path, json.dumps({"page_count": page_count, "avg_chars": avg_chars}).encode())
+    except OSError as exc:
+        logger.warning("text cache: could not write meta for %s: %s", sha256, exc)
+    return page_count, avg_chars
+
+
+def iter_pages(path: str, sha256: str | None, start_page: int = 1, end_page: int | None = None):
+    """
+    Same contract as utils.iter_pdf_pages, served from the on-disk cache
+    (gzip JSONL, one file per TEXT_CACHE_BLOCK_PAGES pages, keyed by the file's
+    sha256 and EXTRACTOR_VERSION). Pages not cached yet are parsed and added.
+    At most one block is held in memory.
+    """
+    if not (TEXT_CACHE_ENABLED and sha256):
+        yield from iter_pdf_pages(path, start_page=start_page, end_page=end_page)
+        return
+    page_count, _ = text_profile(path, sha256)
+    last = page_count if end_page is None else min(end_page, page_count)
+    first = max(1, start_page)
+    wanted_by_block = {}
+    for p in range(first, last + 1):
+        wanted_by_block.setdefault((p - 1) // TEXT_CACHE_BLOCK_PAGES, []).append(p)
+    for block, pages in _fill(path, sha256, wanted_by_block):
+        for p in wanted_by_block[block]:
+            yield p, pages[p]
+
+
+def get_pages(path: str, sha256: str | None, page_numbers) -> dict[int, str]:
+    """
+    Text of specific pages (1-based), through the cache when sha256 is known.
+    """
+    page_numbers = sorted(set(page_numbers))
+    if not (TEXT_CACHE_ENABLED and sha256):
+        return dict(iter_page_texts(path, page_numbers))
+    wanted_by_block = {}
+    for p in page_numbers:
+        wanted_by_block.setdefault((p - 1) // TEXT_CACHE_BLOCK_PAGES, []).append(p)
+    out = {}
+    for block, pages in _fill(path, sha256, wanted_by_block):
+        out.update({p: pages[p] for p in wanted_by_block[block]})
+    return out
+
+
+def clear(sha256: str):
+    """
+    Drop every cached version of a file's text.
+    """
+    shutil.rmtree(os.path.join(TEXT_CACHE_DIR, sha256[:2], sha256), ignore_errors=True)
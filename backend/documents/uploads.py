@@ -0,0 +1,152 @@
+# backend/documents/uploads.py
+import os
+import uuid
+import tarfile
+import zipfile
+import hashlib
+import logging
+from dataclasses import dataclass
+
+from django.core.files import File
+from django.core.files.storage import default_storage, FileSystemStorage
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+UPLOAD_TMP_DIR = "uploads/tmp"
+# archive members larger than this (uncompressed, as declared) are skipped
+ARCHIVE_MAX_MEMBER_BYTES = int(os.getenv("ARCHIVE_MAX_MEMBER_BYTES", 512 * 1024 * 1024))
+INGESTIBLE_SUFFIXES = (".pdf",)
+
+
+class UploadError(ValueError):
+    pass
+
+
+@dataclass
+class StoredUpload:
+    tmp_path: str
+    sha256: str
+    size: int
+
+
+class _HashingFile(File):
+    """
+    Wraps an uploaded file so the sha256 and size are computed while storage
+    consumes it, whether the backend pulls chunks() or read().
+    """
+
+    def __init__(self, file):
+        super().__init__(file, name=getattr(file, "name", None))
+        self.sha = hashlib.sha256()
+        self.bytes_seen = 0
+
+    def _seen(self, data):
+        if data:
+            self.sha.update(data)
+            self.bytes_seen += len(data)
+        return data
+
+    def chunks(self, chunk_size=None):
+        if hasattr(self.file, "chunks"):
+            source = self.file.chunks(UPLOAD_CHUNK_SIZE)
+        else:
+            # plain streams, e.g. archive members
+            source = iter(lambda: self.file.read(UPLOAD_CHUNK_SIZE), b"")
+        for data in source:
+            yield self._seen(data)
+
+    def read(self, *args):
+        return self._seen(self.file.read(*args))
+
+
+def stream_to_temp(uploaded_file, storage=default_storage, rewind: bool = True) -> StoredUpload:
+    """
+    Write an upload to a temporary storage path in fixed-size chunks, hashing
+    as it goes. Memory use is one chunk regardless of file size.
+    """
+    if rewind:
+        uploaded_file.seek(0)
+    wrapped = _HashingFile(uploaded_file)
+    tmp_path = storage.save(f"{UPLOAD_TMP_DIR}/{uuid.uuid4().hex}.part", wrapped)
+    return StoredUpload(tmp_path=tmp_path, sha256=wrapped.sha.hexdigest(), size=wrapped.bytes_seen)
+
+
+def content_path(sha256: str, filename: str) -> str:
+    ext = os.path.splitext(filename or "")[1].lower()
+    return f"uploads/{sha256[:2]}/{sha256}{ext}"
+
+
+def promote(upload: StoredUpload, filename: str, storage=default_storage) -> str:
+    """
+    Move a temp upload to its content-addressed path. On local storage this is
+    an atomic rename; identical content already stored is reused.
+    """
+    final_path = content_path(upload.sha256, filename)
+    if storage.exists(final_path):
+        discard(upload, storage)
+        return final_path
+
+    if isinstance(storage, FileSystemStorage):
+        src = storage.path(upload.tmp_path)
+        dst = storage.path(final_path)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        os.replace(src, dst)
+        return final_path
+
+    # remote backends have no rename: stream a copy through the storage API, then drop the temp
+    with storage.open(upload.tmp_path, "rb") as fh:
+        saved = storage.save(final_path, fh)
+    discard(upload, storage)
+    return saved
+
+
+def discard(upload: StoredUpload, storage=default_storage):
+    try:
+        storage.delete(upload.tmp_path)
+    except Exception:
+        logger.exception("failed to delete temp upload %s", upload.tmp_path)
+
+
+def _ingestible(name: str) -> bool:
+    base = os.path.basename(name)
+    if not base or base.startswith(".") or name.startswith("__MACOSX/"):
+        return False
+    return base.lower().endswith(INGESTIBLE_SUFFIXES)
+
+
+def store_archive(archive, storage=default_storage):
+    """
+    Yield (filename, StoredUpload) for each ingestible member of a zip or
+    tar(.gz/.bz2/.xz) upload. Members are streamed out of the archive one at a
+    time straight into stream_to_temp; nothing is extracted as a whole.
+    """
+    name = (getattr(archive, "name", "") or "").lower()
+    try:
+        if name.endswith(".zip"):
+            with zipfile.ZipFile(archive) as zf:
+                for info in zf.infolist():
+                    if info.is_dir() or not _ingestible(info.filename):
+                        continue
+                    if info.file_size > ARCHIVE_MAX_MEMBER_BYTES:
+                        logger.warning("skipping archive member %s: %d bytes", info.filename, info.file_size)
+                        continue
+                    with zf.open(info) as fh:
+                        stored = stream_to_temp(fh, storage, rewind=False)
+                    yield os.path.basename(info.filename), stored
+        elif name.endswith((".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")):
+            # "r|*" reads the tar as a forward-only stream
+            with tarfile.open(fileobj=archive, mode="r|*") as tf:
+                for member in tf:
+                    if not member.isfile() or not _ingestible(member.name):
+                        continue
+                    if member.size > ARCHIVE_MAX_MEMBER_BYTES:
+                        logger.warning("skipping archive member %s: %d bytes", member.name, member.size)
+                        continue
+                    fh = tf.extractfile(member)
+                    if fh is not None:
+                        yield os.path.basename(member.name), stream_to_temp(fh, storage, rewind=False)
+        else:
+            raise UploadError(f"unsupported archive type: {archive.name}")
+    except (zipfile.BadZipFile, tarfile.TarError, EOFError) as exc:
+        raise UploadError(f"could not read archive {archive.name}: {exc}") from exc
@@ -1,54 +1,267 @@
 # backend/documents/utils.py
+import os
+import re
 import hashlib
-from typing import List, Tuple
+import logging
+from bisect import bisect_right
+from itertools import accumulate, compress, repeat
+from operator import not_
+from typing import Iterator, List, NamedTuple, Tuple
 import fitz  # PyMuPDF
-import math
 
-# Simple token estimator: 1 token ~= 0.75 words (approx). Good enough for chunking dev.
-def estimate_tokens(text: str) -> int:
-    words = len(text.split())
-    return max(1, math.ceil(words / 0.75))
+from .pdf_extract import iter_page_texts
+
+logger = logging.getLogger(__name__)
+
+# path to a local tokenizer.json (`tokenizers` format) used for chunk sizing and
+# token_count; unset = the built-in word/punctuation tokenizer. Never fetched from the network
+CHUNK_TOKENIZER = os.getenv("CHUNK_TOKENIZER", "")
+# bump when chunk boundaries or chunk text change, so caches keyed on chunking can be invalidated
+CHUNKER_VERSION = "tok-2"
+
+def iter_pdf_pages(path: str, start_page: int = 1, end_page: int | None = None) -> Iterator[Tuple[int, str]]:
+    """
+    Yields (page_number, text) one page at a time, so only the current page is held in memory.
+    start_page/end_page are 1-based and inclusive; pages outside the range are not parsed.
+    Long ranges may be extracted by several processes (see pdf_extract.py).
+    """
+    doc = fitz.open(path)
+    try:
+        page_count = doc.page_count
+    finally:
+        doc.close()
+    last = page_count if end_page is None else min(end_page, page_count)
+    yield from iter_page_texts(path, range(max(1, start_page), last + 1))
 
 def extract_text_from_pdf(path: str) -> List[Tuple[int, str]]:
     """
     Returns list of (page_number, text) for a PDF.
     """
-    docs = []
+    return list(iter_pdf_pages(path))
+
+def pdf_text_profile(path: str, samples: int = 8) -> Tuple[int, float]:
+    """
+    Returns (page_count, average chars per page) estimated from a few evenly spaced pages.
+    """
     doc = fitz.open(path)
-    for i in range(doc.page_count):
-        page = doc.load_page(i)
-        text = page.get_text("text")
-        docs.append((i + 1, text))
-    doc.close()
-    return docs
+    try:
+        n = doc.page_count
+        if n == 0:
+            return 0, 0.0
+        step = max(1, n // samples)
+        picked = list(range(0, n, step))[:samples]
+        chars = sum(len(doc.load_page(i).get_text("text")) for i in picked)
+        return n, chars / len(picked)
+    finally:
+        doc.close()
 
-def chunk_text(text: str, chunk_tokens: int = 600, overlap: int = 80) -> List[str]:
+_tokenizer = None
+_tokenizer_loaded = False
+
+def get_tokenizer():
     """
-    Chunk the text roughly by sentences/lines until token limit.
-    Very pragmatic: split by newline, accumulate until estimated tokens >= chunk_tokens.
+    Process-wide `tokenizers` Tokenizer from CHUNK_TOKENIZER, or None when unset or
+    unloadable (chunking then uses the built-in word/punctuation tokenizer).
     """
-    lines = [l.strip() for l in text.splitlines() if l.strip()]
-    chunks = []
-    cur = []
-    cur_tokens = 0
-    for line in lines:
-        tkns = estimate_tokens(line)
-        if cur and (cur_tokens + tkns) > chunk_tokens:
-            chunks.append(" ".join(cur))
-            # carry overlap lines - naive: keep last N tokens as overlap
-            if overlap > 0:
-                # keep last k words from current chunk as starting point for next
-                last_words = " ".join(" ".join(cur).split()[-overlap:])
-                cur = [last_words] if last_words else []
-                cur_tokens = estimate_tokens(last_words)
+    global _tokenizer, _tokenizer_loaded
+    if not _tokenizer_loaded:
+        _tokenizer_loaded = True
+        if not CHUNK_TOKENIZER:
+            return None
+        try:
+            from tokenizers import Tokenizer
+            _tokenizer = Tokenizer.from_file(CHUNK_TOKENIZER)
+            _tokenizer.no_truncation()
+            _tokenizer.no_padding()
+        except Exception as exc:
+            logger.warning("tokenizer %s unavailable, using built-in word tokens: %s", CHUNK_TOKENIZER, exc)
+            _tokenizer = None
+    return _tokenizer
+
+def tokenizer_name() -> str:
+    """What chunks are actually sized with, for chunk_config."""
+    return CHUNK_TOKENIZER if get_tokenizer() is not None else BUILTIN_TOKENIZER
+
+# built-in tokenizer: runs of word characters and single punctuation marks, the
+# same split as BERT's basic pre-tokenizer. Tokens never span whitespace, so the
+# count for any slice between token boundaries is the count of its tokens
+BUILTIN_TOKENIZER = "words-1"
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+# sentence ends inside a line; only used to split unusually long lines
+_SENTENCE_RE = re.compile(r"[.!?][\"')\]]*\s+")
+_SENTENCE_END = (".", "!", "?", ".\"", ".'", ".)", "?\"", "!\"")
+# lines longer than this (chars) are split further at sentence ends
+LONG_LINE_CHARS = 400
+
+# boundary strength before a segment
+_LINE, _SENTENCE, _PARAGRAPH = 1, 2, 3
+
+def token_offsets(text: str) -> List[Tuple[int, int]]:
+    """
+    (start, end) char offsets of each token in text.
+    """
+    tok = get_tokenizer()
+    if tok is None:
+        return [m.span() for m in _TOKEN_RE.finditer(text)]
+    return tok.encode(text, add_special_tokens=False).offsets
+
+def count_tokens(text: str) -> int:
+    tok = get_tokenizer()
+    if tok is None:
+        return len(_TOKEN_RE.findall(text))
+    return len(tok.encode(text, add_special_tokens=False))
+
+class TokenChunk(NamedTuple):
+    text: str
+    token_count: int
+    start_char: int
+    end_char: int
+
+class _Segments:
+    """
+    The text cut into lines (long lines further into sentences) with exact
+    token counts per segment, built from C-level primitives so the per-page
+    cost is a handful of operations per line. Token positions are global
+    across the text; token offsets are only computed for segments a window
+    actually cuts through.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        segs = text.split("\n")
+        char_starts = list(accumulate(map((1).__add__, map(len, segs)), initial=0))
+        # True where a segment continues the previous line (sentence split), not a new line
+        cont = None
+        if segs and max(map(len, segs)) > LONG_LINE_CHARS:
+            segs, char_starts, cont = self._split_long_lines(segs, char_starts)
+
+        self._tok = tok = get_tokenizer()
+        if tok is None:
+            counts = list(map(len, map(_TOKEN_RE.findall, segs)))
+        else:
+            # offsets are only needed for the few segments a window cuts through
+            encode = getattr(tok, "encode_batch_fast", tok.encode_batch)
+            counts = list(map(len, encode(segs, add_special_tokens=False)))
+
+        starts = list(accumulate(counts, initial=0))
+        total = starts[-1]
+        n = len(segs)
+        # compress/map keep the per-line loops in C; this runs for every page
+        para = list(compress(starts[1:n], map(not_, counts[1:])))
+        sent = list(compress(starts[1:n], map(str.endswith, map(str.rstrip, segs[:n - 1]), repeat(_SENTENCE_END))))
+        valid = lambda xs: sorted({x for x in xs if 0 < x < total})
+        if cont is None:
+            # already sorted and unique; every sentence/paragraph position is also a line start
+            line = list(compress(starts[1:n], counts[1:]))
+            line = line[bisect_right(line, 0):]
+        else:
+            line = valid([starts[i] for i in range(1, n) if counts[i] and not cont[i]] + sent + para)
+        self.boundaries = {
+            _PARAGRAPH: valid(para),
+            _SENTENCE: valid(sent + para),
+            _LINE: line,
+        }
+        self.segs = segs
+        self.char_starts = char_starts
+        self.starts = starts
+        self.total = total
+        self._offsets = {}
+
+    @staticmethod
+    def _split_long_lines(lines, line_starts):
+        segs, starts, cont = [], [], []
+        for line, base in zip(lines, line_starts):
+            if len(line) <= LONG_LINE_CHARS:
+                segs.append(line)
+                starts.append(base)
+                cont.append(False)
+                continue
+            pos = 0
+            for m in _SENTENCE_RE.finditer(line):
+                segs.append(line[pos:m.end()])
+                starts.append(base + pos)
+                cont.append(pos > 0)
+                pos = m.end()
+            if pos < len(line):
+                segs.append(line[pos:])
+                starts.append(base + pos)
+                cont.append(pos > 0)
+        return segs, starts, cont
+
+    def _seg_offsets(self, k: int):
+        if k not in self._offsets:
+            base = self.char_starts[k]
+            if self._tok is None:
+                local = [m.span() for m in _TOKEN_RE.finditer(self.text, base, base + len(self.segs[k]))]
             else:
-                cur = []
-                cur_tokens = 0
-        cur.append(line)
-        cur_tokens += tkns
-    if cur:
-        chunks.append(" ".join(cur))
+                enc = self._tok.encode(self.segs[k], add_special_tokens=False)
+                local = [(base + a, base + b) for a, b in enc.offsets]
+            self._offsets[k] = local
+        return self._offsets[k]
+
+    def offset(self, p: int) -> Tuple[int, int]:
+        """
+        Char span of global token p.
+        """
+        k = bisect_right(self.starts, p) - 1
+        return self._seg_offsets(k)[p - self.starts[k]]
+
+    def is_word_start(self, p: int) -> bool:
+        start = self.offset(p)[0]
+        return start == 0 or self.text[start - 1].isspace()
+
+def token_chunks(text: str, chunk_tokens: int = 600, overlap: int = 80,
+                 respect_boundaries: bool = True) -> List[TokenChunk]:
+    """
+    Split text into windows of at most chunk_tokens tokens with exactly
+    `overlap` tokens shared between neighbours (rounded forward to a word start).
+
+    With respect_boundaries, a window ends at the last paragraph, else
+    sentence, else line break in its second half, else at a word start.
+    The text is tokenized once; each chunk is a single slice of `text`, and
+    its token_count is the number of tokens in that slice.
+    """
+    segs = _Segments(text)
+    n = segs.total
+    if n == 0:
+        return []
+    chunk_tokens = max(1, chunk_tokens)
+    overlap = max(0, min(overlap, chunk_tokens - 1))
+
+    chunks = []
+    start = 0
+    while start < n:
+        hard_end = start + chunk_tokens
+        if hard_end >= n:
+            end = n
+        else:
+            min_end = start + max(1, chunk_tokens // 2)
+            end = None
+            for level in (_PARAGRAPH, _SENTENCE, _LINE) if respect_boundaries else ():
+                idx = segs.boundaries[level]
+                j = bisect_right(idx, hard_end) - 1
+                if j >= 0 and idx[j] > min_end:
+                    end = idx[j]
+                    break
+            if end is None:
+                end = hard_end
+                while end > min_end and not segs.is_word_start(end):
+                    end -= 1
+        s_char, e_char = segs.offset(start)[0], segs.offset(end - 1)[1]
+        chunks.append(TokenChunk(text[s_char:e_char], end - start, s_char, e_char))
+        if end >= n:
+            break
+        nxt = max(end - overlap, start + 1)
+        while nxt < end and not segs.is_word_start(nxt):
+            nxt += 1
+        start = nxt
     return chunks
 
+def chunk_text(text: str, chunk_tokens: int = 600, overlap: int = 80) -> List[str]:
+    """
+    Tokenizer-sized chunks of text (see token_chunks). Returns only the strings.
+    """
+    return [c.text for c in token_chunks(text, chunk_tokens=chunk_tokens, overlap=overlap)]
+
 def sha256_text(text: str) -> str:
     return hashlib.sha256(text.encode("utf-8")).hexdigest()
@@ -4,15 +4,43 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from django.core.files.storage import default_storage
-from django.http import FileResponse, Http404
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
 from django.db import transaction
-import hashlib
+from django.db.models import Count
+from django.utils import timezone
 import mimetypes
 
-from .models import Document
-from .serializers import DocumentListSerializer, UploadSerializer
+from .models import Document, IngestBatch
+from .serializers import DocumentListSerializer, UploadSerializer, BatchUploadSerializer
 from projects.models import Project
-from .tasks import ingest_document_task
+from .tasks import ingest_batch_task, schedule_ingest
+from .scheduler import get_scheduler, Backpressure, PRIORITY, NORMAL, INGEST_PRIORITY_MAX_BYTES
+from . import uploads
+from . import progress
+from .events import EventStreamRenderer, acquire_stream, busy_stream, project_event_stream
+from .purge import PURGING
+import os
+
+BATCH_UPLOAD_MAX_FILES = int(os.getenv("BATCH_UPLOAD_MAX_FILES", 5000))
+
+
+def _backpressure_response(exc: Backpressure):
+    resp = Response({"detail": str(exc), "retry_after": exc.retry_after}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+    resp["Retry-After"] = str(exc.retry_after)
+    return resp
+
+
+def _restore(doc) -> bool:
+    """
+    Undelete a re-uploaded document. The purge claims a row before removing
+    anything (purge.PURGING), so this update either lands first or finds
+    nothing: False means the row is being purged or gone, and the upload
+    should be treated as new.
+    """
+    if not Document.objects.filter(id=doc.id).exclude(status=PURGING).update(is_deleted=False, deleted_at=None):
+        return False
+    set_document_deleted(str(doc.id), deleted=False, project_id=str(doc.project_id) if doc.project_id else None)
+    return True
 
 
 class DocumentViewSet(viewsets.ViewSet):
@@ -22,6 +50,13 @@ class DocumentViewSet(viewsets.ViewSet):
     POST    /documents/                → upload
     DELETE  /documents/<id>/           → soft delete
     GET     /documents/<id>/download/  → download
+    POST    /documents/<id>/versions/  → upload a new version (incremental re-ingest)
+    POST    /documents/batch/          → upload many files or a zip/tar archive
+    GET     /documents/batch/<id>/     → batch progress
+    GET     /documents/queue/          → ingestion queue depth / per-project backlog
+    GET     /documents/progress/?project_id=  → live ingestion progress (Redis only)
+    GET     /documents/<id>/progress/  → live ingestion progress of one document
+    GET     /documents/events/?project_id=  → server-sent events: status/progress changes
     """
 
     permission_classes = [permissions.AllowAny]
@@ -34,7 +69,6 @@ class DocumentViewSet(viewsets.ViewSet):
         serializer = DocumentListSerializer(qs, many=True)
         return Response(serializer.data)
 
-    @transaction.atomic
     def create(self, request):
         serializer = UploadSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -45,19 +79,17 @@ class DocumentViewSet(viewsets.ViewSet):
         project_id = request.data.get("project_id") or request.query_params.get("project_id")
         project = get_object_or_404(Project, id=project_id)
 
-        # Compute sha256
-        file_bytes = uploaded_file.read()
-        sha = hashlib.sha256(file_bytes).hexdigest()
+        # Stream to a temp path, hashing on the way; never holds the whole file in memory
+        stored = uploads.stream_to_temp(uploaded_file)
+        sha = stored.sha256
 
-        # Duplicate detection
-        existing = Document.objects.filter(sha256=sha, project_id=project_id).first()
+        # Duplicate detection; a duplicate queues nothing, so it never meets admission control
+        existing = Document.objects.filter(sha256=sha, project_id=project_id).exclude(status=PURGING).first()
+        # auto-restore if deleted
+        if existing and existing.is_deleted and not _restore(existing):
+            existing = None
         if existing:
-            # auto-restore if deleted
-            if existing.is_deleted:
-                existing.is_deleted = False
-                existing.save(update_fields=["is_deleted"])
-                set_document_deleted(str(existing.id), deleted=False, project_id=str(existing.project.id) if existing.project else None)
-
+            uploads.discard(stored)
             return Response(
                 {
                     "status": "duplicate",
@@ -67,29 +99,248 @@ class DocumentViewSet(viewsets.ViewSet):
                 status=status.HTTP_200_OK,
             )
 
-        # Save file into storage
-        storage_path = f"uploads/{uploaded_file.name}"
-        saved_path = default_storage.save(storage_path, uploaded_file)
-
-        # Create document
-        doc = Document.objects.create(
-            filename=uploaded_file.name,
-            sha256=sha,
-            size=len(file_bytes),
-            metadata={"path": saved_path},
-            project=project,
-            status="queued",
+        # Admission control before the upload becomes a document
+        lane = PRIORITY if uploaded_file.size <= INGEST_PRIORITY_MAX_BYTES else NORMAL
+        try:
+            wait = get_scheduler().admit(project.id, lane=lane)
+        except Backpressure as exc:
+            uploads.discard(stored)
+            return _backpressure_response(exc)
+
+        # Move into the content-addressed location
+        saved_path = uploads.promote(stored, uploaded_file.name)
+
+        # Create document; the upload is already stored, so the transaction is just the row
+        with transaction.atomic():
+            doc = Document.objects.create(
+                filename=uploaded_file.name,
+                sha256=sha,
+                size=stored.size,
+                metadata={"path": saved_path},
+                project=project,
+                status="queued",
+            )
+            transaction.on_commit(lambda: schedule_ingest(doc, interactive=True))
+
+        return Response(
+            {"status": "queued", "id": str(doc.id), "estimated_wait_seconds": wait},
+            status=status.HTTP_201_CREATED,
+        )
+
+    @action(detail=True, methods=["post"], url_path="versions")
+    @transaction.atomic
+    def new_version(self, request, pk=None):
+        doc = get_object_or_404(Document, id=pk, is_deleted=False)
+        serializer = UploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        uploaded_file = serializer.validated_data["file"]
+
+        lane = PRIORITY if uploaded_file.size <= INGEST_PRIORITY_MAX_BYTES else NORMAL
+        try:
+            wait = get_scheduler().admit(doc.project_id, lane=lane)
+        except Backpressure as exc:
+            return _backpressure_response(exc)
+
+        stored = uploads.stream_to_temp(uploaded_file)
+        sha = stored.sha256
+
+        if sha == doc.sha256:
+            uploads.discard(stored)
+            return Response(
+                {"status": "unchanged", "id": str(doc.id), "message": "This version is identical to the current one."},
+                status=status.HTTP_200_OK,
+            )
+
+        other = Document.objects.filter(sha256=sha, project_id=doc.project_id, is_deleted=False).exclude(id=doc.id).first()
+        if other:
+            uploads.discard(stored)
+            return Response(
+                {"status": "duplicate", "id": str(other.id), "message": "This file already exists in this project."},
+                status=status.HTTP_200_OK,
+            )
+
+        saved_path = uploads.promote(stored, uploaded_file.name)
+
+        # keep a record of what this version replaced; chunks are diffed during ingest
+        metadata = doc.metadata or {}
+        versions = metadata.setdefault("versions", [])
+        versions.append({
+            "sha256": doc.sha256,
+            "filename": doc.filename,
+            "size": doc.size,
+            "path": metadata.get("path"),
+            "replaced_at": timezone.now().isoformat(),
+        })
+        metadata["path"] = saved_path
+        metadata["version"] = len(versions) + 1
+
+        doc.filename = uploaded_file.name
+        doc.sha256 = sha
+        doc.size = stored.size
+        doc.metadata = metadata
+        doc.status = "queued"
+        doc.save(update_fields=["filename", "sha256", "size", "metadata", "status"])
+
+        transaction.on_commit(lambda: schedule_ingest(doc, incremental=True, interactive=True))
+
+        return Response(
+            {"status": "queued", "id": str(doc.id), "version": metadata["version"], "estimated_wait_seconds": wait},
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+    @action(detail=False, methods=["post"], url_path="batch")
+    def batch_upload(self, request):
+        serializer = BatchUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        files = serializer.validated_data.get("files") or []
+        archive = serializer.validated_data.get("archive")
+        if not files and not archive:
+            return Response({"detail": "Send files and/or an archive."}, status=status.HTTP_400_BAD_REQUEST)
+
+        project_id = request.data.get("project_id") or request.query_params.get("project_id")
+        project = get_object_or_404(Project, id=project_id)
+
+        # stream everything to temp storage first; each file is hashed on the way
+        stored = []
+        try:
+            if len(files) > BATCH_UPLOAD_MAX_FILES:
+                raise uploads.UploadError(f"more than {BATCH_UPLOAD_MAX_FILES} files")
+            for f in files:
+                stored.append((f.name, uploads.stream_to_temp(f)))
+            if archive:
+                for name, upload in uploads.store_archive(archive):
+                    stored.append((name, upload))
+                    if len(stored) > BATCH_UPLOAD_MAX_FILES:
+                        raise uploads.UploadError(f"more than {BATCH_UPLOAD_MAX_FILES} files")
+        except uploads.UploadError as exc:
+            for _, upload in stored:
+                uploads.discard(upload)
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # dedupe against the project in one query, and within the batch itself
+        existing = {
+            d.sha256: d for d in Document.objects.filter(
+                project=project, sha256__in={u.sha256 for _, u in stored}
+            ).exclude(status=PURGING)
+        }
+        # same as single uploads: re-uploading a deleted file restores it
+        for sha, doc in list(existing.items()):
+            if doc.is_deleted and not _restore(doc):
+                del existing[sha]
+        duplicates, new, pending = [], {}, {}
+        for name, upload in stored:
+            known = existing.get(upload.sha256) or new.get(upload.sha256)
+            if known is not None:
+                uploads.discard(upload)
+                duplicates.append({"filename": name, "id": str(known.id)})
+                continue
+            new[upload.sha256] = Document(
+                filename=name,
+                sha256=upload.sha256,
+                size=upload.size,
+                project=project,
+                status="queued",
+            )
+            pending[upload.sha256] = upload
+
+        # admission against the real number of new documents, archive members included;
+        # duplicates queue nothing, so an all-duplicate batch is never turned away
+        wait = 0
+        if new:
+            try:
+                wait = get_scheduler().admit(project.id, count=len(new))
+            except Backpressure as exc:
+                for upload in pending.values():
+                    uploads.discard(upload)
+                return _backpressure_response(exc)
+
+        for sha, doc in new.items():
+            doc.metadata = {"path": uploads.promote(pending[sha], doc.filename)}
+
+        # streaming, extraction and hashing are done: the transaction only covers the rows
+        with transaction.atomic():
+            batch = IngestBatch.objects.create(project=project, total=len(new), duplicates=len(duplicates))
+            for doc in new.values():
+                doc.batch = batch
+            Document.objects.bulk_create(new.values())
+            transaction.on_commit(lambda: ingest_batch_task.delay(str(batch.id)))
+
+        return Response(
+            {
+                "status": "queued",
+                "batch_id": str(batch.id),
+                "queued": [{"filename": d.filename, "id": str(d.id)} for d in new.values()],
+                "duplicates": duplicates,
+                "estimated_wait_seconds": wait,
+            },
+            status=status.HTTP_202_ACCEPTED,
         )
 
-        ingest_document_task.delay(str(doc.id))
+    @action(detail=False, methods=["get"], url_path=r"batch/(?P<batch_id>[^/.]+)")
+    def batch_status(self, request, batch_id=None):
+        batch = get_object_or_404(IngestBatch, id=batch_id)
+        counts = dict(batch.documents.values_list("status").annotate(n=Count("id")))
+        finished = counts.get("done", 0) + counts.get("error", 0)
+        return Response({
+            "id": str(batch.id),
+            "project_id": str(batch.project_id),
+            "created_at": batch.created_at,
+            "total": batch.total,
+            "duplicates": batch.duplicates,
+            "counts": counts,
+            "progress": round(counts.get("done", 0) / batch.total, 3) if batch.total else 1.0,
+            "finished": finished >= batch.total,
+        })
+
+    @action(detail=False, methods=["get"], url_path="progress")
+    def project_progress(self, request):
+        # documents of the project with recent ingestion activity; served from Redis, cheap to poll
+        project_id = request.query_params.get("project_id")
+        if not project_id:
+            return Response({"detail": "project_id is required"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"documents": progress.read_project(project_id)})
+
+    @action(detail=False, methods=["get"], url_path="events", renderer_classes=[EventStreamRenderer])
+    def events(self, request):
+        project_id = request.query_params.get("project_id")
+        if not project_id:
+            return HttpResponse("project_id is required", status=400, content_type="text/plain")
+        # every open stream pins a server thread: capped per client and overall.
+        # Over the cap the answer is still an event stream, so EventSource backs off
+        # and reconnects instead of giving up as it would on an error status
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            client = f"user:{user.pk}"
+        else:
+            client = f"ip:{request.META.get('REMOTE_ADDR', '')}"
+        token = acquire_stream(client)
+        stream = busy_stream() if token is None else project_event_stream(project_id, client, token)
+        resp = StreamingHttpResponse(stream, content_type="text/event-stream")
+        resp["Cache-Control"] = "no-cache"
+        resp["X-Accel-Buffering"] = "no"
+        return resp
+
+    @action(detail=True, methods=["get"], url_path="progress")
+    def document_progress(self, request, pk=None):
+        snapshot = progress.read(pk)
+        if snapshot is None:
+            # expired from Redis (or never ingested): last snapshot flushed to Postgres
+            doc = get_object_or_404(Document, id=pk)
+            snapshot = {**(doc.metadata or {}).get("progress", {}), "status": doc.status}
+        return Response(snapshot)
 
-        return Response({"status": "queued", "id": str(doc.id)}, status=status.HTTP_201_CREATED)
+    @action(detail=False, methods=["get"], url_path="queue")
+    def queue(self, request):
+        # operator view of the ingestion scheduler; reads Redis only
+        return Response(get_scheduler().stats())
 
     def destroy(self, request, pk=None):
         doc = get_object_or_404(Document, id=pk)
         if not doc.is_deleted:
             doc.is_deleted = True
-            doc.save(update_fields=["is_deleted"])
+            doc.deleted_at = timezone.now()
+            doc.save(update_fields=["is_deleted", "deleted_at"])
             # mark vectors in Qdrant as deleted
             set_document_deleted(str(doc.id), deleted=True, project_id=str(doc.project.id) if doc.project else None)
 
@@ -12,6 +12,7 @@ class Project(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     last_interacted_at = models.DateTimeField(null=True, blank=True, default=timezone.now)
     is_deleted = models.BooleanField(default=False)
+    deleted_at = models.DateTimeField(null=True, blank=True)
 
     def update_last_interacted_at(self, last_interacted_at=timezone.now(), save=True):
         self.last_interacted_at = last_interacted_at
@@ -6,6 +6,7 @@ from django.shortcuts import get_object_or_404
 from .models import Project
 from .serializers import ProjectSerializer
 from conversations.models import Conversation
+from documents.purge import soft_delete_project
 
 
 class ProjectViewSet(viewsets.ModelViewSet):
@@ -38,5 +39,5 @@ class ProjectViewSet(viewsets.ModelViewSet):
 
     @transaction.atomic
     def perform_destroy(self, instance):
-        instance.is_deleted = True
-        instance.save(update_fields=["is_deleted"])
+        # documents go with it; documents/purge.py removes everything after the grace period
+        soft_delete_project(instance)